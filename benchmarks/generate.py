@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+生成性能测试用的命令库
+相同的参数总是生成相同的数据库：命令和笔记由固定种子的随机数从
+常见shell命令模板和中文名称/描述组合而成
+
+用法:
+  python benchmarks/generate.py 100k -o /tmp/library_100k.db
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+import database
+
+DEFAULT_SEED = 20240101
+
+CATEGORIES = [
+    ('容器', 'Docker和Kubernetes'), ('版本控制', 'git相关命令'), ('网络诊断', '连通性和抓包'),
+    ('文件处理', '查找、压缩和同步文件'), ('文本处理', 'grep/sed/awk'), ('系统监控', '进程和资源'),
+    ('数据库运维', 'MySQL/PostgreSQL/Redis'), ('远程登录', 'ssh和端口转发'), ('网络设备', '交换机和路由器配置'),
+    ('编译构建', '编译和打包'), ('日志分析', '日志检索和统计'), ('权限管理', '用户和文件权限'),
+]
+
+# 命令模板：(中文名称, 命令, 描述)
+TEMPLATES = [
+    ('查看{service}容器日志', 'docker logs -f --tail {count} {service}', '实时跟踪{service}容器最近{count}行日志'),
+    ('进入{service}容器', 'docker exec -it {service} /bin/bash', '以交互方式进入{service}容器'),
+    ('重启{service}部署', 'kubectl rollout restart deployment/{service} -n {namespace}', '滚动重启{namespace}命名空间中的{service}'),
+    ('查看{namespace}的Pod', 'kubectl get pods -n {namespace} -o wide --sort-by=.status.startTime', '按启动时间列出Pod'),
+    ('提交{branch}分支', 'git add -A && git commit -m "{message}" && git push origin {branch}', '提交并推送到{branch}'),
+    ('变基到{branch}', 'git fetch origin && git rebase -i origin/{branch}', '交互式变基整理提交'),
+    ('查找大文件', 'find {path} -type f -size +{count}M -exec ls -lh {{}} \\; | sort -k5 -h', '查找{path}下大于{count}MB的文件'),
+    ('打包{service}日志', 'tar -czvf /tmp/{service}_logs_$(date +%Y%m%d).tar.gz {path}/{service}/*.log', '按日期打包{service}日志'),
+    ('同步{service}到备份机', 'rsync -avz --delete {path}/{service}/ backup@{host}:/data/{service}/', '增量同步{service}目录'),
+    ('统计{service}错误数', 'grep -c "ERROR" {path}/{service}/app.log', '统计{service}日志中的错误行'),
+    ('提取{service}访问IP', "awk '{{print $1}}' {path}/{service}/access.log | sort | uniq -c | sort -rn | head -{count}",
+     '访问量最高的{count}个IP'),
+    ('替换{service}配置端口', "sed -i 's/listen {port}/listen {port2}/g' /etc/nginx/conf.d/{service}.conf", '修改监听端口'),
+    ('查看{port}端口占用', 'lsof -i :{port} || netstat -tlnp | grep {port}', '查找占用{port}端口的进程'),
+    ('抓取{port}端口数据包', 'tcpdump -i eth0 port {port} -w /tmp/{service}_{port}.pcap', '抓包后用Wireshark分析'),
+    ('测试到{host}的连通性', 'ping -c {count} {host} && traceroute {host}', '检查网络延迟和路由'),
+    ('转发{service}端口', 'ssh -N -L {port}:localhost:{port2} {user}@{host}', '把远程{service}端口映射到本机'),
+    ('登录{host}', 'ssh -p {port} {user}@{host}', '以{user}身份登录'),
+    ('导出{service}数据库', 'mysqldump -u{user} -p --single-transaction {service}_db > /backup/{service}_db.sql', '不锁表导出'),
+    ('查看{service}慢查询', "psql -U {user} -d {service}_db -c \"SELECT query, mean_exec_time FROM pg_stat_statements ORDER BY 2 DESC LIMIT {count};\"",
+     '平均耗时最长的查询'),
+    ('清理Redis前缀{service}', "redis-cli --scan --pattern '{service}:*' | xargs -r redis-cli del", '删除指定前缀的键'),
+    ('配置VLAN {count}', 'vlan {count}\n name {service}\nexit\ninterface GigabitEthernet0/{port2}\n switchport access vlan {count}',
+     '在交换机上划分VLAN'),
+    ('查看{service}进程资源', 'ps aux --sort=-%mem | grep {service} | head -{count}', '按内存排序'),
+    ('编译{service}', 'make -j$(nproc) {service} && make install PREFIX={path}', '并行编译并安装'),
+    ('修改{path}权限', 'chown -R {user}:{user} {path} && chmod -R 750 {path}', '递归设置属主和权限'),
+    ('构建{service}镜像', 'docker build -t registry.example.com/{namespace}/{service}:{version} .', '构建并标记镜像版本'),
+]
+
+SERVICES = ['nginx', 'mysql', 'redis', 'gateway', 'order', 'payment', 'user-center', 'search', 'kafka',
+            'elasticsearch', 'grafana', 'prometheus', 'jenkins', 'gitlab', 'auth', 'report', 'crm', 'erp']
+NAMESPACES = ['default', 'prod', 'staging', 'dev', 'monitoring', 'kube-system']
+BRANCHES = ['main', 'develop', 'release', 'hotfix', 'feature/login', 'feature/支付']
+PATHS = ['/var/log', '/data', '/opt/app', '/home/deploy', '/srv', '/usr/local']
+USERS = ['root', 'deploy', 'admin', 'ops', 'dev']
+MESSAGES = ['修复登录问题', '更新依赖', '优化查询性能', 'fix typo', '添加单元测试', 'refactor config loader']
+# 标签：少数常用标签覆盖大部分命令，其余标签较少使用
+TAGS = ['prod', 'debug', 'k8s', 'docker', 'network', 'db', 'backup', 'oncall', 'deploy', 'security',
+        'perf', 'legacy', 'cleanup', 'monitoring', 'migration', 'audit']
+
+NOTE_TITLES = ['{service}故障排查记录', '{service}部署步骤', '{namespace}环境说明', '{service}性能调优笔记',
+               '{host}服务器信息', '{service}升级注意事项', '值班交接：{service}']
+NOTE_SENTENCES = [
+    '先确认{service}的健康检查是否通过，再查看最近一次发布记录。',
+    '如果连接数突然升高，检查{host}上的防火墙规则和{port}端口的监听状态。',
+    '回滚时执行 kubectl rollout undo deployment/{service} -n {namespace}。',
+    '日志默认保存在{path}/{service}目录，保留{count}天。',
+    '数据库账号{user}只有只读权限，变更需要走审批流程。',
+    '压测结果：QPS约{count}，P99延迟在{port}毫秒以内。',
+    'Remember to drain the node before maintenance: kubectl drain {host} --ignore-daemonsets.',
+]
+
+
+def parse_size(text):
+    """解析 1k / 100k / 1m 形式的数量"""
+    text = str(text).strip().lower()
+    multiplier = {'k': 1000, 'm': 1000000}.get(text[-1:], 1)
+    return int(float(text.rstrip('km')) * multiplier)
+
+
+def make_fields(rng):
+    return {
+        'service': rng.choice(SERVICES),
+        'namespace': rng.choice(NAMESPACES),
+        'branch': rng.choice(BRANCHES),
+        'path': rng.choice(PATHS),
+        'user': rng.choice(USERS),
+        'message': rng.choice(MESSAGES),
+        'host': f'10.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}',
+        'port': rng.choice([22, 80, 443, 3306, 5432, 6379, 8080, 9090, 9200]),
+        'port2': rng.randint(1, 48),
+        'count': rng.choice([10, 20, 50, 100, 200, 500]),
+        'version': f'{rng.randint(1, 3)}.{rng.randint(0, 20)}.{rng.randint(0, 99)}',
+    }
+
+
+def generate_commands(rng, count, category_ids):
+    """生成 (名称, 命令, 分类ID, 描述, 是否收藏) 行"""
+    for number in range(count):
+        name, command, description = rng.choice(TEMPLATES)
+        fields = make_fields(rng)
+        yield (f'{name.format(**fields)} #{number}', command.format(**fields),
+               rng.choice(category_ids), description.format(**fields), 1 if rng.random() < 0.05 else 0)
+
+
+def generate_notes(rng, count):
+    """生成 (标题, 内容, 分类) 行"""
+    for number in range(count):
+        fields = make_fields(rng)
+        title = rng.choice(NOTE_TITLES).format(**fields)
+        paragraphs = []
+        for _ in range(rng.randint(2, 6)):
+            paragraphs.append(''.join(rng.choice(NOTE_SENTENCES).format(**make_fields(rng))
+                                      for _ in range(rng.randint(2, 5))))
+        yield f'{title} #{number}', '\n\n'.join(paragraphs), rng.choice(CATEGORIES)[0]
+
+
+def generate_tags(rng):
+    """0~3个标签，越靠前的标签越常用"""
+    count = rng.choice([0, 1, 1, 2, 2, 3])
+    return database.tagging.format_tags(sorted({TAGS[int(len(TAGS) * rng.random() ** 2)] for _ in range(count)}))
+
+
+def generate_database(path, commands, notes=None, seed=DEFAULT_SEED, batch_size=10000):
+    """生成命令库文件（已存在时覆盖），返回生成耗时（秒）"""
+    if notes is None:
+        notes = max(100, commands // 10)
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+    start = time.perf_counter()
+    rng = random.Random(seed)
+    conn = database.init_database(database.connect(path))
+    cursor = conn.cursor()
+    cursor.executemany('INSERT OR IGNORE INTO categories (name, description) VALUES (?, ?)', CATEGORIES)
+    cursor.execute('SELECT id FROM categories ORDER BY id')
+    category_ids = [row[0] for row in cursor.fetchall()]
+    database.tagging.ensure_tags(cursor, TAGS)
+    # 标签使用单独的随机数序列，不影响其余数据
+    tag_rng = random.Random(seed + 1)
+
+    batch = []
+    for name, command, category_id, description, is_favorite in generate_commands(rng, commands, category_ids):
+        batch.append((name, command, category_id, description, is_favorite, database.make_command_preview(command),
+                      database.make_content_hash(command), generate_tags(tag_rng)))
+        if len(batch) >= batch_size:
+            insert_commands(cursor, batch)
+            batch = []
+    insert_commands(cursor, batch)
+
+    cursor.executemany('INSERT INTO notes (title, content, category) VALUES (?, ?, ?)', generate_notes(rng, notes))
+    conn.commit()
+    conn.close()
+    return time.perf_counter() - start
+
+
+def insert_commands(cursor, rows):
+    cursor.executemany('''
+        INSERT INTO commands (name, command, category_id, description, is_favorite, command_preview,
+                              content_hash, tags)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ''', rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='生成性能测试用的命令库')
+    parser.add_argument('size', help='命令数量，例如 1k、100k、1m')
+    parser.add_argument('-o', '--output', required=True, help='数据库文件路径')
+    parser.add_argument('--notes', type=int, help='笔记数量（默认为命令数量的十分之一）')
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED, help='随机数种子')
+    args = parser.parse_args()
+
+    elapsed = generate_database(args.output, parse_size(args.size), args.notes, args.seed)
+    print(f"已生成 {args.output}，耗时 {elapsed:.1f} 秒")
+
+
+if __name__ == "__main__":
+    main()
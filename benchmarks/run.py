@@ -0,0 +1,358 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+性能测试
+在生成的大型命令库上测量列表、搜索、添加、备份等数据路径的耗时，
+有图形环境（或可用Xvfb）时同时测量Tk界面操作。结果以JSON输出，
+可以与之前保存的结果比较，找出变慢的操作。
+
+用法:
+  python benchmarks/run.py --sizes 1k,100k -o results.json
+  python benchmarks/run.py --sizes 100k --compare results.json
+"""
+
+import argparse
+import functools
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(BENCH_DIR), 'src'))
+sys.path.insert(0, BENCH_DIR)
+
+import backup
+import database
+import instrumentation
+import templates
+from command_cache import CommandListCache
+from fuzzy_search import TrigramIndex
+from generate import DEFAULT_SEED, generate_database, parse_size
+from journal import OperationJournal
+
+SEARCH_TERMS = {
+    'latin': 'docker',
+    'cjk': '日志',
+    'miss': 'zzzz-not-found',
+}
+FUZZY_TERM = 'dokcer logs'
+# 标签过滤（同时有两个标签的命令）
+TAG_FILTER = ['prod', 'debug']
+TEMPLATE = 'ssh {user=root}@{host:host} -p {port:port=22} "uptime"'
+
+
+def summarize(name, times):
+    """把多次测量的耗时（秒）汇总为一条结果"""
+    return {
+        'name': name,
+        'runs': len(times),
+        'min': min(times),
+        'median': statistics.median(times),
+        'mean': statistics.mean(times),
+        'max': max(times),
+    }
+
+
+def measure(name, func, repeat, setup=None):
+    """执行 func repeat 次并返回汇总结果，setup 在每次计时前执行（不计时）"""
+    times = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return summarize(name, times)
+
+
+def prepare_library(size, cache_dir, seed, regenerate=False):
+    """返回指定规模的测试库路径，不存在时生成（结果按规模、种子和结构版本缓存）"""
+    os.makedirs(cache_dir, exist_ok=True)
+    path = os.path.join(cache_dir, f'library_{size}_{seed}_v{database.SCHEMA_VERSION}.db')
+    if regenerate or not os.path.exists(path):
+        print(f"正在生成 {size} 条命令的测试库...", file=sys.stderr)
+        elapsed = generate_database(path, size, seed=seed)
+        print(f"生成完成，耗时 {elapsed:.1f} 秒", file=sys.stderr)
+    return path
+
+
+def run_headless(path, scratch_dir, repeat):
+    """测量不依赖图形界面的数据路径"""
+    results = []
+    conn = database.connect(path, readonly=True)
+
+    # refresh_command_list / quick_search / refresh_note_list 的数据部分
+    results.append(measure('list_commands', lambda: database.list_commands(conn), repeat))
+    category = conn.execute('SELECT name FROM categories ORDER BY id LIMIT 1').fetchone()[0]
+    results.append(measure('list_commands.category', lambda: database.list_commands(conn, category), repeat))
+    results.append(measure('list_commands.favorites',
+                           lambda: database.list_commands(conn, favorites_only=True), repeat))
+    for label, term in SEARCH_TERMS.items():
+        results.append(measure(f'search_commands.{label}', lambda: database.search_commands(conn, term), repeat))
+    results.append(measure('list_commands.tags', lambda: database.list_commands(conn, tags=TAG_FILTER), repeat))
+    results.append(measure('list_notes', lambda: database.list_notes(conn), repeat))
+
+    # 命令列表缓存：首次加载、默认排序、过滤
+    cache = CommandListCache()
+    results.append(measure('command_cache.load', lambda: cache.load(conn), repeat))
+    results.append(measure('command_cache.sort', cache.sorted_indexes, repeat,
+                           setup=lambda: setattr(cache, 'order', None)))
+    results.append(measure('command_cache.rows', lambda: cache.rows(), repeat))
+    results.append(measure('command_cache.rows.category', lambda: cache.rows(category), repeat))
+    results.append(measure('command_cache.rows.favorites', lambda: cache.rows(favorites_only=True), repeat))
+    results.append(measure('command_cache.rows.tags', lambda: cache.rows(tags=TAG_FILTER), repeat))
+    results.append(measure('command_cache.tag_facets', lambda: cache.tag_facets(TAG_FILTER[:1]), repeat))
+    results.append(measure('command_cache.refresh', lambda: cache.refresh(conn), repeat))
+
+    # 模糊搜索：建立索引较慢，只测一次
+    index = TrigramIndex()
+    results.append(measure('fuzzy.build', lambda: index.build(
+        conn.execute('SELECT id, name, command, description FROM commands')), 1))
+    results.append(measure('fuzzy.search', lambda: index.search(FUZZY_TERM), repeat))
+
+    # 命令模板：按1万行参数表批量生成
+    commands = [row[0] for row in conn.execute('SELECT command FROM commands LIMIT 1000')]
+    results.append(measure('template.compile', lambda: [templates.compile_template(text) for text in commands],
+                           repeat))
+    template = templates.compile_template(TEMPLATE)
+    variables = [{'user': 'deploy', 'host': f'10.0.{i // 256}.{i % 256}', 'port': str(1024 + i)}
+                 for i in range(10000)]
+    results.append(measure('template.render_rows', lambda: list(template.render_rows(variables)), repeat))
+    conn.close()
+
+    # 备份（在线备份接口复制整个数据库）
+    backup_file = os.path.join(scratch_dir, 'backup.db')
+    results.append(measure('backup_database', lambda: backup.copy_database(path, backup_file), repeat,
+                           setup=lambda: os.path.exists(backup_file) and os.remove(backup_file)))
+
+    # add_command 的数据部分：插入、写撤销日志、提交（在副本上进行）
+    conn = database.connect(backup_file)
+    cursor = conn.cursor()
+    journal = OperationJournal(conn)
+
+    def add_command():
+        command_id = database.insert_command(cursor, '性能测试命令', 'echo benchmark', None, '')
+        journal.record("添加命令", 'commands', {}, journal.snapshot_ids('commands', [command_id]))
+        conn.commit()
+
+    results.append(measure('add_command', add_command, repeat))
+    conn.close()
+    return results
+
+
+def start_virtual_display():
+    """需要时启动Xvfb，返回 (进程或None, 无法运行Tk的原因或None)"""
+    if sys.platform in ('win32', 'darwin') or os.environ.get('DISPLAY'):
+        return None, None
+    if not shutil.which('Xvfb'):
+        return None, "没有图形环境且未安装Xvfb"
+
+    display = 99
+    while os.path.exists(f'/tmp/.X{display}-lock'):
+        display += 1
+    process = subprocess.Popen(['Xvfb', f':{display}', '-screen', '0', '1280x1024x24', '-nolisten', 'tcp'],
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 10
+    while not os.path.exists(f'/tmp/.X11-unix/X{display}'):
+        if process.poll() is not None or time.time() > deadline:
+            process.kill()
+            return None, "Xvfb启动失败"
+        time.sleep(0.05)
+    os.environ['DISPLAY'] = f':{display}'
+    return process, None
+
+
+def run_tk(path, scratch_dir, repeat):
+    """测量Tk界面操作（包含界面刷新）
+
+    数据库、列宽配置、慢操作日志和诊断文件都写入 scratch_dir，不修改 data 目录。
+    """
+    import tkinter as tk
+
+    import command_manager
+
+    library = os.path.join(scratch_dir, 'tk.db')
+    backup.copy_database(path, library)
+    database.DB_PATH = library
+    database.DATA_DIR = scratch_dir
+    instrumentation.monitor.slow_log_path = os.path.join(scratch_dir, 'slow_queries.log')
+    diagnostics_dir = os.path.join(scratch_dir, 'diagnostics')
+    command_manager.DIAGNOSTICS_DIR = diagnostics_dir
+    command_manager.ProfilingSession = functools.partial(command_manager.ProfilingSession, output_dir=diagnostics_dir)
+
+    class ScratchColumnWidths(command_manager.ColumnWidthManager):
+        """列宽和排序状态保存到临时目录"""
+        def __init__(self, config_file="column_widths.json"):
+            super().__init__(config_file, config_dir=scratch_dir)
+
+    command_manager.ColumnWidthManager = ScratchColumnWidths
+
+    class PresetDialog:
+        """代替添加命令对话框，直接返回固定内容"""
+        def __init__(self, *args, **kwargs):
+            self.result = ('性能测试命令', 'echo benchmark', None, '', [])
+
+    command_manager.CommandDialog = PresetDialog
+
+    results = []
+    root = tk.Tk()
+    app = None
+
+    def create_app():
+        nonlocal app
+        app = command_manager.CommandManager(root)
+        root.update()
+
+    results.append(measure('tk.startup', create_app, 1))
+
+    # 等待后台模糊索引建立完成，避免与计时争用
+    while app.fuzzy_index_building is not None:
+        root.update()
+        time.sleep(0.05)
+
+    def refresh_commands():
+        app.refresh_command_list()
+        root.update()
+
+    def search(term):
+        def run():
+            app.search_var.set(term)
+            root.update()
+        return run
+
+    def clear_search():
+        app.search_var.set('')
+        root.update()
+
+    def add_command():
+        app.add_command()
+        root.update()
+
+    results.append(measure('tk.refresh_command_list', refresh_commands, repeat))
+    for label, term in SEARCH_TERMS.items():
+        results.append(measure(f'tk.quick_search.{label}', search(term), repeat, setup=clear_search))
+    app.fuzzy_var.set(True)
+    results.append(measure('tk.quick_search.fuzzy', search(FUZZY_TERM), repeat, setup=clear_search))
+    app.fuzzy_var.set(False)
+    clear_search()
+    results.append(measure('tk.add_command', add_command, repeat))
+
+    app.show_note_management()
+    root.update()
+
+    def refresh_notes():
+        app.refresh_note_list()
+        root.update()
+
+    results.append(measure('tk.refresh_note_list', refresh_notes, repeat))
+
+    app.usage_tracker.flush()
+    root.destroy()
+    app.conn.close()
+    return results
+
+
+def compare(results, baseline_file, threshold):
+    """与之前保存的结果比较中位数，返回变慢超过阈值的条目数"""
+    with open(baseline_file, 'r', encoding='utf-8') as f:
+        baseline = {(item['size'], item['name']): item for item in json.load(f)['results']}
+
+    regressions = 0
+    print(f"\n{'规模':>8}  {'操作':<28} {'基准(ms)':>10} {'本次(ms)':>10} {'比例':>7}", file=sys.stderr)
+    for item in results:
+        old = baseline.get((item['size'], item['name']))
+        if not old or old['median'] <= 0:
+            continue
+        ratio = item['median'] / old['median']
+        flag = ''
+        if ratio > threshold:
+            regressions += 1
+            flag = '  变慢'
+        print(f"{item['size']:>8}  {item['name']:<28} {old['median'] * 1000:>10.2f} "
+              f"{item['median'] * 1000:>10.2f} {ratio:>6.2f}x{flag}", file=sys.stderr)
+    return regressions
+
+
+def print_table(results):
+    print(f"{'规模':>8}  {'操作':<28} {'次数':>4} {'最小(ms)':>10} {'中位(ms)':>10} {'最大(ms)':>10}", file=sys.stderr)
+    for item in results:
+        print(f"{item['size']:>8}  {item['name']:<28} {item['runs']:>4} {item['min'] * 1000:>10.2f} "
+              f"{item['median'] * 1000:>10.2f} {item['max'] * 1000:>10.2f}", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='命令管理工具性能测试')
+    parser.add_argument('--sizes', default='1k,100k', help='测试库规模，逗号分隔（例如 1k,100k,1m）')
+    parser.add_argument('--repeat', type=int, default=5, help='每个操作的测量次数（默认5）')
+    parser.add_argument('--tk', choices=['auto', 'on', 'off'], default='auto',
+                        help='是否测量Tk界面操作（auto: 有图形环境或Xvfb时测量）')
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED, help='生成测试库的随机数种子')
+    parser.add_argument('--cache-dir', default=os.path.join(tempfile.gettempdir(), 'command_manager_bench'),
+                        help='生成的测试库缓存目录')
+    parser.add_argument('--regenerate', action='store_true', help='重新生成测试库')
+    parser.add_argument('-o', '--output', default='-', help='结果JSON文件（默认输出到标准输出）')
+    parser.add_argument('--compare', help='与之前保存的结果JSON比较')
+    parser.add_argument('--threshold', type=float, default=1.25, help='中位数超过基准的该倍数时视为变慢')
+    args = parser.parse_args()
+
+    display, tk_skip_reason = (None, "已通过 --tk off 关闭") if args.tk == 'off' else start_virtual_display()
+    if tk_skip_reason and args.tk == 'on':
+        parser.error(f"无法测量Tk界面操作: {tk_skip_reason}")
+
+    results = []
+    try:
+        for size_text in args.sizes.split(','):
+            size = parse_size(size_text)
+            path = prepare_library(size, args.cache_dir, args.seed, args.regenerate)
+            with tempfile.TemporaryDirectory() as scratch_dir:
+                print(f"正在测试 {size} 条命令...", file=sys.stderr)
+                size_results = run_headless(path, scratch_dir, args.repeat)
+                if not tk_skip_reason:
+                    size_results += run_tk(path, scratch_dir, args.repeat)
+            for item in size_results:
+                item['size'] = size
+            results += size_results
+    finally:
+        if display:
+            display.terminate()
+
+    report = {
+        'meta': {
+            'time': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'machine': platform.machine(),
+            'seed': args.seed,
+            'repeat': args.repeat,
+            'tk': tk_skip_reason or 'measured',
+        },
+        'results': results,
+    }
+
+    print_table(results)
+    if tk_skip_reason:
+        print(f"跳过Tk界面操作: {tk_skip_reason}", file=sys.stderr)
+
+    if args.output == '-':
+        json.dump(report, sys.stdout, ensure_ascii=False, indent=2)
+        sys.stdout.write('\n')
+    else:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    if args.compare and compare(results, args.compare, args.threshold):
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -36,7 +36,8 @@ def main():
         import tkinter as tk
 
         root = tk.Tk()
-        app = CommandManager(root)
+        # --profile: 从启动开始记录性能分析数据，退出时保存到 data/diagnostics/
+        app = CommandManager(root, profile='--profile' in sys.argv[1:])
         root.mainloop()
 
     except Exception as e:
@@ -4,23 +4,320 @@
 创建独立应用程序脚本
 不依赖PyInstaller，创建可独立运行的脚本包
 包含Windows bat文件支持
+
+增量打包：便携目录中保存上次打包的文件清单（大小、修改时间、sha1），
+只复制有变化的文件；ZIP中未修改的文件直接沿用上次压缩的数据，
+其余文件在多个线程中并行压缩。打包结束时输出每个阶段的耗时。
+
+单文件版（pyz）：src/ 下的模块和每个可用解释器版本预编译的字节码打包为一个
+zipapp，运行时按当前解释器版本加载对应的字节码，没有对应版本时才编译源码。
 """
 
+import fnmatch
+import hashlib
+import json
 import os
 import shutil
+import statistics
+import struct
+import subprocess
+import tempfile
+import time
+import zipapp
 import zipfile
+import zlib
 import sys
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from pathlib import Path
 
+OUTPUT_DIR = Path("CommandManager_Portable")
+ZIP_NAME = "CommandManager_v1.0.0_Portable.zip"
+
+# 便携目录中的打包清单（不打包进ZIP）
+MANIFEST_NAME = ".build_manifest.json"
+
+# 不打包的目录和文件
+EXCLUDE_DIRS = {"__pycache__", "backups", ".git"}
+EXCLUDE_PATTERNS = ["*.pyc", "*.pyo", "*.swp", ".DS_Store"]
+# data 目录中的数据库、日志和诊断文件，以及超过 LARGE_DATA_FILE 的文件
+DATA_ARTIFACT_PATTERNS = ["*.db", "*.db-wal", "*.db-shm", "*.log", "*.log.*", "*.zip", "*.prof"]
+LARGE_DATA_FILE = 1024 * 1024
+
+ZIP_COMPRESS_LEVEL = 6
+ZIP_UTF8_FLAG = 0x800
+ZIP_CREATE_VERSION = (3 << 8) | 20  # Unix，保留文件权限
+
+# ZIP成员：method 为 0（存储）或 8（deflate），data 为压缩后的数据
+ZipMember = namedtuple('ZipMember', 'arcname method crc size dostime dosdate external_attr data')
+
+PYZ_NAME = "CommandManager.pyz"
+PYZ_INTERPRETER = "/usr/bin/env python3"
+# 在 PATH 中查找这些解释器，为每个版本预编译字节码（也可以在命令行中指定解释器路径）
+PYZ_PYTHONS = [f"python3.{minor}" for minor in range(6, 15)]
+# 启动后立即执行的模块，其余模块在第一次使用其中的名称时才执行（importlib.util.LazyLoader）。
+# 只用 import x 导入、本次运行没有用到的模块不会执行；设置环境变量 CM_PYZ_EAGER=1 时全部立即执行，
+# 用于在 measure_startup 中比较
+PYZ_EAGER_MODULES = ["cli", "command_manager"]
+
+# 在各版本解释器中运行：编译 src/ 下的模块，输出该版本的 cache_tag
+PYZ_COMPILE_SCRIPT = """
+import os, py_compile, sys
+src, out = sys.argv[1], sys.argv[2]
+tag = sys.implementation.cache_tag
+for name in sorted(os.listdir(src)):
+    if name.endswith('.py'):
+        py_compile.compile(os.path.join(src, name), os.path.join(out, name[:-3] + '.' + tag + '.pyc'),
+                           dfile='src/' + name, doraise=True)
+print(tag)
+"""
+
+# 单文件版的入口
+PYZ_MAIN = '''# -*- coding: utf-8 -*-
+"""
+命令管理工具 - 单文件版入口（由 make_standalone.py 生成）
+用法: python CommandManager.pyz [--profile] | python CommandManager.pyz cm <子命令> | python CommandManager.pyz --check
+
+src/ 下的模块从压缩包中加载，优先使用当前解释器版本预编译的字节码。
+模块的 __file__ 指向压缩包所在目录下的 src/，数据仍保存在压缩包旁边的 data/ 目录。
+"""
+
+import importlib.util
+import json
+import marshal
+import os
+import sys
+
+ARCHIVE = os.path.dirname(os.path.abspath(__file__))
+BASE_DIR = os.path.dirname(ARCHIVE)
+CACHE_TAG = sys.implementation.cache_tag
+# pyc文件头：3.7 起为16字节（魔数、标志、修改时间、大小），之前为12字节
+PYC_HEADER = 16 if sys.version_info >= (3, 7) else 12
+
+if hasattr(__loader__, 'get_data'):
+    ARCHIVE_READER = __loader__
+else:
+    from zipimport import zipimporter
+    ARCHIVE_READER = zipimporter(ARCHIVE)
+
+
+def read(name):
+    # 旧版本的 zipimporter 只接受与它自己的 archive 属性前缀相同的路径
+    return ARCHIVE_READER.get_data(os.path.join(ARCHIVE_READER.archive, name))
+
+
+INDEX = json.loads(read('pyz_index.json').decode('utf-8'))
+HAS_BYTECODE = CACHE_TAG in INDEX['tags']
+
+
+class ArchiveLoader:
+    """加载压缩包中 src/ 下的模块"""
+
+    def __init__(self, name):
+        self.name = name
+        self.path = os.path.join(BASE_DIR, 'src', name + '.py')
+
+    def create_module(self, spec):
+        return None
+
+    def exec_module(self, module):
+        exec(self.get_code(module.__name__), module.__dict__)
+
+    def is_package(self, name):
+        return False
+
+    def get_code(self, name):
+        if HAS_BYTECODE:
+            data = read(f'src/__pycache__/{name}.{CACHE_TAG}.pyc')
+            if data[:4] == importlib.util.MAGIC_NUMBER:
+                code = marshal.loads(data[PYC_HEADER:])
+                try:
+                    import _imp
+                    _imp._fix_co_filename(code, self.path)
+                except (ImportError, AttributeError):
+                    pass
+                return code
+        return compile(self.get_source(name), self.path, 'exec', dont_inherit=True)
+
+    def get_source(self, name):
+        return read(f'src/{name}.py').decode('utf-8')
+
+
+class ArchiveFinder:
+    """只处理压缩包中的模块，其他模块交给默认的查找器"""
+
+    modules = set(INDEX['modules'])
+    eager = modules if os.environ.get('CM_PYZ_EAGER') else set(INDEX['eager'])
+
+    @classmethod
+    def find_spec(cls, name, path=None, target=None):
+        if name not in cls.modules:
+            return None
+        loader = ArchiveLoader(name)
+        if name not in cls.eager:
+            loader = importlib.util.LazyLoader(loader)
+        return importlib.util.spec_from_file_location(name, os.path.join(BASE_DIR, 'src', name + '.py'),
+                                                      loader=loader)
+
+
+def main():
+    sys.meta_path.insert(0, ArchiveFinder)
+    args = sys.argv[1:]
+
+    if args[:1] == ['cm']:
+        import cli
+        return cli.main(args[1:])
+
+    if args[:1] == ['--check']:
+        import command_manager
+        print(f"Python {sys.version.split()[0]}（{CACHE_TAG}）："
+              f"{'使用预编译字节码' if HAS_BYTECODE else '没有该版本的预编译字节码，从源码编译'}")
+        return 0
+
+    try:
+        os.chdir(BASE_DIR)
+        import tkinter as tk
+        from command_manager import CommandManager
+
+        root = tk.Tk()
+        CommandManager(root, profile='--profile' in args)
+        root.mainloop()
+    except Exception as e:
+        if sys.platform == 'win32':
+            import ctypes
+            ctypes.windll.user32.MessageBoxW(0, f"程序启动失败：\\n{e}", "错误", 0)
+        else:
+            print(f"程序启动失败：{e}")
+            input("按回车键退出...")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
+'''
+
+# 各阶段耗时 [(阶段, 秒)]
+STAGE_TIMES = []
+
+
+@contextmanager
+def build_stage(name):
+    """记录一个打包阶段的耗时"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_TIMES.append((name, time.perf_counter() - start))
+
+
+def print_stage_times():
+    if not STAGE_TIMES:
+        return
+    print("\n各阶段耗时:")
+    for name, seconds in STAGE_TIMES:
+        print(f"   {name}: {seconds:.2f} 秒")
+    print(f"   合计: {sum(seconds for _, seconds in STAGE_TIMES):.2f} 秒")
+
+
+def is_excluded(path):
+    """是否不打包该文件（path 为相对项目目录的路径）"""
+    if EXCLUDE_DIRS.intersection(path.parts[:-1]):
+        return True
+    if any(fnmatch.fnmatch(path.name, pattern) for pattern in EXCLUDE_PATTERNS):
+        return True
+    if "data" in path.parts[:-1]:
+        if any(fnmatch.fnmatch(path.name, pattern) for pattern in DATA_ARTIFACT_PATTERNS):
+            return True
+        return path.stat().st_size > LARGE_DATA_FILE
+    return False
+
+
+def iter_source_files(src):
+    """列出要打包的文件（不存在的路径返回空）"""
+    if src.is_file():
+        if not is_excluded(src):
+            yield src
+        return
+    for root, dirs, filenames in os.walk(src):
+        dirs[:] = sorted(d for d in dirs if d not in EXCLUDE_DIRS)
+        for filename in sorted(filenames):
+            path = Path(root) / filename
+            if not is_excluded(path):
+                yield path
+
+
+def file_sha1(path):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def file_entry(path):
+    """清单条目 [大小, 修改时间(纳秒), sha1]"""
+    stat = path.stat()
+    return [stat.st_size, stat.st_mtime_ns, file_sha1(path)]
+
+
+def load_manifest(output_dir):
+    try:
+        with open(output_dir / MANIFEST_NAME, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(output_dir, manifest):
+    with open(output_dir / MANIFEST_NAME, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1, sort_keys=True)
+
+
+def sync_file(src, dst, previous):
+    """把 src 复制到 dst，返回 (清单条目, 是否复制)
+
+    大小和修改时间与上次打包相同时不读取文件；不同时比较sha1，内容没有变化就不复制。
+    """
+    stat = src.stat()
+    if dst.exists() and previous:
+        if previous[:2] == [stat.st_size, stat.st_mtime_ns]:
+            return previous, False
+        digest = file_sha1(src)
+        if previous[2] == digest:
+            shutil.copystat(src, dst)
+            return [stat.st_size, stat.st_mtime_ns, digest], False
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    shutil.copy2(src, dst)
+    return file_entry(dst), True
+
+
+def remove_stale_files(output_dir, stale):
+    """删除上次打包有、这次没有的文件，以及因此变空的目录"""
+    for rel in stale:
+        path = output_dir / rel
+        if path.exists():
+            path.unlink()
+            print(f"删除文件: {path}")
+        parent = path.parent
+        while parent != output_dir and parent.exists() and not any(parent.iterdir()):
+            parent.rmdir()
+            parent = parent.parent
+
 def create_portable_package():
     """创建便携式应用程序包"""
     print("正在创建便携式应用程序包...")
 
-    # 创建输出目录
-    output_dir = Path("CommandManager_Portable")
-    if output_dir.exists():
+    # 创建输出目录（沿用上次打包的文件）
+    output_dir = OUTPUT_DIR
+    manifest = load_manifest(output_dir)
+    previous_files = manifest.get('files', {})
+    if output_dir.exists() and not previous_files:
+        # 没有清单的目录无法判断哪些文件可以沿用
         shutil.rmtree(output_dir)
-    output_dir.mkdir()
+    output_dir.mkdir(exist_ok=True)
+    files = {}  # 本次打包的文件: 相对路径 -> [大小, 修改时间, sha1]
 
     # 复制必要文件
     files_to_copy = [
@@ -38,25 +335,33 @@ def create_portable_package():
         if Path(bat_file).exists():
             files_to_copy.append(bat_file)
 
-    # 添加sh文件（如果存在）
+    # 添加sh文件（如果存在；非Windows环境下 start.sh 在后面重新生成，不需要复制）
     sh_files = ["start.sh", "quick_start.sh"]
     for sh_file in sh_files:
-        if Path(sh_file).exists():
+        if Path(sh_file).exists() and not (sh_file == "start.sh" and sys.platform != "win32"):
             files_to_copy.append(sh_file)
 
-    for item in files_to_copy:
-        src = Path(item)
-        dst = output_dir / item
-
-        if src.is_file():
-            dst.parent.mkdir(parents=True, exist_ok=True)
-            shutil.copy2(src, dst)
-            print(f"复制文件: {src} -> {dst}")
-        elif src.is_dir():
-            if dst.exists():
-                shutil.rmtree(dst)
-            shutil.copytree(src, dst)
-            print(f"复制目录: {src} -> {dst}")
+    # 添加命令行工具（如果存在）
+    for cli_file in ["cm", "cm.bat"]:
+        if Path(cli_file).exists():
+            files_to_copy.append(cli_file)
+
+    copied = skipped = 0
+    with build_stage("复制文件"):
+        for item in files_to_copy:
+            for src in iter_source_files(Path(item)):
+                rel = src.as_posix()
+                dst = output_dir / rel
+                files[rel], changed = sync_file(src, dst, previous_files.get(rel))
+                if changed:
+                    copied += 1
+                    print(f"复制文件: {src} -> {dst}")
+                else:
+                    skipped += 1
+    print(f"复制 {copied} 个文件，跳过 {skipped} 个未修改的文件")
+
+    generate_start = time.perf_counter()
+    generated = []
 
     # 创建启动脚本
     if sys.platform == "win32":
@@ -114,6 +419,7 @@ if errorlevel 1 (
 )
 ''')
             print(f"创建Windows启动脚本: {start_script}")
+            generated.append(start_script)
 
         if not Path("快速启动.bat").exists():
             quick_script = output_dir / "快速启动.bat"
@@ -123,6 +429,7 @@ python launcher.py
 pause
 ''')
             print(f"创建Windows快速启动脚本: {quick_script}")
+            generated.append(quick_script)
 
     else:
         # Unix/Linux/macOS shell脚本
@@ -169,6 +476,7 @@ fi
 ''')
         start_script.chmod(0o755)
         print(f"创建Unix启动脚本: {start_script}")
+        generated.append(start_script)
 
     # 创建安装说明
     install_guide = output_dir / "安装使用说明.txt"
@@ -207,6 +515,7 @@ macOS/Linux用户：
 祝您使用愉快！
 ''')
     print(f"创建安装说明: {install_guide}")
+    generated.append(install_guide)
 
     # 创建版本信息
     version_info = output_dir / "version.txt"
@@ -217,6 +526,15 @@ Python版本: {sys.version}
 平台: {sys.platform}
 ''')
     print(f"创建版本信息: {version_info}")
+    generated.append(version_info)
+
+    for path in generated:
+        files[path.relative_to(output_dir).as_posix()] = file_entry(path)
+    STAGE_TIMES.append(("生成启动脚本和说明", time.perf_counter() - generate_start))
+
+    remove_stale_files(output_dir, sorted(set(previous_files) - set(files)))
+    manifest['files'] = files
+    save_manifest(output_dir, manifest)
 
     print(f"\n✅ 便携式应用程序包创建完成！")
     print(f"📁 输出目录: {output_dir.absolute()}")
@@ -230,29 +548,222 @@ Python版本: {sys.version}
 
     return output_dir
 
+def dos_datetime(mtime):
+    """ZIP使用的DOS格式时间和日期"""
+    t = time.localtime(max(mtime, 315532800))  # 不早于1980年
+    return (t.tm_hour << 11 | t.tm_min << 5 | t.tm_sec // 2,
+            (t.tm_year - 1980) << 9 | t.tm_mon << 5 | t.tm_mday)
+
+
+def compress_file(path, arcname):
+    """读取并压缩一个文件（zlib压缩时释放GIL，可以在多个线程中并行）"""
+    stat = path.stat()
+    data = path.read_bytes()
+    compressor = zlib.compressobj(ZIP_COMPRESS_LEVEL, zlib.DEFLATED, -15)
+    compressed = compressor.compress(data) + compressor.flush()
+    method = zipfile.ZIP_DEFLATED
+    if len(compressed) >= len(data):
+        method, compressed = zipfile.ZIP_STORED, data
+    dostime, dosdate = dos_datetime(stat.st_mtime)
+    return ZipMember(arcname, method, zlib.crc32(data), len(data), dostime, dosdate,
+                     (stat.st_mode & 0xFFFF) << 16, compressed)
+
+
+def read_zip_members(zip_path, arcnames):
+    """从上次生成的ZIP中读取指定成员压缩后的数据，返回 {成员名: ZipMember}"""
+    members = {}
+    if not arcnames or not zip_path.exists():
+        return members
+    try:
+        with zipfile.ZipFile(zip_path) as zipf, open(zip_path, 'rb') as f:
+            for info in zipf.infolist():
+                if (info.filename not in arcnames or info.flag_bits & 0x08
+                        or info.compress_type not in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED)):
+                    continue
+                f.seek(info.header_offset)
+                header = f.read(30)
+                dostime, dosdate = struct.unpack('<HH', header[10:14])
+                name_length, extra_length = struct.unpack('<HH', header[26:30])
+                f.seek(info.header_offset + 30 + name_length + extra_length)
+                members[info.filename] = ZipMember(info.filename, info.compress_type, info.CRC, info.file_size,
+                                                   dostime, dosdate, info.external_attr,
+                                                   f.read(info.compress_size))
+    except (OSError, zipfile.BadZipFile, struct.error) as e:
+        print(f"读取上次的ZIP压缩包失败，全部重新压缩: {e}")
+        return {}
+    return members
+
+
+def write_zip(path, members):
+    """按顺序写入已压缩的成员"""
+    central = []
+    with open(path, 'wb') as f:
+        for member in members:
+            name = member.arcname.encode('utf-8')
+            offset = f.tell()
+            if offset > 0xFFFFFFFF:
+                raise ValueError("ZIP压缩包超过4GB")
+            f.write(struct.pack('<IHHHHHIIIHH', 0x04034b50, 20, ZIP_UTF8_FLAG, member.method,
+                                member.dostime, member.dosdate, member.crc, len(member.data),
+                                member.size, len(name), 0))
+            f.write(name)
+            f.write(member.data)
+            central.append(struct.pack('<IHHHHHHIIIHHHHHII', 0x02014b50, ZIP_CREATE_VERSION, 20,
+                                       ZIP_UTF8_FLAG, member.method, member.dostime, member.dosdate,
+                                       member.crc, len(member.data), member.size, len(name), 0, 0, 0, 0,
+                                       member.external_attr, offset) + name)
+        start = f.tell()
+        f.write(b''.join(central))
+        f.write(struct.pack('<IHHHHIIH', 0x06054b50, 0, 0, len(members), len(members),
+                            f.tell() - start, start, 0))
+
+
 def create_zip_package():
-    """创建ZIP压缩包"""
+    """创建ZIP压缩包（沿用上次压缩包中未修改的文件，其余文件并行压缩）"""
     print("正在创建ZIP压缩包...")
 
     portable_dir = create_portable_package()
 
-    zip_name = "CommandManager_v1.0.0_Portable.zip"
-    zip_path = Path(zip_name)
-
-    if zip_path.exists():
-        zip_path.unlink()
-
-    with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-        for file_path in portable_dir.rglob('*'):
-            if file_path.is_file():
-                arcname = file_path.relative_to(portable_dir.parent)
-                zipf.write(file_path, arcname)
+    zip_path = Path(ZIP_NAME)
+    manifest = load_manifest(portable_dir)
+    files = manifest['files']
+    previous = manifest.get('zip', {})
+    arcnames = {rel: f"{portable_dir.name}/{rel}" for rel in sorted(files)}
+
+    with build_stage("压缩"):
+        reused = read_zip_members(zip_path, {arcname for rel, arcname in arcnames.items()
+                                             if previous.get(arcname) == files[rel][2]})
+        pending = [rel for rel, arcname in arcnames.items() if arcname not in reused]
+        with ThreadPoolExecutor(max_workers=os.cpu_count() or 1) as pool:
+            compressed = dict(zip(pending, pool.map(
+                lambda rel: compress_file(portable_dir / rel, arcnames[rel]), pending)))
+    print(f"压缩 {len(compressed)} 个文件，沿用 {len(reused)} 个未修改的文件")
+
+    with build_stage("写入ZIP"):
+        members = [reused.get(arcname) or compressed[rel] for rel, arcname in arcnames.items()]
+        temp_path = zip_path.with_name(zip_path.name + '.tmp')
+        write_zip(temp_path, members)
+        os.replace(temp_path, zip_path)
+
+    manifest['zip'] = {arcname: files[rel][2] for rel, arcname in arcnames.items()}
+    save_manifest(portable_dir, manifest)
 
     print(f"✅ ZIP压缩包创建完成: {zip_path}")
     print(f"📦 大小: {zip_path.stat().st_size / 1024 / 1024:.1f} MB")
 
     return zip_path
 
+def find_interpreters(extra=()):
+    """可用的解释器 [(路径, cache_tag)]，同一版本只保留第一个"""
+    candidates = [sys.executable] + list(extra)
+    candidates += [path for path in (shutil.which(name) for name in PYZ_PYTHONS) if path]
+    found = {}
+    for path in candidates:
+        try:
+            result = subprocess.run([path, '-c', 'import sys; print(sys.implementation.cache_tag)'],
+                                    capture_output=True, text=True, timeout=30)
+        except (OSError, subprocess.TimeoutExpired):
+            continue
+        tag = result.stdout.strip()
+        if result.returncode == 0 and tag and tag not in found:
+            found[tag] = path
+    return [(path, tag) for tag, path in found.items()]
+
+
+def create_pyz_package(extra_interpreters=()):
+    """创建单文件版：src/ 的源码和各版本预编译的字节码打包为一个 zipapp"""
+    print("正在创建单文件版...")
+    pyz_path = Path(PYZ_NAME)
+    sources = [path for path in iter_source_files(Path("src")) if path.suffix == '.py' and path.parent == Path("src")]
+
+    with tempfile.TemporaryDirectory() as staging:
+        staging = Path(staging)
+        cache_dir = staging / "src" / "__pycache__"
+        cache_dir.mkdir(parents=True)
+        for path in sources:
+            shutil.copy2(path, staging / "src" / path.name)
+
+        tags = []
+        with build_stage("预编译字节码"):
+            for interpreter, tag in find_interpreters(extra_interpreters):
+                result = subprocess.run([interpreter, '-c', PYZ_COMPILE_SCRIPT, str(staging / "src"), str(cache_dir)],
+                                        capture_output=True, text=True)
+                if result.returncode == 0:
+                    tags.append(tag)
+                    print(f"预编译字节码: {tag} ({interpreter})")
+                else:
+                    # 不支持的版本（例如语法不兼容）只能从源码运行
+                    error = (result.stderr.strip().splitlines() or [''])[-1]
+                    print(f"跳过 {tag} ({interpreter}): {error}")
+                    for pyc in cache_dir.glob(f"*.{tag}.pyc"):
+                        pyc.unlink()
+
+        modules = sorted(path.stem for path in sources)
+        with open(staging / "pyz_index.json", 'w', encoding='utf-8') as f:
+            json.dump({"modules": modules, "tags": tags,
+                       "eager": [name for name in PYZ_EAGER_MODULES if name in modules]}, f)
+        with open(staging / "__main__.py", 'w', encoding='utf-8') as f:
+            f.write(PYZ_MAIN)
+
+        with build_stage("写入pyz"):
+            temp_path = pyz_path.with_name(pyz_path.name + '.tmp')
+            zipapp.create_archive(staging, temp_path, interpreter=PYZ_INTERPRETER, compressed=True)
+            os.replace(temp_path, pyz_path)
+
+    print(f"✅ 单文件版创建完成: {pyz_path}（{len(modules)} 个模块，字节码版本: {', '.join(tags) or '无'}）")
+    print(f"📦 大小: {pyz_path.stat().st_size / 1024:.0f} KB")
+    return pyz_path
+
+
+def time_command(command, runs, cwd=None, env=None):
+    """多次运行命令，返回耗时的中位数（毫秒）"""
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(command, cwd=cwd, env=env, check=True, stdout=subprocess.DEVNULL)
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times)
+
+
+def measure_startup(pyz_path, runs=7):
+    """比较源码启动（没有字节码缓存 / 有字节码缓存）和单文件版（延迟加载 / 全部立即加载）的冷启动耗时
+
+    分别测量导入界面模块，以及运行一次 cm list；每次都启动新的解释器进程。
+    没有字节码缓存的情况相当于在只读共享目录或不同版本的Python上运行源码版。
+    """
+    pyz_path = pyz_path.absolute()
+    results = []
+    with tempfile.TemporaryDirectory() as work, build_stage("测量启动耗时"):
+        work = Path(work)
+        shutil.copytree("src", work / "src", ignore=shutil.ignore_patterns("__pycache__", "*.pyc"))
+        shutil.copy2("cm", work / "cm")
+        db_path = str(work / "measure.db")
+        subprocess.run([sys.executable, str(work / "cm"), "--db", db_path, "add", "示例", "echo hello"],
+                       check=True, stdout=subprocess.DEVNULL)
+
+        no_cache = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+        import_gui = "import sys; sys.path.insert(0, 'src'); import command_manager"
+        source_cli = [sys.executable, str(work / "cm"), "--db", db_path, "list"]
+        pyz_cli = [sys.executable, str(pyz_path), "cm", "--db", db_path, "list"]
+
+        results.append(("源码（无字节码缓存）导入界面", time_command([sys.executable, "-c", import_gui], runs, work, no_cache)))
+        results.append(("源码（无字节码缓存）cm list", time_command(source_cli, runs, work, no_cache)))
+        subprocess.run([sys.executable, "-m", "compileall", "-q", str(work / "src")], check=True)
+        results.append(("源码（有字节码缓存）导入界面", time_command([sys.executable, "-c", import_gui], runs, work)))
+        results.append(("源码（有字节码缓存）cm list", time_command(source_cli, runs, work)))
+        results.append(("单文件版 导入界面", time_command([sys.executable, str(pyz_path), "--check"], runs, work)))
+        results.append(("单文件版 cm list", time_command(pyz_cli, runs, work)))
+        eager = dict(os.environ, CM_PYZ_EAGER="1")
+        results.append(("单文件版（不延迟加载）导入界面",
+                        time_command([sys.executable, str(pyz_path), "--check"], runs, work, eager)))
+        results.append(("单文件版（不延迟加载）cm list", time_command(pyz_cli, runs, work, eager)))
+
+    print(f"\n启动耗时（{runs} 次的中位数，Python {sys.version.split()[0]}）:")
+    for name, milliseconds in results:
+        print(f"   {name}: {milliseconds:.0f} ms")
+    return results
+
+
 def main():
     """主函数"""
     print("命令管理工具 - 便携版打包工具")
@@ -261,14 +772,20 @@ def main():
     if len(sys.argv) > 1 and sys.argv[1] == "zip":
         # 创建ZIP压缩包
         create_zip_package()
+    elif len(sys.argv) > 1 and sys.argv[1] == "pyz":
+        # 创建单文件版（后面的参数为额外的解释器路径），并与源码版比较启动耗时
+        measure_startup(create_pyz_package(sys.argv[2:]))
     else:
         # 只创建便携式目录
         create_portable_package()
 
+    print_stage_times()
+
     print("\n打包完成！您可以：")
     print("1. 直接使用便携式目录")
-    print("2. 运行 'python make_standalone_fixed.py zip' 创建ZIP压缩包")
+    print("2. 运行 'python make_standalone.py zip' 创建ZIP压缩包")
     print("3. 将整个目录复制到其他设备使用")
+    print("4. 运行 'python make_standalone.py pyz' 创建单文件版 CommandManager.pyz")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+笔记附件
+附件内容保存在 attachment_data 表中，文件名、类型、大小、图片尺寸和sha1等元数据
+保存在 note_attachments 表中：列出附件只读取元数据，不会读取附件内容。
+附件内容通过SQLite的增量BLOB接口（Connection.blobopen，Python 3.11起）按块写入和读取，
+大文件不需要整个读入内存；更早的Python按块读取时使用 substr()，写入时一次写入。
+已删除的笔记的附件在数据库维护时清理；撤销日志中还能恢复的笔记的附件保留，
+撤销删除笔记后附件仍然存在。
+（本模块不依赖tkinter）
+"""
+
+import hashlib
+import mimetypes
+import os
+import struct
+from collections import OrderedDict
+
+# 每次读写的块大小
+CHUNK_SIZE = 256 * 1024
+# 单个附件的最大大小（SQLite默认的最大BLOB长度约为1GB）
+MAX_ATTACHMENT_SIZE = 512 * 1024 * 1024
+# 缩略图缓存保存的图片数
+THUMBNAIL_CACHE_SIZE = 64
+# 生成缩略图的图片类型（Tk可以直接显示的格式）、最大文件大小和缩略图边长
+THUMBNAIL_TYPES = ('image/png', 'image/gif')
+THUMBNAIL_MAX_SIZE = 8 * 1024 * 1024
+THUMBNAIL_EDGE = 160
+
+ATTACHMENT_COLUMNS = 'id, filename, mime_type, size, width, height, sha1, created_at'
+
+# 笔记已删除、并且不能通过撤销恢复的附件
+ORPHAN_CONDITION = '''
+    note_id NOT IN (SELECT id FROM notes)
+    AND note_id NOT IN (SELECT row_id FROM undo_journal WHERE table_name = 'notes')
+'''
+
+
+def create_tables(cursor):
+    """附件元数据表和内容表"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS note_attachments (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            note_id INTEGER NOT NULL,
+            filename TEXT NOT NULL,
+            mime_type TEXT,
+            size INTEGER NOT NULL,
+            width INTEGER,
+            height INTEGER,
+            sha1 TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_note_attachments_note ON note_attachments (note_id)')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS attachment_data (
+            attachment_id INTEGER PRIMARY KEY,
+            data BLOB NOT NULL
+        )
+    ''')
+
+
+def image_size(header):
+    """从文件开头的数据中读取 PNG、GIF、JPEG 图片的尺寸，返回 (宽, 高) 或 (None, None)"""
+    if header[:8] == b'\x89PNG\r\n\x1a\n' and header[12:16] == b'IHDR':
+        return struct.unpack('>II', header[16:24])
+    if header[:6] in (b'GIF87a', b'GIF89a'):
+        return struct.unpack('<HH', header[6:10])
+    if header[:2] == b'\xff\xd8':
+        # 依次跳过JPEG的各个段，直到SOF段
+        position = 2
+        while position + 9 <= len(header):
+            if header[position] != 0xFF:
+                break
+            marker = header[position + 1]
+            length = struct.unpack('>H', header[position + 2:position + 4])[0]
+            if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+                height, width = struct.unpack('>HH', header[position + 5:position + 9])
+                return width, height
+            position += 2 + length
+    return None, None
+
+
+def add_attachment(cursor, note_id, path, filename=None):
+    """把文件添加为笔记的附件（不提交事务），返回附件ID
+
+    先插入 zeroblob 占位，再按块写入文件内容，同时计算sha1和图片尺寸。
+    """
+    size = os.path.getsize(path)
+    if size > MAX_ATTACHMENT_SIZE:
+        raise ValueError(f"附件不能超过 {MAX_ATTACHMENT_SIZE // 1024 // 1024} MB")
+    filename = filename or os.path.basename(path)
+    mime_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+    cursor.execute('INSERT INTO note_attachments (note_id, filename, mime_type, size) VALUES (?, ?, ?, ?)',
+                   (note_id, filename, mime_type, size))
+    attachment_id = cursor.lastrowid
+    cursor.execute('INSERT INTO attachment_data (attachment_id, data) VALUES (?, zeroblob(?))',
+                   (attachment_id, size))
+
+    digest = hashlib.sha1()
+    header = []
+
+    def read_chunks(f):
+        remaining = size
+        while remaining:
+            chunk = f.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                raise OSError(f"读取时文件被修改: {path}")
+            remaining -= len(chunk)
+            digest.update(chunk)
+            if not header:
+                header.append(chunk)
+            yield chunk
+
+    with open(path, 'rb') as f:
+        write_blob(cursor.connection, attachment_id, read_chunks(f))
+
+    width, height = image_size(header[0]) if header else (None, None)
+    cursor.execute('UPDATE note_attachments SET sha1 = ?, width = ?, height = ? WHERE id = ?',
+                   (digest.hexdigest(), width, height, attachment_id))
+    return attachment_id
+
+
+def write_blob(conn, attachment_id, chunks):
+    """按块写入附件内容（附件行已用 zeroblob 按最终大小占位）"""
+    if not hasattr(conn, 'blobopen'):
+        conn.execute('UPDATE attachment_data SET data = ? WHERE attachment_id = ?',
+                     (b''.join(chunks), attachment_id))
+        return
+    with conn.blobopen('attachment_data', 'data', attachment_id) as blob:
+        for chunk in chunks:
+            blob.write(chunk)
+
+
+def iter_chunks(conn, attachment_id, chunk_size=CHUNK_SIZE):
+    """按块读取附件内容"""
+    if hasattr(conn, 'blobopen'):
+        with conn.blobopen('attachment_data', 'data', attachment_id, readonly=True) as blob:
+            while True:
+                chunk = blob.read(chunk_size)
+                if not chunk:
+                    return
+                yield chunk
+
+    row = conn.execute('SELECT length(data) FROM attachment_data WHERE attachment_id = ?',
+                       (attachment_id,)).fetchone()
+    if row is None:
+        raise KeyError(f"附件不存在: {attachment_id}")
+    for start in range(0, row[0], chunk_size):
+        yield conn.execute('SELECT substr(data, ?, ?) FROM attachment_data WHERE attachment_id = ?',
+                           (start + 1, chunk_size, attachment_id)).fetchone()[0]
+
+
+def read_attachment(conn, attachment_id):
+    """读取整个附件内容（用于生成缩略图等小文件）"""
+    return b''.join(iter_chunks(conn, attachment_id))
+
+
+def save_attachment(conn, attachment_id, path):
+    """把附件内容按块写入文件，返回写入的字节数"""
+    written = 0
+    with open(path, 'wb') as f:
+        for chunk in iter_chunks(conn, attachment_id):
+            f.write(chunk)
+            written += len(chunk)
+    return written
+
+
+def unique_path(directory, filename):
+    """目录中还不存在的文件路径：同名文件已存在时在扩展名前加上 (2)、(3)……"""
+    filename = os.path.basename(filename)
+    if filename in ('', '.', '..'):
+        filename = 'attachment'
+    stem, extension = os.path.splitext(filename)
+    path = os.path.join(directory, filename)
+    number = 2
+    while os.path.lexists(path):
+        path = os.path.join(directory, f'{stem} ({number}){extension}')
+        number += 1
+    return path
+
+
+def list_attachments(conn, note_id):
+    """笔记的附件列表 [(id, 文件名, 类型, 大小, 宽, 高, sha1, 添加时间)]（不读取附件内容）"""
+    return conn.execute(f'SELECT {ATTACHMENT_COLUMNS} FROM note_attachments WHERE note_id = ? ORDER BY id',
+                        (note_id,)).fetchall()
+
+
+def get_attachment(conn, attachment_id):
+    """附件元数据，格式与 list_attachments 相同，不存在返回 None"""
+    return conn.execute(f'SELECT {ATTACHMENT_COLUMNS} FROM note_attachments WHERE id = ?',
+                        (attachment_id,)).fetchone()
+
+
+def delete_attachments(cursor, attachment_ids):
+    """删除附件（不提交事务）"""
+    attachment_ids = list(attachment_ids)
+    if not attachment_ids:
+        return
+    placeholders = ','.join('?' * len(attachment_ids))
+    cursor.execute(f'DELETE FROM attachment_data WHERE attachment_id IN ({placeholders})', attachment_ids)
+    cursor.execute(f'DELETE FROM note_attachments WHERE id IN ({placeholders})', attachment_ids)
+
+
+def prune_deleted(conn):
+    """删除已不存在、也不能通过撤销恢复的笔记的附件，返回删除的附件数"""
+    conn.execute(f'''
+        DELETE FROM attachment_data WHERE attachment_id IN (
+            SELECT id FROM note_attachments WHERE {ORPHAN_CONDITION})
+    ''')
+    return conn.execute(f'DELETE FROM note_attachments WHERE {ORPHAN_CONDITION}').rowcount
+
+
+class ThumbnailCache:
+    """按 (附件ID, sha1) 缓存生成的缩略图（值由调用方决定，例如 tk.PhotoImage）"""
+
+    def __init__(self, size=THUMBNAIL_CACHE_SIZE):
+        self.size = size
+        self.entries = OrderedDict()
+
+    def get(self, key):
+        value = self.entries.get(key)
+        if value is not None:
+            self.entries.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.size:
+            self.entries.popitem(last=False)
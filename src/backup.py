@@ -7,13 +7,33 @@
 
 import sqlite3
 import os
-import shutil
 from datetime import datetime
 import json
 
+import database
+import maintenance
+from change_feed import ChangeFeed
+
+# 在线备份每一步复制的页数：每步之间释放读锁，包含大量附件的数据库备份时也不会长时间阻塞写入
+BACKUP_STEP_PAGES = 1024
+
+def copy_database(source_file, target_file):
+    """使用SQLite在线备份接口复制数据库
+
+    其他进程正在使用数据库（包括WAL模式）时也能得到一致的快照；
+    目标数据库正被其他实例打开时，它们会通过 PRAGMA data_version 发现内容变化。
+    """
+    source = sqlite3.connect(source_file)
+    target = sqlite3.connect(target_file)
+    try:
+        source.backup(target, pages=BACKUP_STEP_PAGES)
+    finally:
+        target.close()
+        source.close()
+
 def backup_database():
     """备份数据库"""
-    db_file = "command_manager.db"
+    db_file = database.DB_PATH
 
     if not os.path.exists(db_file):
         print("数据库文件不存在，无需备份")
@@ -29,8 +49,7 @@ def backup_database():
     backup_file = f"{backup_dir}/command_manager_backup_{timestamp}.db"
 
     try:
-        # 复制数据库文件
-        shutil.copy2(db_file, backup_file)
+        copy_database(db_file, backup_file)
         print(f"数据库已备份到: {backup_file}")
 
         # 创建备份信息文件
@@ -88,22 +107,60 @@ def restore_from_backup(backup_file):
         print(f"备份文件不存在: {backup_file}")
         return False
 
-    db_file = "command_manager.db"
+    db_file = database.DB_PATH
 
     # 备份当前数据库
+    previous_epoch = 0
     if os.path.exists(db_file):
         current_backup = f"{db_file}.auto_backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-        shutil.copy2(db_file, current_backup)
+        copy_database(db_file, current_backup)
         print(f"当前数据库已备份为: {current_backup}")
 
+        conn = sqlite3.connect(db_file)
+        try:
+            previous_epoch = conn.execute('SELECT epoch FROM db_revision WHERE id = 1').fetchone()[0]
+        except sqlite3.Error:
+            pass
+        finally:
+            conn.close()
+
     try:
-        shutil.copy2(backup_file, db_file)
+        # 原地写入数据库内容而不是替换文件，正在运行的实例不会继续读写旧文件
+        copy_database(backup_file, db_file)
+
+        # 升级旧版本备份的结构，并通知正在运行的实例完整重新加载
+        conn = database.init_database(database.connect(db_file))
+        try:
+            ChangeFeed.mark_replaced(conn.cursor(), previous_epoch)
+            conn.commit()
+        finally:
+            conn.close()
+
         print(f"数据库已从备份恢复: {backup_file}")
         return True
     except Exception as e:
         print(f"恢复失败: {e}")
         return False
 
+def maintain_database(full=False):
+    """维护数据库：完整性检查、更新统计信息、回收空闲空间"""
+    db_file = database.DB_PATH
+
+    if not os.path.exists(db_file):
+        print("数据库文件不存在，无需维护")
+        return False
+
+    try:
+        # 确保数据库结构为最新版本（包括维护记录表）
+        database.init_database(database.connect(db_file)).close()
+        report = maintenance.run_maintenance(db_file, full=full,
+                                             progress=lambda step: print(f"正在执行: {step}"))
+        print(maintenance.format_report(report))
+        return report['integrity'] == 'ok'
+    except Exception as e:
+        print(f"维护失败: {e}")
+        return False
+
 def main():
     """主函数"""
     import sys
@@ -113,6 +170,7 @@ def main():
         print("  python backup.py backup     # 备份数据库")
         print("  python backup.py list       # 列出备份文件")
         print("  python backup.py restore <备份文件>  # 从备份恢复")
+        print("  python backup.py maintain [--full]  # 维护数据库（--full 执行完整VACUUM）")
         return
 
     command = sys.argv[1]
@@ -126,6 +184,8 @@ def main():
             print("请指定备份文件")
             return
         restore_from_backup(sys.argv[2])
+    elif command == "maintain":
+        maintain_database(full='--full' in sys.argv[2:])
     else:
         print("未知命令")
 
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+修改通知
+多个程序实例（图形界面、命令行、本地服务、备份恢复）共用同一个数据库时，
+通过单调递增的修订号发现其他连接的修改，只重新读取修订号变化的行
+"""
+
+# 需要通知的表及其触发修订号变化的列（使用统计等列的变化不通知）
+TRACKED_TABLES = {
+    'commands': ('name', 'command', 'category_id', 'description', 'is_favorite', 'tags'),
+    'categories': ('name', 'description'),
+    'notes': ('title', 'content', 'category', 'tags'),
+}
+
+# 最多保留的删除记录条数，更早的删除记录被清理后，落后的实例需要完整重新加载
+MAX_TOMBSTONES = 5000
+
+
+class ChangeSet:
+    """一次检查发现的修改"""
+
+    def __init__(self, revision, full=False, changed=None, deleted=None):
+        self.revision = revision
+        self.full = full                # 数据库被整体替换（例如从备份恢复），需要完整重新加载
+        self.changed = changed or {}    # 表名 -> 新增或修改的行ID集合
+        self.deleted = deleted or {}    # 表名 -> 删除的行ID集合
+
+    def tables(self):
+        """有修改的表名集合"""
+        return {table for table, ids in self.changed.items() if ids} | \
+               {table for table, ids in self.deleted.items() if ids}
+
+    def count(self):
+        return sum(len(ids) for ids in self.changed.values()) + \
+               sum(len(ids) for ids in self.deleted.values())
+
+
+class ChangeFeed:
+    """修订号修改通知
+
+    db_revision 表保存全局修订号和数据库代号（epoch），数据表上的触发器在每次
+    增删改时递增全局修订号并写入行的 revision 列，删除的行记录在 deleted_rows 中。
+    PRAGMA data_version 只在其他连接提交修改后变化，因此定时检查几乎没有开销。
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.revision, self.epoch, _ = self._state()
+        self.data_version = self._data_version()
+
+    @staticmethod
+    def create_tables(cursor):
+        """创建修订号表、删除记录表和触发器，并清理过旧的删除记录"""
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS db_revision (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                revision INTEGER NOT NULL DEFAULT 0,
+                epoch INTEGER NOT NULL DEFAULT 0,
+                pruned_revision INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        cursor.execute('INSERT OR IGNORE INTO db_revision (id) VALUES (1)')
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS deleted_rows (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                table_name TEXT NOT NULL,
+                row_id INTEGER NOT NULL,
+                revision INTEGER NOT NULL
+            )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_deleted_rows_revision ON deleted_rows (revision)')
+
+        for table, columns in TRACKED_TABLES.items():
+            cursor.execute(f'PRAGMA table_info({table})')
+            if 'revision' not in {row[1] for row in cursor.fetchall()}:
+                cursor.execute(f'ALTER TABLE {table} ADD COLUMN revision INTEGER DEFAULT 0')
+            cursor.execute(f'CREATE INDEX IF NOT EXISTS idx_{table}_revision ON {table} (revision)')
+
+            bump = f'''
+                UPDATE db_revision SET revision = revision + 1 WHERE id = 1;
+                UPDATE {table} SET revision = (SELECT revision FROM db_revision WHERE id = 1)
+                WHERE id = NEW.id;
+            '''
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS trg_{table}_revision_insert
+                AFTER INSERT ON {table}
+                BEGIN {bump} END
+            ''')
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS trg_{table}_revision_update
+                AFTER UPDATE OF {', '.join(columns)} ON {table}
+                BEGIN {bump} END
+            ''')
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS trg_{table}_revision_delete
+                AFTER DELETE ON {table}
+                BEGIN
+                    UPDATE db_revision SET revision = revision + 1 WHERE id = 1;
+                    INSERT INTO deleted_rows (table_name, row_id, revision)
+                    VALUES ('{table}', OLD.id, (SELECT revision FROM db_revision WHERE id = 1));
+                END
+            ''')
+
+        cursor.execute('SELECT revision FROM deleted_rows ORDER BY revision DESC LIMIT 1 OFFSET ?',
+                       (MAX_TOMBSTONES,))
+        row = cursor.fetchone()
+        if row:
+            cursor.execute('DELETE FROM deleted_rows WHERE revision <= ?', row)
+            cursor.execute('UPDATE db_revision SET pruned_revision = MAX(pruned_revision, ?) WHERE id = 1', row)
+
+    @staticmethod
+    def mark_replaced(cursor, previous_epoch=0):
+        """标记数据库已被整体替换（从备份恢复后调用），使所有实例完整重新加载"""
+        cursor.execute('''
+            UPDATE db_revision SET epoch = MAX(epoch, ?) + 1, revision = revision + 1
+            WHERE id = 1
+        ''', (previous_epoch,))
+
+    def _data_version(self):
+        return self.conn.execute('PRAGMA data_version').fetchone()[0]
+
+    def _state(self):
+        return self.conn.execute('SELECT revision, epoch, pruned_revision FROM db_revision WHERE id = 1').fetchone()
+
+    def poll(self):
+        """检查其他连接提交的修改，没有修改时返回 None"""
+        data_version = self._data_version()
+        if data_version == self.data_version:
+            return None
+        self.data_version = data_version
+        return self.changes()
+
+    def changes(self):
+        """读取上次检查以来修订号变化的行，没有修改时返回 None"""
+        revision, epoch, pruned_revision = self._state()
+        if revision == self.revision and epoch == self.epoch:
+            return None
+
+        since = self.revision
+        replaced = epoch != self.epoch or revision < since or since < pruned_revision
+        self.revision, self.epoch = revision, epoch
+        if replaced:
+            return ChangeSet(revision, full=True)
+
+        changed = {}
+        for table in TRACKED_TABLES:
+            cursor = self.conn.execute(f'SELECT id FROM {table} WHERE revision > ?', (since,))
+            changed[table] = {row[0] for row in cursor.fetchall()}
+
+        deleted = {}
+        cursor = self.conn.execute('SELECT table_name, row_id FROM deleted_rows WHERE revision > ?', (since,))
+        for table, row_id in cursor.fetchall():
+            deleted.setdefault(table, set()).add(row_id)
+        # 删除后又被撤销恢复的行按修改处理
+        for table, ids in deleted.items():
+            ids -= changed.get(table, set())
+
+        return ChangeSet(revision, changed=changed, deleted=deleted)
@@ -0,0 +1,548 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+命令行工具（cm）
+无需启动图形界面即可搜索、查看、列出、添加和导入命令，
+输出为制表符分隔的文本，便于在shell管道和fzf中使用
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+
+import database
+
+
+def format_row(row):
+    """把命令列表行格式化为 id<TAB>名称<TAB>分类<TAB>预览"""
+    command_id, name, preview, category, is_favorite = row
+    return f"{command_id}\t{name}\t{category or '未分类'}\t{preview}"
+
+
+def print_rows(rows, as_json=False):
+    """输出命令列表行"""
+    if as_json:
+        print(json.dumps([{"id": command_id, "name": name, "preview": preview,
+                           "category": category, "is_favorite": bool(is_favorite)}
+                          for command_id, name, preview, category, is_favorite in rows],
+                         ensure_ascii=False, indent=2))
+    else:
+        sys.stdout.write(''.join(format_row(row) + '\n' for row in rows))
+
+
+def copy_to_clipboard(text):
+    """使用系统剪贴板工具复制文本，成功返回True"""
+    import shutil
+    import subprocess
+
+    candidates = [
+        ['pbcopy'],
+        ['wl-copy'],
+        ['xclip', '-selection', 'clipboard'],
+        ['xsel', '--clipboard', '--input'],
+        ['clip'],
+    ]
+    for command in candidates:
+        if shutil.which(command[0]):
+            subprocess.run(command, input=text.encode('utf-8'), check=True)
+            return True
+    return False
+
+
+def cmd_search(args):
+    """搜索命令"""
+    conn = database.connect(args.db, readonly=True)
+    if args.fuzzy:
+        from fuzzy_search import TrigramIndex
+
+        index = TrigramIndex()
+        index.build(conn.execute('SELECT id, name, command, description FROM commands'))
+        ranked = index.search(args.term, limit=args.limit)
+        rows = database.get_commands_by_ids(conn, [command_id for command_id, _ in ranked])
+    else:
+        rows = database.search_commands(conn, args.term, args.limit)
+    print_rows(rows, args.json)
+    return 0 if rows else 1
+
+
+def cmd_get(args):
+    """输出一条命令的完整内容"""
+    conn = database.connect(args.db, readonly=True)
+    row = database.get_command(conn, args.key)
+    if not row:
+        print(f"未找到命令: {args.key}", file=sys.stderr)
+        return 1
+
+    command_id, name, command, category, description, is_favorite = row
+    if args.json:
+        print(json.dumps({"id": command_id, "name": name, "command": command, "category": category,
+                          "description": description, "is_favorite": bool(is_favorite)},
+                         ensure_ascii=False, indent=2))
+    else:
+        print(command)
+
+    if args.copy and not copy_to_clipboard(command):
+        print("未找到可用的剪贴板工具", file=sys.stderr)
+        return 1
+    return 0
+
+
+def cmd_render(args):
+    """填写命令模板的参数后输出命令；指定 --csv 时按参数表每行输出一条命令"""
+    import templates
+
+    conn = database.connect(args.db, readonly=True)
+    row = database.get_command(conn, args.key)
+    if not row:
+        print(f"未找到命令: {args.key}", file=sys.stderr)
+        return 1
+
+    values = {}
+    for item in args.set or []:
+        name, sep, value = item.partition('=')
+        if not sep:
+            print(f"参数格式应为 名称=值: {item}", file=sys.stderr)
+            return 1
+        values[name.strip()] = value
+
+    if templates.TEMPLATE_TAG not in database.get_tags(conn, 'commands', row[0]):
+        print(f"命令不是模板（没有 {templates.TEMPLATE_TAG} 标签）: {args.key}", file=sys.stderr)
+        return 1
+
+    try:
+        template = templates.compile_template(row[2])
+        if args.csv:
+            rows = templates.read_csv(args.csv)
+            missing = templates.missing_columns(template, rows)
+            if missing and not all(name in values for name in missing):
+                print(f"参数表缺少列: {', '.join(name for name in missing if name not in values)}", file=sys.stderr)
+                return 1
+            output = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+            try:
+                for command in template.render_rows({**values, **csv_row} for csv_row in rows):
+                    output.write(command + '\n')
+            finally:
+                if args.output:
+                    output.close()
+        else:
+            print(template.render(values))
+    except templates.TemplateError as e:
+        print(e, file=sys.stderr)
+        return 1
+    return 0
+
+
+def cmd_list(args):
+    """列出命令"""
+    conn = database.connect(args.db, readonly=True)
+    print_rows(database.list_commands(conn, args.category, args.favorites, args.tag, not args.any_tag), args.json)
+    return 0
+
+
+def cmd_add(args):
+    """添加命令"""
+    from journal import OperationJournal
+
+    command = sys.stdin.read().strip() if args.command == '-' else args.command
+    if not args.name or not command:
+        print("命令名称和命令内容不能为空", file=sys.stderr)
+        return 1
+
+    conn = database.init_database(database.connect(args.db))
+    duplicates = database.find_duplicate_commands(conn, command)
+    if duplicates and not args.force:
+        for command_id, name in duplicates[:5]:
+            print(f"已存在相同的命令: {command_id}\t{name}", file=sys.stderr)
+        if len(duplicates) > 5:
+            print(f"……共 {len(duplicates)} 个", file=sys.stderr)
+        print("使用 --force 仍然添加", file=sys.stderr)
+        return 1
+
+    cursor = conn.cursor()
+    category_id = database.get_category_id(cursor, args.category, create=True)
+    command_id = database.insert_command(cursor, args.name, command, category_id, args.description,
+                                         tags=args.tag)
+    journal = OperationJournal(conn)
+    journal.record("添加命令", 'commands', {}, journal.snapshot_ids('commands', [command_id]))
+    conn.commit()
+    print(command_id)
+    return 0
+
+
+def cmd_import(args):
+    """从JSON文件导入命令（格式与图形界面“导出选中”相同）"""
+    from journal import OperationJournal
+
+    if args.file == '-':
+        data = json.load(sys.stdin)
+    else:
+        with open(args.file, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    items = data.get('commands', []) if isinstance(data, dict) else data
+
+    conn = database.init_database(database.connect(args.db))
+    cursor = conn.cursor()
+    command_ids = []
+    skipped = duplicates = 0
+    for item in items:
+        name = (item.get('name') or '').strip()
+        command = (item.get('command') or '').strip()
+        if not name or not command:
+            skipped += 1
+            continue
+        # 文件中重复的条目也会因为前面已经插入而被跳过
+        if not args.allow_duplicates and database.find_duplicate_commands(conn, command):
+            duplicates += 1
+            continue
+        category_id = database.get_category_id(cursor, item.get('category'), create=True)
+        command_ids.append(database.insert_command(cursor, name, command, category_id,
+                                                   item.get('description') or '',
+                                                   item.get('is_favorite'), item.get('tags')))
+
+    journal = OperationJournal(conn)
+    journal.record("导入命令", 'commands', {}, journal.snapshot_ids('commands', command_ids))
+    conn.commit()
+    message = f"已导入 {len(command_ids)} 个命令"
+    if duplicates:
+        message += f"，跳过 {duplicates} 个已存在的命令"
+    if skipped:
+        message += f"，跳过 {skipped} 个无效条目"
+    print(message)
+    return 0
+
+
+def cmd_dedup(args):
+    """列出（或合并）重复命令"""
+    import dedup
+    from journal import OperationJournal
+
+    conn = database.init_database(database.connect(args.db))
+    groups = dedup.duplicate_groups(conn)
+    for command_ids in groups:
+        rows = database.get_commands_by_ids(conn, command_ids)
+        print('\n'.join(format_row(row) for row in rows) + '\n')
+
+    if args.near:
+        for rows in dedup.near_duplicate_clusters(conn):
+            print("近似重复:")
+            print('\n'.join(f"{command_id}\t{name}\t{preview}" for command_id, name, preview, _ in rows) + '\n')
+
+    if not groups:
+        print("没有完全重复的命令")
+    elif args.merge:
+        removed = dedup.merge_duplicates(conn.cursor(), groups, OperationJournal(conn))
+        conn.commit()
+        print(f"已合并 {len(groups)} 组重复命令，删除 {len(removed)} 个命令")
+    else:
+        print(f"{len(groups)} 组重复命令，使用 --merge 合并")
+    return 0
+
+
+def cmd_ingest(args):
+    """读取shell历史文件的新增内容，列出或添加候选命令"""
+    import shell_history
+    from journal import OperationJournal
+
+    conn = database.init_database(database.connect(args.db))
+    files = [(path, args.format) for path in args.files] or None
+    stats = shell_history.HistoryIngester(conn).ingest(files)
+    print(f"读取 {stats['files']} 个文件，{stats['bytes']} 字节，{stats['entries']} 条记录，"
+          f"新增 {stats['new_candidates']} 个候选命令，耗时 {stats['seconds']:.2f} 秒", file=sys.stderr)
+
+    candidates = shell_history.list_candidates(conn, args.limit, args.min_count)
+    if args.add:
+        command_ids = shell_history.add_candidates(conn.cursor(), [row[0] for row in candidates])
+        journal = OperationJournal(conn)
+        journal.record("导入Shell历史", 'commands', {}, journal.snapshot_ids('commands', command_ids))
+        conn.commit()
+        print(f"已添加 {len(command_ids)} 个命令到“{shell_history.IMPORT_CATEGORY}”分类")
+    else:
+        for _, command, count, _ in candidates:
+            print(f"{count}\t{database.make_command_preview(command)}")
+    return 0
+
+
+def cmd_alias(args):
+    """查看或设置命令导出到shell的别名"""
+    from journal import OperationJournal
+
+    conn = database.init_database(database.connect(args.db))
+    row = database.get_command(conn, args.key)
+    if not row:
+        print(f"未找到命令: {args.key}", file=sys.stderr)
+        return 1
+    command_id = row[0]
+    if args.alias is None and not args.remove:
+        alias_name = conn.execute('SELECT alias_name FROM commands WHERE id = ?', (command_id,)).fetchone()[0]
+        if alias_name:
+            print(alias_name)
+        return 0 if alias_name else 1
+
+    journal = OperationJournal(conn)
+    before = journal.snapshot_ids('commands', [command_id])
+    database.set_alias(conn.cursor(), command_id, None if args.remove else args.alias)
+    journal.record("设置Shell别名", 'commands', before, journal.snapshot_ids('commands', [command_id]))
+    conn.commit()
+    return 0
+
+
+def cmd_export_shell(args):
+    """导出设置了别名的命令到 aliases.sh、functions.zsh 和 functions.fish"""
+    import shlex
+
+    import shell_export
+
+    output_dir = os.path.abspath(args.output or shell_export.default_output_dir(database.DATA_DIR))
+    if args.init:
+        # 单文件版的 __main__.py 在 CommandManager.pyz 中，通过 python CommandManager.pyz cm 运行
+        main_file = getattr(sys.modules.get('__main__'), '__file__', None)
+        archive = os.path.dirname(os.path.abspath(main_file)) if main_file else ''
+        if os.path.isfile(archive):
+            command = f'{shlex.quote(sys.executable)} {shlex.quote(archive)} cm'
+        else:
+            script = os.path.join(os.path.dirname(database.DATA_DIR), 'cm')
+            command = f'{shlex.quote(sys.executable)} {shlex.quote(script)}'
+        sys.stdout.write(shell_export.init_snippet(args.init, args.db, output_dir, command))
+        return 0
+
+    stats = shell_export.export_aliases(args.db, output_dir, args.force,
+                                        connect=lambda path: database.connect(path, readonly=True))
+    if not args.quiet:
+        if not stats['opened']:
+            print("数据库没有修改，无需重新导出", file=sys.stderr)
+        elif stats['written']:
+            print(f"已导出 {stats['count']} 个命令到 {output_dir}: {', '.join(stats['written'])}", file=sys.stderr)
+        else:
+            print(f"导出的 {stats['count']} 个命令没有变化", file=sys.stderr)
+    return 0
+
+
+def find_note_id(conn, key):
+    """按ID或标题查找笔记，返回笔记ID或 None"""
+    if str(key).isdigit() and database.get_note(conn, int(key)):
+        return int(key)
+    row = conn.execute('SELECT id FROM notes WHERE title = ? ORDER BY id LIMIT 1', (str(key),)).fetchone()
+    return row[0] if row else None
+
+
+def cmd_attach(args):
+    """把文件添加为笔记的附件"""
+    import attachments
+
+    conn = database.init_database(database.connect(args.db))
+    note_id = find_note_id(conn, args.note)
+    if note_id is None:
+        print(f"未找到笔记: {args.note}", file=sys.stderr)
+        return 1
+    cursor = conn.cursor()
+    for path in args.files:
+        attachment_id = attachments.add_attachment(cursor, note_id, path)
+        conn.commit()
+        print(f"{attachment_id}\t{os.path.basename(path)}")
+    return 0
+
+
+def cmd_attachments(args):
+    """列出笔记的附件，或把附件保存到目录"""
+    import attachments
+    from maintenance import format_size
+
+    conn = database.connect(args.db, readonly=True)
+    note_id = find_note_id(conn, args.note)
+    if note_id is None:
+        print(f"未找到笔记: {args.note}", file=sys.stderr)
+        return 1
+    rows = attachments.list_attachments(conn, note_id)
+    if args.save:
+        os.makedirs(args.save, exist_ok=True)
+        for attachment_id, filename, *_ in rows:
+            # 不覆盖已有的文件（同一笔记可以有多个同名附件）
+            path = attachments.unique_path(args.save, filename)
+            attachments.save_attachment(conn, attachment_id, path)
+            print(path)
+        return 0
+    for attachment_id, filename, mime_type, size, width, height, _, created_at in rows:
+        dimensions = f"{width}x{height}" if width else ''
+        print(f"{attachment_id}\t{filename}\t{mime_type}\t{format_size(size)}\t{dimensions}\t{created_at}")
+    return 0
+
+
+def cmd_serve(args):
+    """启动本地HTTP/JSON服务"""
+    import asyncio
+
+    from server import CommandServer
+
+    server = CommandServer(args.db, args.pool_size)
+    try:
+        asyncio.run(server.serve(args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        print("服务已停止")
+    return 0
+
+
+def cmd_sync_export(args):
+    """导出指定修订号之后的修改"""
+    import sync
+
+    conn = database.connect(args.db, readonly=True)
+    delta = sync.export_since(conn, args.revision)
+    if args.output:
+        sync.write_delta(delta, args.output)
+    else:
+        json.dump(delta, sys.stdout, ensure_ascii=False, separators=(',', ':'))
+        sys.stdout.write('\n')
+    print(f"已导出 {len(delta['changes'])} 项修改，当前修订号 {delta['until']}", file=sys.stderr)
+    return 0
+
+
+def cmd_sync_apply(args):
+    """导入其他数据库导出的修改"""
+    import sync
+
+    delta = json.load(sys.stdin) if args.file == '-' else sync.read_delta(args.file)
+    conn = database.init_database(database.connect(args.db))
+    stats = sync.apply_changes(conn, delta)
+    print(f"已应用 {stats['applied']} 项修改，跳过 {stats['skipped']} 项相同的修改，"
+          f"{stats['conflicts']} 项冲突保留本地较新的版本")
+    return 0
+
+
+def cmd_sync_status(args):
+    """显示同步修订号"""
+    import sync
+
+    conn = database.connect(args.db, readonly=True)
+    print(f"本机\t{sync.node_id(conn)}\t{sync.current_revision(conn)}")
+    for key, value in conn.execute("SELECT key, value FROM sync_state WHERE key LIKE 'peer:%' ORDER BY key"):
+        print(f"已导入\t{key[5:]}\t{value}")
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='cm', description='命令管理工具 - 命令行版')
+    parser.add_argument('--db', default=database.DB_PATH, help='数据库文件路径')
+    subparsers = parser.add_subparsers(dest='action', metavar='<子命令>')
+    subparsers.required = True
+
+    search = subparsers.add_parser('search', help='搜索命令')
+    search.add_argument('term', help='搜索关键词')
+    search.add_argument('-n', '--limit', type=int, default=50, help='最多输出条数（默认50）')
+    search.add_argument('-f', '--fuzzy', action='store_true', help='模糊匹配（容忍拼写错误）')
+    search.add_argument('--json', action='store_true', help='以JSON格式输出')
+    search.set_defaults(func=cmd_search)
+
+    get = subparsers.add_parser('get', help='输出命令的完整内容')
+    get.add_argument('key', help='命令ID或名称')
+    get.add_argument('-c', '--copy', action='store_true', help='同时复制到剪贴板')
+    get.add_argument('--json', action='store_true', help='以JSON格式输出')
+    get.set_defaults(func=cmd_get)
+
+    render = subparsers.add_parser('render', help='填写命令模板的参数后输出命令')
+    render.add_argument('key', help='命令ID或名称')
+    render.add_argument('-s', '--set', action='append', metavar='名称=值', help='参数值（可重复指定）')
+    render.add_argument('--csv', help='参数表CSV文件（第一行为参数名），每行生成一条命令')
+    render.add_argument('-o', '--output', help='输出文件（默认输出到标准输出）')
+    render.set_defaults(func=cmd_render)
+
+    list_parser = subparsers.add_parser('list', help='列出命令')
+    list_parser.add_argument('--category', help='只列出指定分类')
+    list_parser.add_argument('--favorites', action='store_true', help='只列出收藏的命令')
+    list_parser.add_argument('-t', '--tag', action='append', help='只列出有该标签的命令（可重复指定）')
+    list_parser.add_argument('--any-tag', action='store_true', help='有任意一个指定标签即可（默认需要全部标签）')
+    list_parser.add_argument('--json', action='store_true', help='以JSON格式输出')
+    list_parser.set_defaults(func=cmd_list)
+
+    add = subparsers.add_parser('add', help='添加命令')
+    add.add_argument('name', help='命令名称')
+    add.add_argument('command', help='命令内容（"-" 表示从标准输入读取）')
+    add.add_argument('-c', '--category', help='分类名称（不存在时自动创建）')
+    add.add_argument('-d', '--description', default='', help='命令描述')
+    add.add_argument('-t', '--tag', action='append', help='标签（可重复指定）')
+    add.add_argument('-f', '--force', action='store_true', help='已存在相同的命令时仍然添加')
+    add.set_defaults(func=cmd_add)
+
+    import_parser = subparsers.add_parser('import', help='从JSON文件导入命令')
+    import_parser.add_argument('file', help='JSON文件路径（"-" 表示标准输入）')
+    import_parser.add_argument('--allow-duplicates', action='store_true', help='导入已存在的相同命令（默认跳过）')
+    import_parser.set_defaults(func=cmd_import)
+
+    dedup_parser = subparsers.add_parser('dedup', help='列出或合并重复命令（忽略空白差异）')
+    dedup_parser.add_argument('--merge', action='store_true', help='合并完全重复的命令（收藏和使用统计合并到保留的命令）')
+    dedup_parser.add_argument('--near', action='store_true', help='同时列出近似重复的命令（忽略大小写、引号等差异）')
+    dedup_parser.set_defaults(func=cmd_dedup)
+
+    ingest = subparsers.add_parser('ingest', help='从bash/zsh/fish历史中收集常用命令')
+    ingest.add_argument('files', nargs='*', help='历史文件（默认为当前用户的bash、zsh和fish历史）')
+    ingest.add_argument('--format', choices=['bash', 'zsh', 'fish'], help='历史文件格式（默认自动判断）')
+    ingest.add_argument('-n', '--limit', type=int, default=50, help='最多列出（或添加）的候选命令数（默认50）')
+    ingest.add_argument('--min-count', type=int, default=3, help='至少使用过几次（默认3）')
+    ingest.add_argument('--add', action='store_true', help='把列出的候选命令添加到命令库')
+    ingest.set_defaults(func=cmd_ingest)
+
+    alias_parser = subparsers.add_parser('alias', help='查看或设置命令导出到shell的别名')
+    alias_parser.add_argument('key', help='命令ID或名称')
+    alias_parser.add_argument('alias', nargs='?', help='别名（省略时输出当前别名）')
+    alias_parser.add_argument('--remove', action='store_true', help='删除别名（不再导出）')
+    alias_parser.set_defaults(func=cmd_alias)
+
+    export_shell = subparsers.add_parser('export-shell', help='把设置了别名的命令导出为shell别名和函数')
+    export_shell.add_argument('-o', '--output', help='输出目录（默认为 data/shell）')
+    export_shell.add_argument('-f', '--force', action='store_true', help='即使没有修改也重新导出')
+    export_shell.add_argument('-q', '--quiet', action='store_true', help='不输出提示信息')
+    export_shell.add_argument('--init', choices=['bash', 'zsh', 'fish'],
+                              help='输出加入shell启动文件的代码（数据库有修改时才运行导出）')
+    export_shell.set_defaults(func=cmd_export_shell)
+
+    attach = subparsers.add_parser('attach', help='把文件添加为笔记的附件')
+    attach.add_argument('note', help='笔记ID或标题')
+    attach.add_argument('files', nargs='+', help='附件文件')
+    attach.set_defaults(func=cmd_attach)
+
+    attachments_parser = subparsers.add_parser('attachments', help='列出笔记的附件')
+    attachments_parser.add_argument('note', help='笔记ID或标题')
+    attachments_parser.add_argument('--save', metavar='目录', help='把全部附件保存到目录')
+    attachments_parser.set_defaults(func=cmd_attachments)
+
+    serve = subparsers.add_parser('serve', help='启动本地HTTP/JSON服务')
+    serve.add_argument('--host', default='127.0.0.1', help='监听地址（默认仅本机）')
+    serve.add_argument('--port', type=int, default=8765, help='监听端口（默认8765）')
+    serve.add_argument('--unix', help='改为监听unix socket文件')
+    serve.add_argument('--pool-size', type=int, default=4, help='只读连接数（默认4）')
+    serve.set_defaults(func=cmd_serve)
+
+    sync_parser = subparsers.add_parser('sync', help='在多个数据库之间同步修改')
+    sync_actions = sync_parser.add_subparsers(dest='sync_action', metavar='<操作>')
+    sync_actions.required = True
+
+    export = sync_actions.add_parser('export-since', help='导出指定修订号之后的修改')
+    export.add_argument('revision', type=int, help='起始修订号（0 表示全部）')
+    export.add_argument('-o', '--output', help='输出文件（扩展名为 .gz 时压缩，默认输出到标准输出）')
+    export.set_defaults(func=cmd_sync_export)
+
+    apply_parser = sync_actions.add_parser('apply', help='导入修改（以最后修改时间较新者为准）')
+    apply_parser.add_argument('file', help='同步文件路径（"-" 表示标准输入）')
+    apply_parser.set_defaults(func=cmd_sync_apply)
+
+    status = sync_actions.add_parser('status', help='显示本机修订号和已导入的修订号')
+    status.set_defaults(func=cmd_sync_status)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        return args.func(args)
+    except BrokenPipeError:
+        # 输出被 head 等命令提前关闭
+        return 0
+    except (OSError, ValueError, sqlite3.Error) as e:
+        print(f"错误: {e}", file=sys.stderr)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
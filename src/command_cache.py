@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+命令列表缓存
+把命令列表需要的列按列存放在内存中（数值列用 array，分类名驻留），
+分类过滤、只看收藏、标签过滤和排序都在内存中完成，不再每次刷新都查询数据库。
+缓存通过修订号（见 change_feed）增量同步，本实例和其他实例的修改都能发现。
+"""
+
+import sys
+from array import array
+
+from tags import TagIndex, bitset_ids
+
+# 缓存需要读取的列
+CACHE_QUERY = 'SELECT id, name, command_preview, category_id, is_favorite, frecency, tags FROM commands'
+
+
+class CommandListCache:
+    """命令列表的列式缓存
+
+    第 i 行的数据分别保存在 ids[i]、names[i]、previews[i]、category_ids[i]、
+    favorites[i]、scores[i] 中；删除时用最后一行填补空位，行号不保证稳定。
+    rows() 返回与 database.list_commands 相同格式的行。
+    """
+
+    def __init__(self):
+        self.ids = array('i')
+        self.names = []
+        self.previews = []
+        self.category_ids = array('i')    # 未分类为 0
+        self.favorites = array('b')
+        self.scores = array('d')          # frecency 分数
+        self.category_names = {}          # 分类ID -> 分类名
+        self.tag_index = TagIndex()       # 标签 -> 命令ID位图
+        self.positions = None             # 命令ID -> 行号（增量更新时才建立）
+        self.order = None                 # 按默认排序的行号，修改后失效
+        self.revision = None
+        self.epoch = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def loaded(self):
+        return self.revision is not None
+
+    def columns(self):
+        return (self.ids, self.names, self.previews, self.category_ids, self.favorites, self.scores)
+
+    def load(self, conn):
+        """从数据库完整加载"""
+        self.revision, self.epoch, _ = self._state(conn)
+        for column in self.columns():
+            del column[:]
+        self.positions = None
+        self.order = None
+        self._load_categories(conn)
+        rows = conn.execute(CACHE_QUERY).fetchall()
+        for row in rows:
+            self._append(row)
+        self.tag_index.build((row[0], row[6]) for row in rows)
+
+    def refresh(self, conn):
+        """同步上次加载以来的修改，返回是否有变化"""
+        if not self.loaded:
+            self.load(conn)
+            return True
+
+        # 先读取修订号再读取行，期间其他连接的提交最多被重复读取一次，不会遗漏
+        revision, epoch, pruned_revision = self._state(conn)
+        if revision == self.revision and epoch == self.epoch:
+            return False
+        if epoch != self.epoch or revision < self.revision or self.revision < pruned_revision:
+            self.load(conn)
+            return True
+
+        since, self.revision = self.revision, revision
+        changed = conn.execute(CACHE_QUERY + ' WHERE revision > ?', (since,)).fetchall()
+        deleted = {row[0] for row in conn.execute('''
+            SELECT row_id FROM deleted_rows WHERE table_name = 'commands' AND revision > ?
+        ''', (since,)).fetchall()}
+        for command_id in deleted - {row[0] for row in changed}:
+            self._remove(command_id)
+        for row in changed:
+            self._upsert(row)
+
+        if conn.execute('''
+            SELECT EXISTS (SELECT 1 FROM categories WHERE revision > ?)
+                OR EXISTS (SELECT 1 FROM deleted_rows WHERE table_name = 'categories' AND revision > ?)
+        ''', (since, since)).fetchone()[0]:
+            self._load_categories(conn)
+        return True
+
+    def refresh_scores(self, conn, command_ids):
+        """重新读取指定命令的 frecency 分数（使用统计的变化不递增修订号）"""
+        command_ids = [command_id for command_id in command_ids if command_id in self._positions()]
+        if not command_ids:
+            return
+        placeholders = ','.join('?' * len(command_ids))
+        cursor = conn.execute(f'SELECT id, frecency FROM commands WHERE id IN ({placeholders})', command_ids)
+        for command_id, score in cursor.fetchall():
+            self.scores[self.positions[command_id]] = score or 0.0
+        self.order = None
+
+    def rows(self, category=None, favorites_only=False, tags=None, match_all=True):
+        """按默认排序（收藏优先，其次 frecency，再按名称）返回过滤后的命令列表行
+
+        tags 为标签列表，match_all 为 True 时只保留包含全部标签的命令，否则包含任意一个即可。
+        """
+        indexes = self.sorted_indexes()
+        if tags:
+            allowed = set(self.tag_ids(tags, match_all))
+            ids = self.ids
+            indexes = [index for index in indexes if ids[index] in allowed]
+        if favorites_only:
+            favorites = self.favorites
+            indexes = [index for index in indexes if favorites[index]]
+        if category:
+            category_id = self.category_id(category)
+            if category_id is None:
+                return []
+            category_ids = self.category_ids
+            indexes = [index for index in indexes if category_ids[index] == category_id]
+        return [self.row(index) for index in indexes]
+
+    def tag_ids(self, tags, match_all=True):
+        """包含全部（或任意）标签的命令ID（升序）"""
+        return bitset_ids(self.tag_index.match(tags, match_all))
+
+    def tag_facets(self, tags=None, match_all=True):
+        """标签及其命令数 [(标签, 数量)]；指定 tags 时只统计满足当前标签过滤的命令"""
+        scope = self.tag_index.match(tags, match_all) if tags else None
+        return self.tag_index.facets(scope)
+
+    def rows_for_ids(self, command_ids):
+        """按给定ID顺序返回命令列表行（不在缓存中的ID被忽略）"""
+        positions = self._positions()
+        return [self.row(positions[command_id]) for command_id in command_ids if command_id in positions]
+
+    def row(self, index):
+        """第 index 行的 (id, 名称, 预览, 分类名, 是否收藏)"""
+        return (self.ids[index], self.names[index], self.previews[index],
+                self.category_names.get(self.category_ids[index]), self.favorites[index])
+
+    def category_id(self, name):
+        for category_id, category_name in self.category_names.items():
+            if category_name == name:
+                return category_id
+        return None
+
+    def sorted_indexes(self):
+        """按默认排序的行号（缓存到下一次修改）"""
+        if self.order is None:
+            favorites, scores, names = self.favorites, self.scores, self.names
+            self.order = array('i', sorted(range(len(self.ids)),
+                                           key=lambda index: (-favorites[index], -scores[index], names[index])))
+        return self.order
+
+    @staticmethod
+    def _state(conn):
+        return conn.execute('SELECT revision, epoch, pruned_revision FROM db_revision WHERE id = 1').fetchone()
+
+    def _load_categories(self, conn):
+        self.category_names = {category_id: sys.intern(name)
+                               for category_id, name in conn.execute('SELECT id, name FROM categories').fetchall()}
+
+    def _positions(self):
+        if self.positions is None:
+            self.positions = dict(zip(self.ids, range(len(self.ids))))
+        return self.positions
+
+    def _append(self, row):
+        command_id, name, preview, category_id, is_favorite, score, _ = row
+        self.ids.append(command_id)
+        self.names.append(name)
+        self.previews.append(preview or '')
+        self.category_ids.append(category_id or 0)
+        self.favorites.append(1 if is_favorite else 0)
+        self.scores.append(score or 0.0)
+
+    def _upsert(self, row):
+        positions = self._positions()
+        index = positions.get(row[0])
+        self.tag_index.set(row[0], row[6])
+        if index is None:
+            positions[row[0]] = len(self.ids)
+            self._append(row)
+        else:
+            command_id, name, preview, category_id, is_favorite, score, _ = row
+            self.names[index] = name
+            self.previews[index] = preview or ''
+            self.category_ids[index] = category_id or 0
+            self.favorites[index] = 1 if is_favorite else 0
+            self.scores[index] = score or 0.0
+        self.order = None
+
+    def _remove(self, command_id):
+        positions = self._positions()
+        index = positions.pop(command_id, None)
+        if index is None:
+            return
+        self.tag_index.remove(command_id)
+        last = len(self.ids) - 1
+        if index != last:
+            for column in self.columns():
+                column[index] = column[last]
+            positions[self.ids[index]] = index
+        for column in self.columns():
+            column.pop()
+        self.order = None
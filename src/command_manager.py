@@ -12,17 +12,64 @@
 """
 
 import tkinter as tk
-from tkinter import ttk, messagebox, simpledialog
+from tkinter import ttk, messagebox, simpledialog, filedialog
+import base64
+import csv
+import difflib
 import json
+import math
 import os
 from datetime import datetime
 import sqlite3
 import re
+import threading
+import time
+
+import attachments
+import database
+import dedup
+import history
+import instrumentation
+import maintenance
+import shell_export
+import shell_history
+import tags as tagging
+import templates
+from profiling import ProfilingSession, DIAGNOSTICS_DIR
+from usage import UsageTracker
+from fuzzy_search import TrigramIndex
+from command_cache import CommandListCache
+from journal import OperationJournal, UndoError
+from change_feed import ChangeFeed
+
+# 检查其他实例修改的间隔（毫秒）
+CHANGE_CHECK_INTERVAL = 1000
+
+# 命令列表各列在 (id, 名称, 预览, 分类, 收藏) 行中的下标，用于点击列标题排序
+COMMAND_SORT_FIELDS = {'名称': 1, '命令': 2, '分类': 3, '收藏': 4}
+
+# 按数值排序的文本：普通的十进制数（不包括 nan、inf、1e3 等 float() 也接受的写法）
+DECIMAL_PATTERN = re.compile(r'[+-]?\d+(?:\.\d+)?', re.ASCII)
+
+
+def sort_key(value):
+    """列表排序键：数字按数值比较，其余按不区分大小写的文本比较（NaN、无穷大按文本比较）"""
+    if isinstance(value, (int, float)) and math.isfinite(value):
+        return (0, value, '')
+    text = str(value if value is not None else '').strip()
+    if DECIMAL_PATTERN.fullmatch(text):
+        number = float(text)
+        if math.isfinite(number):
+            return (0, number, '')
+    return (1, 0, text.casefold())
+
 
 class ColumnWidthManager:
-    """列宽度管理器"""
-    def __init__(self, config_file="column_widths.json"):
-        self.config_file = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', config_file)
+    """列宽度管理器（config_dir 默认为 data 目录）"""
+    def __init__(self, config_file="column_widths.json", config_dir=None):
+        if config_dir is None:
+            config_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data')
+        self.config_file = os.path.join(config_dir, config_file)
         self.widths = {}
         self.load_widths()
 
@@ -56,10 +103,36 @@ class ColumnWidthManager:
         self.widths[key] = width
         self.save_widths()
 
+    def get_sort(self, tree_id):
+        """获取列表的排序状态，返回 (列名, 是否倒序)，未排序返回 None"""
+        state = self.widths.get(f"{tree_id}:sort")
+        return tuple(state) if state else None
+
+    def set_sort(self, tree_id, column, descending=False):
+        """保存列表的排序状态，column 为 None 时恢复默认顺序"""
+        key = f"{tree_id}:sort"
+        if column is None:
+            self.widths.pop(key, None)
+        else:
+            self.widths[key] = [column, bool(descending)]
+        self.save_widths()
+
 class CommandManager:
-    def __init__(self, root):
+    def __init__(self, root, profile=False):
         self.root = root
         self.root.title("命令管理工具")
+
+        # 性能分析（profile 为 True 时从启动开始记录）
+        self.profiling = None
+        if profile:
+            self.profiling = ProfilingSession(db_path=database.DB_PATH)
+            self.profiling.start()
+
+        # 统计Tk回调耗时（需要在创建界面之前安装）
+        instrumentation.install_tk_hooks()
+        self.diagnostics_window = None
+        self.duplicates_window = None
+        self.ingest_thread = None
         self.root.geometry("1200x800")
 
         # 居中显示窗口
@@ -71,11 +144,54 @@ class CommandManager:
         # 数据库初始化
         self.init_database()
 
+        # 撤销/重做日志
+        self.journal = OperationJournal(self.conn)
+
+        # 命令列表缓存（过滤和排序在内存中完成）
+        self.command_cache = CommandListCache()
+
+        # 命令模板编译缓存（按命令ID和修改时间）
+        self.template_cache = templates.TemplateCache()
+
+        # 附件缩略图缓存（按附件ID和sha1）
+        self.thumbnail_cache = attachments.ThumbnailCache()
+        self.current_note_id = None
+
+        # 命令使用记录（批量写入）
+        self.usage_tracker = UsageTracker(
+            self.conn, on_flush=lambda command_ids: self.command_cache.refresh_scores(self.conn, command_ids))
+        self.schedule_usage_flush()
+
+        # 模糊搜索索引（后台线程建立，之后增量更新）
+        self.fuzzy_index = None
+        self.fuzzy_index_building = None
+        self.fuzzy_dirty_ids = set()
+        self.fuzzy_index_outdated = False
+
         # 创建主界面
         self.create_main_interface()
 
         # 加载数据
         self.load_data()
+        self.start_fuzzy_index_build()
+
+        # 定时检查其他实例（图形界面、命令行、本地服务、备份恢复）的修改
+        self.change_feed = ChangeFeed(self.conn)
+        self.root.after(CHANGE_CHECK_INTERVAL, self.check_external_changes)
+
+        # 关闭窗口前写入未保存的使用记录
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+
+        if self.profiling:
+            self.update_profiling_menu()
+            self.sample_profiling()
+
+        # 用户空闲时自动维护数据库
+        self.maintenance_thread = None
+        self.last_activity = time.time()
+        self.root.bind_all('<Any-KeyPress>', self.on_user_activity, add='+')
+        self.root.bind_all('<Any-ButtonPress>', self.on_user_activity, add='+')
+        self.root.after(60000, self.check_idle_maintenance)
 
     def center_window(self):
         """将窗口居中显示"""
@@ -88,6 +204,29 @@ class CommandManager:
 
     def create_main_interface(self):
         """创建主界面"""
+        # 菜单栏
+        menubar = tk.Menu(self.root)
+        self.diagnostics_menu = tk.Menu(menubar, tearoff=0)
+        self.diagnostics_menu.add_command(label="开始性能分析", command=self.start_profiling)
+        self.diagnostics_menu.add_command(label="停止并保存分析结果", command=self.stop_profiling, state=tk.DISABLED)
+        self.diagnostics_menu.add_separator()
+        self.diagnostics_menu.add_command(label="性能诊断面板", accelerator="Ctrl+Shift+D",
+                                          command=self.show_diagnostics)
+        self.diagnostics_menu.add_command(label="打开诊断文件目录", command=self.open_diagnostics_dir)
+        self.diagnostics_menu.add_separator()
+        self.diagnostics_menu.add_command(label="整理数据库", command=self.run_maintenance)
+        self.diagnostics_menu.add_command(label="完整整理数据库（VACUUM）",
+                                          command=lambda: self.run_maintenance(full=True))
+        self.diagnostics_menu.add_command(label="查找重复命令...", command=self.show_duplicates)
+        menubar.add_cascade(label="诊断", menu=self.diagnostics_menu)
+        tools_menu = tk.Menu(menubar, tearoff=0)
+        tools_menu.add_command(label="导入Shell历史...", command=self.ingest_shell_history)
+        tools_menu.add_command(label="Shell历史候选命令...", command=self.show_history_candidates)
+        tools_menu.add_separator()
+        tools_menu.add_command(label="导出Shell别名", command=lambda: self.export_shell_aliases(force=True))
+        menubar.add_cascade(label="工具", menu=tools_menu)
+        self.root.config(menu=menubar)
+
         # 创建主框架
         main_frame = ttk.Frame(self.root)
         main_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
@@ -103,6 +242,17 @@ class CommandManager:
         ttk.Button(left_frame, text="命令管理", command=self.show_command_management, width=20).pack(pady=5)
         ttk.Button(left_frame, text="分类管理", command=self.show_category_management, width=20).pack(pady=5)
         ttk.Button(left_frame, text="笔记管理", command=self.show_note_management, width=20).pack(pady=5)
+
+        # 撤销/重做
+        undo_frame = ttk.Frame(left_frame)
+        undo_frame.pack(pady=5)
+        ttk.Button(undo_frame, text="撤销", command=self.undo, width=9).pack(side=tk.LEFT, padx=2)
+        ttk.Button(undo_frame, text="重做", command=self.redo, width=9).pack(side=tk.LEFT, padx=2)
+        self.root.bind('<Control-z>', lambda event: self.undo())
+        self.root.bind('<Control-y>', lambda event: self.redo())
+
+        # 隐藏的性能诊断面板
+        self.root.bind('<Control-Shift-D>', lambda event: self.show_diagnostics())
       
         # 分隔线
         ttk.Separator(left_frame, orient='horizontal').pack(fill=tk.X, pady=20)
@@ -114,6 +264,33 @@ class CommandManager:
         search_entry = ttk.Entry(left_frame, textvariable=self.search_var, width=25)
         search_entry.pack(pady=5)
 
+        self.fuzzy_var = tk.BooleanVar()
+        ttk.Checkbutton(left_frame, text="模糊匹配", variable=self.fuzzy_var,
+                        command=self.quick_search).pack(pady=5)
+
+        # 标签过滤（多选，显示每个标签的命令数）
+        ttk.Separator(left_frame, orient='horizontal').pack(fill=tk.X, pady=10)
+        ttk.Label(left_frame, text="标签", font=("Arial", 10, "bold")).pack(pady=5)
+        self.selected_tags = []
+        self.tag_list_names = []
+        self.tag_match_all = tk.BooleanVar(value=True)
+        match_frame = ttk.Frame(left_frame)
+        match_frame.pack(pady=2)
+        ttk.Radiobutton(match_frame, text="全部匹配", variable=self.tag_match_all, value=True,
+                        command=self.on_tag_filter_changed).pack(side=tk.LEFT, padx=2)
+        ttk.Radiobutton(match_frame, text="任一匹配", variable=self.tag_match_all, value=False,
+                        command=self.on_tag_filter_changed).pack(side=tk.LEFT, padx=2)
+        ttk.Button(left_frame, text="清除标签过滤", command=self.clear_tag_filter, width=20).pack(pady=5)
+
+        tag_frame = ttk.Frame(left_frame)
+        tag_frame.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        self.tag_listbox = tk.Listbox(tag_frame, selectmode=tk.MULTIPLE, exportselection=False)
+        tag_scrollbar = ttk.Scrollbar(tag_frame, orient=tk.VERTICAL, command=self.tag_listbox.yview)
+        self.tag_listbox.configure(yscrollcommand=tag_scrollbar.set)
+        self.tag_listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        tag_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.tag_listbox.bind('<<ListboxSelect>>', self.on_tag_filter_changed)
+
         # 创建右侧内容区域
         right_container = ttk.Frame(main_frame)
         right_container.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
@@ -131,6 +308,11 @@ class CommandManager:
                                   command=self.show_author_info)
         author_button.pack(side=tk.RIGHT, padx=10, pady=5)
 
+        # 状态栏
+        self.status_var = tk.StringVar()
+        status_label = ttk.Label(right_container, textvariable=self.status_var, anchor=tk.W)
+        status_label.pack(side=tk.BOTTOM, fill=tk.X, pady=(5, 0))
+
         # 创建内容区域
         self.content_frame = ttk.Frame(right_container)
         self.content_frame.pack(fill=tk.BOTH, expand=True)
@@ -146,68 +328,98 @@ class CommandManager:
 
     def init_database(self):
         """初始化数据库"""
-        # 数据库文件路径
-        db_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data')
-        if not os.path.exists(db_dir):
-            os.makedirs(db_dir)
-
-        db_path = os.path.join(db_dir, 'command_manager.db')
-        self.conn = sqlite3.connect(db_path)
+        self.db_path = database.DB_PATH
+        self.conn = database.init_database(
+            database.connect(self.db_path, factory=instrumentation.InstrumentedConnection))
         self.cursor = self.conn.cursor()
 
-        # 创建分类表
-        self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS categories (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT UNIQUE NOT NULL,
-                description TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-
-        # 创建命令表
-        self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS commands (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL,
-                command TEXT NOT NULL,
-                category_id INTEGER,
-                description TEXT,
-                is_favorite INTEGER DEFAULT 0,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (category_id) REFERENCES categories (id)
-            )
-        ''')
-
-        
-        # 创建笔记表
-        self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS notes (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                title TEXT NOT NULL,
-                content TEXT,
-                category TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
+    def schedule_usage_flush(self):
+        """定时把使用记录批量写入数据库"""
+        try:
+            self.usage_tracker.flush()
+        except sqlite3.Error as e:
+            print(f"写入使用记录失败: {e}")
+        self.root.after(5000, self.schedule_usage_flush)
 
-        self.conn.commit()
+    def check_external_changes(self):
+        """定时检查其他实例提交的修改，只重新加载修订号变化的行"""
+        try:
+            changes = self.change_feed.poll()
+            if changes:
+                self.apply_external_changes(changes)
+        except sqlite3.Error as e:
+            print(f"检查数据变化失败: {e}")
+        self.root.after(CHANGE_CHECK_INTERVAL, self.check_external_changes)
+
+    def apply_external_changes(self, changes):
+        """把其他实例的修改应用到界面"""
+        if changes.full:
+            # 数据库被整体替换（例如从备份恢复）
+            self.load_categories()
+            self.update_category_filter()
+            self.rebuild_fuzzy_index()
+            self.refresh_current_view({'commands', 'categories', 'notes'})
+            self.status_var.set("数据库已被其他程序替换，已重新加载")
+            return
 
-        # 插入默认分类
-        default_categories = [
-            ('系统命令', '系统管理相关命令'),
-            ('网络命令', '网络诊断和配置命令'),
-            ('开发工具', '开发和编译相关命令'),
-            ('数据库', '数据库操作命令'),
-            ('其他', '其他类别命令')
-        ]
+        tables = changes.tables()
+        self.apply_command_changes(changes.changed.get('commands', set()),
+                                   changes.deleted.get('commands', set()))
+        if 'categories' in tables:
+            # 分类名显示在命令列表中，分类变化时刷新整个当前视图
+            self.refresh_current_view({'categories'})
+        if 'notes' in tables:
+            self.refresh_current_view({'notes'})
+        self.status_var.set(f"已同步其他实例的 {changes.count()} 项修改")
+
+    def apply_command_changes(self, changed_ids, deleted_ids):
+        """原地更新命令列表中被修改或删除的行"""
+        for command_id in changed_ids | deleted_ids:
+            self.update_fuzzy_index(command_id)
+        if not self.widget_exists('command_tree'):
+            return
 
-        for cat in default_categories:
-            self.cursor.execute('INSERT OR IGNORE INTO categories (name, description) VALUES (?, ?)', cat)
+        tree = self.command_tree
+        removed = [str(command_id) for command_id in deleted_ids if tree.exists(str(command_id))]
+        if removed:
+            tree.delete(*removed)
+        if not changed_ids:
+            return
 
-        self.conn.commit()
+        # 搜索结果只更新已显示的行；普通列表按当前过滤条件增删行，新命令追加到末尾
+        searching = bool(self.search_var.get().strip())
+        category_name = self.category_filter.get() if self.widget_exists('category_filter') else ''
+        if category_name == '全部':
+            category_name = ''
+        favorites_only = self.favorite_only.get()
+
+        self.refresh_command_cache()
+        tagged = self.tag_filter_ids()
+        for row in self.command_cache.rows_for_ids(changed_ids):
+            command_id, name, preview, category, is_favorite = row
+            iid = str(command_id)
+            visible = (tagged is None or command_id in tagged) and (
+                searching or ((not category_name or category == category_name)
+                              and (not favorites_only or is_favorite)))
+            if tree.exists(iid):
+                if visible:
+                    tree.item(iid, values=self.command_row_values(row))
+                else:
+                    tree.delete(iid)
+            elif visible and not searching:
+                tree.insert('', tk.END, iid=iid, values=self.command_row_values(row))
+        self.reorder_tree('command_tree')
+
+    def on_close(self):
+        """关闭窗口"""
+        try:
+            self.usage_tracker.flush()
+        except sqlite3.Error as e:
+            print(f"写入使用记录失败: {e}")
+        if self.profiling:
+            # 退出时自动保存正在进行的性能分析
+            self.stop_profiling(show_result=False)
+        self.root.destroy()
 
     def show_command_management(self):
         """显示命令管理界面"""
@@ -226,6 +438,8 @@ class CommandManager:
         ttk.Button(toolbar, text="删除命令", command=self.delete_command).pack(side=tk.LEFT, padx=5)
         ttk.Button(toolbar, text="收藏/取消收藏", command=self.toggle_favorite).pack(side=tk.LEFT, padx=5)
         ttk.Button(toolbar, text="复制命令", command=self.copy_command).pack(side=tk.LEFT, padx=5)
+        ttk.Button(toolbar, text="移动到分类", command=self.move_commands_to_category).pack(side=tk.LEFT, padx=5)
+        ttk.Button(toolbar, text="导出选中", command=self.export_selected_commands).pack(side=tk.LEFT, padx=5)
 
         # 分类过滤
         ttk.Label(toolbar, text="分类:").pack(side=tk.LEFT, padx=(20, 5))
@@ -245,7 +459,8 @@ class CommandManager:
 
         # 创建Treeview
         columns = ('名称', '命令', '分类', '收藏')
-        self.command_tree = ttk.Treeview(list_frame, columns=columns, show='headings', height=15)
+        self.command_tree = ttk.Treeview(list_frame, columns=columns, show='headings', height=15,
+                                         selectmode='extended')
 
         for col in columns:
             self.command_tree.heading(col, text=col)
@@ -265,6 +480,7 @@ class CommandManager:
 
         # 绑定列宽度变化事件
         self.command_tree.bind('<Configure>', self.on_column_resize)
+        self.setup_tree_sorting('command_tree')
 
         # 滚动条
         scrollbar = ttk.Scrollbar(list_frame, orient=tk.VERTICAL, command=self.command_tree.yview)
@@ -276,6 +492,18 @@ class CommandManager:
         # 双击执行命令
         self.command_tree.bind('<Double-1>', self.execute_command)
 
+        # 右键批量操作菜单
+        self.command_menu = tk.Menu(self.command_tree, tearoff=0)
+        self.command_menu.add_command(label="收藏", command=lambda: self.set_commands_favorite(1))
+        self.command_menu.add_command(label="取消收藏", command=lambda: self.set_commands_favorite(0))
+        self.command_menu.add_command(label="移动到分类...", command=self.move_commands_to_category)
+        self.command_menu.add_command(label="导出选中...", command=self.export_selected_commands)
+        self.command_menu.add_command(label="历史版本...", command=self.show_command_history)
+        self.command_menu.add_command(label="设置Shell别名...", command=self.set_command_alias)
+        self.command_menu.add_separator()
+        self.command_menu.add_command(label="删除", command=self.delete_command)
+        self.command_tree.bind('<Button-3>', self.show_command_menu)
+
         # 刷新命令列表
         self.refresh_command_list()
 
@@ -289,6 +517,77 @@ class CommandManager:
         except Exception as e:
             print(f"保存列宽度失败: {e}")
 
+    def setup_tree_sorting(self, tree_id):
+        """点击列标题排序，并显示上次保存的排序状态"""
+        tree = getattr(self, tree_id)
+        for col in tree['columns']:
+            tree.heading(col, command=lambda col=col: self.sort_tree(tree_id, col))
+        self.update_sort_headings(tree_id)
+
+    def update_sort_headings(self, tree_id):
+        """在排序列的标题后显示 ▲/▼"""
+        tree = getattr(self, tree_id)
+        state = self.column_manager.get_sort(tree_id)
+        for col in tree['columns']:
+            arrow = ''
+            if state and state[0] == col:
+                arrow = ' ▼' if state[1] else ' ▲'
+            tree.heading(col, text=col + arrow)
+
+    def sort_tree(self, tree_id, column):
+        """点击列标题：升序，再次点击倒序，第三次恢复默认顺序"""
+        state = self.column_manager.get_sort(tree_id)
+        if state and state[0] == column:
+            if state[1]:
+                self.column_manager.set_sort(tree_id, None)
+            else:
+                self.column_manager.set_sort(tree_id, column, True)
+        else:
+            self.column_manager.set_sort(tree_id, column, False)
+        self.update_sort_headings(tree_id)
+
+        if self.column_manager.get_sort(tree_id):
+            self.reorder_tree(tree_id)
+        elif tree_id == 'command_tree':
+            self.quick_search()
+        elif tree_id == 'category_tree':
+            self.refresh_category_list()
+        else:
+            self.refresh_note_list()
+
+    def reorder_tree(self, tree_id):
+        """按保存的排序状态原地调整列表中已有行的顺序（不重新查询数据库）"""
+        tree = getattr(self, tree_id)
+        state = self.column_manager.get_sort(tree_id)
+        items = tree.get_children()
+        if not state or len(items) < 2:
+            return
+        column, descending = state
+
+        if tree_id == 'command_tree':
+            # 命令列表的列值从缓存读取，避免逐行调用Tcl
+            if column not in COMMAND_SORT_FIELDS:
+                return
+            index = COMMAND_SORT_FIELDS[column]
+            rows = self.command_cache.rows_for_ids(int(iid) for iid in items if iid.isdigit())
+            keys = {str(row[0]): sort_key(row[index]) for row in rows}
+            if len(keys) != len(items):
+                return
+        else:
+            keys = {iid: sort_key(tree.set(iid, column)) for iid in items}
+
+        # 一次性替换子项顺序，等同于对每一行调用 move
+        tree.set_children('', *sorted(items, key=keys.__getitem__, reverse=descending))
+
+    def sort_rows(self, tree_id, rows, fields):
+        """按保存的排序状态排序即将插入列表的行，fields 为列名到行中下标的映射"""
+        state = self.column_manager.get_sort(tree_id)
+        if not state or state[0] not in fields:
+            return rows
+        column, descending = state
+        index = fields[column]
+        return sorted(rows, key=lambda row: sort_key(row[index]), reverse=descending)
+
     def show_category_management(self):
         """显示分类管理界面"""
         self.clear_content_frame()
@@ -314,6 +613,7 @@ class CommandManager:
         for col in columns:
             self.category_tree.heading(col, text=col)
             self.category_tree.column(col, width=200)
+        self.setup_tree_sorting('category_tree')
 
         scrollbar = ttk.Scrollbar(list_frame, orient=tk.VERTICAL, command=self.category_tree.yview)
         self.category_tree.configure(yscrollcommand=scrollbar.set)
@@ -338,12 +638,18 @@ class CommandManager:
         ttk.Button(toolbar, text="修改笔记", command=self.edit_note).pack(side=tk.LEFT, padx=5)
         ttk.Button(toolbar, text="删除笔记", command=self.delete_note).pack(side=tk.LEFT, padx=5)
         ttk.Button(toolbar, text="复制笔记", command=self.copy_note).pack(side=tk.LEFT, padx=5)
+        ttk.Button(toolbar, text="历史版本", command=self.show_note_history).pack(side=tk.LEFT, padx=5)
 
         # 分类过滤
         ttk.Label(toolbar, text="分类:").pack(side=tk.LEFT, padx=(20, 5))
-        self.note_category_filter = ttk.Entry(toolbar, width=15)
+        self.note_category_filter = ttk.Combobox(toolbar, width=15, state="readonly")
         self.note_category_filter.pack(side=tk.LEFT, padx=5)
-        self.note_category_filter.bind('<KeyRelease>', self.filter_notes)
+        self.note_category_filter.bind('<<ComboboxSelected>>', self.filter_notes)
+
+        ttk.Label(toolbar, text="标签:").pack(side=tk.LEFT, padx=(20, 5))
+        self.note_tag_filter = ttk.Combobox(toolbar, width=15, state="readonly")
+        self.note_tag_filter.pack(side=tk.LEFT, padx=5)
+        self.note_tag_filter.bind('<<ComboboxSelected>>', self.filter_notes)
 
         # 分割面板
         paned = ttk.PanedWindow(note_frame, orient=tk.HORIZONTAL)
@@ -353,7 +659,7 @@ class CommandManager:
         left_frame = ttk.Frame(paned)
         paned.add(left_frame, weight=1)
 
-        columns = ('标题', '分类', '创建时间')
+        columns = ('标题', '分类', '标签', '创建时间')
         self.note_tree = ttk.Treeview(left_frame, columns=columns, show='headings')
 
         for col in columns:
@@ -362,6 +668,7 @@ class CommandManager:
                 self.note_tree.column(col, width=200)
             else:
                 self.note_tree.column(col, width=100)
+        self.setup_tree_sorting('note_tree')
 
         note_scrollbar = ttk.Scrollbar(left_frame, orient=tk.VERTICAL, command=self.note_tree.yview)
         self.note_tree.configure(yscrollcommand=note_scrollbar.set)
@@ -374,6 +681,31 @@ class CommandManager:
         paned.add(right_frame, weight=2)
 
         ttk.Label(right_frame, text="笔记内容:").pack(anchor=tk.W, padx=5, pady=5)
+
+        # 附件（先放在底部，笔记内容占用剩余空间）
+        attachment_frame = ttk.LabelFrame(right_frame, text="附件", padding=5)
+        attachment_frame.pack(side=tk.BOTTOM, fill=tk.X, padx=5, pady=5)
+
+        attachment_buttons = ttk.Frame(attachment_frame)
+        attachment_buttons.pack(side=tk.TOP, fill=tk.X, pady=(0, 5))
+        ttk.Button(attachment_buttons, text="添加附件", command=self.add_note_attachments).pack(side=tk.LEFT, padx=5)
+        ttk.Button(attachment_buttons, text="另存为", command=self.save_note_attachment).pack(side=tk.LEFT, padx=5)
+        ttk.Button(attachment_buttons, text="删除附件", command=self.delete_note_attachments).pack(side=tk.LEFT, padx=5)
+
+        self.attachment_preview = ttk.Label(attachment_frame)
+        self.attachment_preview.pack(side=tk.RIGHT, padx=5)
+
+        self.attachment_tree = ttk.Treeview(attachment_frame, columns=('文件名', '类型', '大小'),
+                                            show='headings', height=4)
+        self.attachment_tree.heading('文件名', text='文件名')
+        self.attachment_tree.heading('类型', text='类型')
+        self.attachment_tree.heading('大小', text='大小')
+        self.attachment_tree.column('文件名', width=200)
+        self.attachment_tree.column('类型', width=120)
+        self.attachment_tree.column('大小', width=80)
+        self.attachment_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.attachment_tree.bind('<<TreeviewSelect>>', self.on_attachment_select)
+        self.attachment_tree.bind('<Double-1>', lambda event: self.save_note_attachment())
         self.note_content = tk.Text(right_frame, wrap=tk.WORD, state=tk.DISABLED)  # 设置为只读模式
         content_scrollbar = ttk.Scrollbar(right_frame, orient=tk.VERTICAL, command=self.note_content.yview)
         self.note_content.configure(yscrollcommand=content_scrollbar.set)
@@ -489,14 +821,15 @@ class CommandManager:
     # 命令管理相关方法
     def add_command(self):
         """添加命令"""
-        dialog = CommandDialog(self.root, "添加命令", self.get_categories())
+        dialog = CommandDialog(self.root, "添加命令", self.get_categories(),
+                               find_duplicates=lambda command: database.find_duplicate_commands(self.conn, command))
         if dialog.result:
-            name, command, category_id, description = dialog.result
-            self.cursor.execute('''
-                INSERT INTO commands (name, command, category_id, description)
-                VALUES (?, ?, ?, ?)
-            ''', (name, command, category_id, description))
+            name, command, category_id, description, tags = dialog.result
+            command_id = database.insert_command(self.cursor, name, command, category_id, description,
+                                                 tags=tags)
+            self.journal.record("添加命令", 'commands', {}, self.journal.snapshot_ids('commands', [command_id]))
             self.conn.commit()
+            self.update_fuzzy_index(command_id)
             self.refresh_command_list()
 
     def edit_command(self):
@@ -506,11 +839,8 @@ class CommandManager:
             messagebox.showwarning("警告", "请选择要编辑的命令")
             return
 
-        item = self.command_tree.item(selection[0])
-        values = item['values']
-
         # 获取命令ID
-        command_id = self.get_command_id_by_name(values[0])
+        command_id = self.get_selected_command_id()
         if not command_id:
             return
 
@@ -518,55 +848,182 @@ class CommandManager:
         self.cursor.execute('SELECT * FROM commands WHERE id = ?', (command_id,))
         cmd_data = self.cursor.fetchone()
 
-        dialog = CommandDialog(self.root, "编辑命令", self.get_categories(), cmd_data)
+        dialog = CommandDialog(self.root, "编辑命令", self.get_categories(), cmd_data,
+                               tags=database.get_tags(self.conn, 'commands', command_id),
+                               find_duplicates=lambda command: database.find_duplicate_commands(
+                                   self.conn, command, exclude_id=command_id))
         if dialog.result:
-            name, command, category_id, description = dialog.result
-            self.cursor.execute('''
-                UPDATE commands SET name = ?, command = ?, category_id = ?,
-                description = ?, updated_at = CURRENT_TIMESTAMP
-                WHERE id = ?
-            ''', (name, command, category_id, description, command_id))
+            name, command, category_id, description, tags = dialog.result
+            before = self.journal.snapshot_ids('commands', [command_id])
+            database.update_command(self.cursor, command_id, name, command, category_id, description, tags)
+            self.journal.record("编辑命令", 'commands', before, self.journal.snapshot_ids('commands', [command_id]))
             self.conn.commit()
+            self.update_fuzzy_index(command_id)
             self.refresh_command_list()
 
     def delete_command(self):
-        """删除命令"""
-        selection = self.command_tree.selection()
-        if not selection:
+        """删除命令（支持多选）"""
+        command_ids = self.get_selected_command_ids()
+        if not command_ids:
             messagebox.showwarning("警告", "请选择要删除的命令")
             return
 
-        if messagebox.askyesno("确认", "确定要删除选中的命令吗？"):
-            item = self.command_tree.item(selection[0])
-            values = item['values']
-            command_id = self.get_command_id_by_name(values[0])
+        if len(command_ids) == 1:
+            prompt = "确定要删除选中的命令吗？"
+        else:
+            prompt = f"确定要删除选中的 {len(command_ids)} 个命令吗？"
+
+        if messagebox.askyesno("确认", prompt):
+            before = self.journal.snapshot_ids('commands', command_ids)
+            self.cursor.executemany('DELETE FROM commands WHERE id = ?',
+                                    [(command_id,) for command_id in command_ids])
+            self.journal.record("删除命令", 'commands', before, {})
+            self.conn.commit()
 
-            if command_id:
-                self.cursor.execute('DELETE FROM commands WHERE id = ?', (command_id,))
-                self.conn.commit()
-                self.refresh_command_list()
+            for command_id in command_ids:
+                self.update_fuzzy_index(command_id)
+            self.command_tree.delete(*[str(command_id) for command_id in command_ids])
+            self.status_var.set(f"已删除 {len(command_ids)} 个命令")
 
     def toggle_favorite(self):
-        """切换收藏状态"""
-        selection = self.command_tree.selection()
-        if not selection:
+        """切换收藏状态（多选时只要有未收藏的命令就全部收藏）"""
+        command_ids = self.get_selected_command_ids()
+        if not command_ids:
             messagebox.showwarning("警告", "请选择要操作的命令")
             return
 
-        item = self.command_tree.item(selection[0])
-        values = item['values']
-        command_id = self.get_command_id_by_name(values[0])
+        placeholders = ','.join('?' * len(command_ids))
+        self.cursor.execute(f'SELECT COUNT(*) FROM commands WHERE is_favorite = 0 AND id IN ({placeholders})',
+                            command_ids)
+        has_unfavorite = self.cursor.fetchone()[0] > 0
+        self.set_commands_favorite(1 if has_unfavorite else 0)
 
-        if command_id:
-            # 获取当前收藏状态
-            self.cursor.execute('SELECT is_favorite FROM commands WHERE id = ?', (command_id,))
-            current_favorite = self.cursor.fetchone()[0]
-            new_favorite = 1 if current_favorite == 0 else 0
+    def set_commands_favorite(self, is_favorite):
+        """批量设置收藏状态"""
+        command_ids = self.get_selected_command_ids()
+        if not command_ids:
+            messagebox.showwarning("警告", "请选择要操作的命令")
+            return
 
-            self.cursor.execute('UPDATE commands SET is_favorite = ? WHERE id = ?',
-                              (new_favorite, command_id))
-            self.conn.commit()
-            self.refresh_command_list()
+        before = self.journal.snapshot_ids('commands', command_ids)
+        self.cursor.executemany('UPDATE commands SET is_favorite = ? WHERE id = ?',
+                                [(is_favorite, command_id) for command_id in command_ids])
+        self.journal.record("收藏" if is_favorite else "取消收藏", 'commands',
+                            before, self.journal.snapshot_ids('commands', command_ids))
+        self.conn.commit()
+
+        # 只更新受影响的行；仅显示收藏时取消收藏的行直接移除
+        iids = [str(command_id) for command_id in command_ids]
+        if not is_favorite and self.favorite_only.get():
+            self.command_tree.delete(*iids)
+        else:
+            for iid in iids:
+                self.command_tree.set(iid, '收藏', "是" if is_favorite else "否")
+
+        action = "收藏" if is_favorite else "取消收藏"
+        self.status_var.set(f"已{action} {len(command_ids)} 个命令")
+
+    def move_commands_to_category(self):
+        """批量移动命令到指定分类"""
+        command_ids = self.get_selected_command_ids()
+        if not command_ids:
+            messagebox.showwarning("警告", "请选择要移动的命令")
+            return
+
+        categories = self.get_categories()
+        dialog = tk.Toplevel(self.root)
+        dialog.title("移动到分类")
+        dialog.geometry("320x150")
+        dialog.transient(self.root)
+        dialog.grab_set()
+        dialog.resizable(False, False)
+
+        result = {}
+
+        frame = ttk.Frame(dialog, padding="20")
+        frame.pack(fill=tk.BOTH, expand=True)
+
+        ttk.Label(frame, text=f"将 {len(command_ids)} 个命令移动到:").pack(anchor=tk.W)
+        category_combo = ttk.Combobox(frame, width=30, state="readonly")
+        category_combo['values'] = ['未分类'] + [name for _, name in categories]
+        category_combo.current(0)
+        category_combo.pack(fill=tk.X, pady=10)
+
+        def ok_clicked():
+            index = category_combo.current()
+            result['category'] = categories[index - 1] if index > 0 else (None, None)
+            dialog.destroy()
+
+        button_frame = ttk.Frame(frame)
+        button_frame.pack()
+        ttk.Button(button_frame, text="确定", command=ok_clicked, width=12).pack(side=tk.LEFT, padx=8)
+        ttk.Button(button_frame, text="取消", command=dialog.destroy, width=12).pack(side=tk.LEFT, padx=8)
+
+        dialog.bind('<Return>', lambda event: ok_clicked())
+        dialog.bind('<Escape>', lambda event: dialog.destroy())
+        dialog.wait_window()
+
+        if 'category' not in result:
+            return
+
+        category_id, category_name = result['category']
+        before = self.journal.snapshot_ids('commands', command_ids)
+        self.cursor.executemany('UPDATE commands SET category_id = ? WHERE id = ?',
+                                [(category_id, command_id) for command_id in command_ids])
+        self.journal.record("移动到分类", 'commands', before, self.journal.snapshot_ids('commands', command_ids))
+        self.conn.commit()
+
+        # 按分类过滤时，移出当前分类的行直接移除
+        iids = [str(command_id) for command_id in command_ids]
+        current_filter = self.category_filter.get()
+        if current_filter and current_filter != '全部' and current_filter != category_name:
+            self.command_tree.delete(*iids)
+        else:
+            for iid in iids:
+                self.command_tree.set(iid, '分类', category_name or "未分类")
+
+        self.status_var.set(f"已移动 {len(command_ids)} 个命令到 {category_name or '未分类'}")
+
+    def export_selected_commands(self):
+        """导出选中的命令为JSON文件"""
+        command_ids = self.get_selected_command_ids()
+        if not command_ids:
+            messagebox.showwarning("警告", "请选择要导出的命令")
+            return
+
+        file_path = filedialog.asksaveasfilename(
+            title="导出命令", defaultextension=".json",
+            filetypes=[("JSON文件", "*.json"), ("所有文件", "*.*")])
+        if not file_path:
+            return
+
+        placeholders = ','.join('?' * len(command_ids))
+        self.cursor.execute(f'''
+            SELECT c.name, c.command, cat.name, c.description, c.is_favorite, c.tags
+            FROM commands c
+            LEFT JOIN categories cat ON c.category_id = cat.id
+            WHERE c.id IN ({placeholders})
+            ORDER BY c.name
+        ''', command_ids)
+        commands = [{"name": name, "command": command, "category": category,
+                     "description": description, "is_favorite": bool(is_favorite),
+                     "tags": (tags or '').split()}
+                    for name, command, category, description, is_favorite, tags in self.cursor.fetchall()]
+
+        try:
+            with open(file_path, 'w', encoding='utf-8') as f:
+                json.dump({"commands": commands}, f, indent=2, ensure_ascii=False)
+            self.status_var.set(f"已导出 {len(commands)} 个命令到 {file_path}")
+        except OSError as e:
+            messagebox.showerror("错误", f"导出失败: {e}")
+
+    def show_command_menu(self, event):
+        """显示命令列表右键菜单"""
+        row = self.command_tree.identify_row(event.y)
+        if row and row not in self.command_tree.selection():
+            self.command_tree.selection_set(row)
+        if self.get_selected_command_ids():
+            self.command_menu.tk_popup(event.x_root, event.y_root)
 
     def copy_command(self):
         """复制命令到剪贴板"""
@@ -575,25 +1032,37 @@ class CommandManager:
             messagebox.showwarning("警告", "请选择要复制的命令")
             return
 
-        item = self.command_tree.item(selection[0])
-        values = item['values']
-        command_name = values[0]
+        command_id = self.get_selected_command_id()
 
         # 从数据库获取完整的命令内容
-        self.cursor.execute('SELECT command FROM commands WHERE name = ?', (command_name,))
+        self.cursor.execute('SELECT name, command, updated_at, tags FROM commands WHERE id = ?', (command_id,))
         result = self.cursor.fetchone()
 
-        if result and result[0]:  # 完整的命令内容
+        if result and result[1]:  # 完整的命令内容
+            text = result[1]
+            template = None
+            if templates.is_template_command(result[3]):
+                try:
+                    template = self.template_cache.get(command_id, result[2], text)
+                except templates.TemplateError as e:
+                    messagebox.showwarning("警告", f"命令模板有误，复制原始命令: {e}")
+            if template is not None and template.is_template:
+                # 模板命令先填写参数
+                text = TemplateDialog(self.root, result[0], template).result
+                if text is None:
+                    return
             self.root.clipboard_clear()
-            self.root.clipboard_append(result[0])
+            self.root.clipboard_append(text)
+            self.usage_tracker.record(command_id, 'copy')
             self.status_var.set("命令已复制到剪贴板")
         else:
             messagebox.showwarning("警告", "选中的命令没有内容")
 
-    def copy_full_command(self, command_text):
+    def copy_full_command(self, command_text, command_id=None):
         """复制完整命令到剪贴板"""
         self.root.clipboard_clear()
         self.root.clipboard_append(command_text)
+        self.usage_tracker.record(command_id, 'copy_full')
         self.status_var.set("完整命令已复制到剪贴板")
 
     def execute_command(self, event):
@@ -602,15 +1071,20 @@ class CommandManager:
         if not selection:
             return
 
+        command_id = self.get_selected_command_id()
+        if command_id is None:
+            return
+
         item = self.command_tree.item(selection[0])
         values = item['values']
         command_name = values[0]
 
         # 从数据库获取完整的命令内容
-        self.cursor.execute('SELECT command, description FROM commands WHERE name = ?', (command_name,))
+        self.cursor.execute('SELECT command, description FROM commands WHERE id = ?', (command_id,))
         result = self.cursor.fetchone()
 
         if result:
+            self.usage_tracker.record(command_id, 'view')
             full_command = result[0] or "无命令内容"
             description = result[1] or "无描述"
             category = values[2]
@@ -644,7 +1118,7 @@ class CommandManager:
 
             # 复制按钮
             copy_btn = ttk.Button(dialog, text="复制完整命令",
-                                command=lambda: self.copy_full_command(full_command))
+                                command=lambda: self.copy_full_command(full_command, command_id))
             copy_btn.pack(pady=5)
 
             # 关闭按钮
@@ -720,6 +1194,8 @@ class CommandManager:
             try:
                 self.cursor.execute('INSERT INTO categories (name, description) VALUES (?, ?)',
                                   (result['name'], result['description']))
+                self.journal.record("添加分类", 'categories', {},
+                                    self.journal.snapshot_ids('categories', [self.cursor.lastrowid]))
                 self.conn.commit()
                 self.refresh_category_list()
                 self.update_category_filter()
@@ -804,8 +1280,11 @@ class CommandManager:
         # 处理结果
         if result and 'name' in result:
             try:
+                before = self.journal.snapshot('categories', 'name = ?', (values[0],))
                 self.cursor.execute('UPDATE categories SET name = ?, description = ? WHERE name = ?',
                                   (result['name'], result['description'], values[0]))
+                self.journal.record("编辑分类", 'categories', before,
+                                    self.journal.snapshot_ids('categories', before))
                 self.conn.commit()
                 self.refresh_category_list()
                 self.update_category_filter()
@@ -833,7 +1312,9 @@ class CommandManager:
             return
 
         if messagebox.askyesno("确认", f"确定要删除分类 '{category_name}' 吗？"):
+            before = self.journal.snapshot('categories', 'name = ?', (category_name,))
             self.cursor.execute('DELETE FROM categories WHERE name = ?', (category_name,))
+            self.journal.record("删除分类", 'categories', before, {})
             self.conn.commit()
             self.refresh_category_list()
             self.update_category_filter()
@@ -841,13 +1322,11 @@ class CommandManager:
 
     def add_note(self):
         """添加笔记"""
-        dialog = NoteDialog(self.root, "添加笔记")
+        dialog = NoteDialog(self.root, "添加笔记", categories=database.list_note_categories(self.conn))
         if dialog.result:
-            title, content, category = dialog.result
-            self.cursor.execute('''
-                INSERT INTO notes (title, content, category)
-                VALUES (?, ?, ?)
-            ''', (title, content, category))
+            title, content, category, tags = dialog.result
+            note_id = database.insert_note(self.cursor, title, content, category, tags)
+            self.journal.record("添加笔记", 'notes', {}, self.journal.snapshot_ids('notes', [note_id]))
             self.conn.commit()
             self.refresh_note_list()
             messagebox.showinfo("成功", f"笔记 '{title}' 添加成功")
@@ -867,16 +1346,54 @@ class CommandManager:
         note_data = self.cursor.fetchone()
 
         if note_data:
-            dialog = NoteDialog(self.root, "编辑笔记", note_data)
+            dialog = NoteDialog(self.root, "编辑笔记", note_data,
+                                categories=database.list_note_categories(self.conn),
+                                tags=database.get_tags(self.conn, 'notes', note_data[0]))
             if dialog.result:
-                title, content, category = dialog.result
-                self.cursor.execute('''
-                    UPDATE notes SET title = ?, content = ?, category = ?,
-                    updated_at = CURRENT_TIMESTAMP WHERE id = ?
-                ''', (title, content, category, note_data[0]))
+                title, content, category, tags = dialog.result
+                before = self.journal.snapshot_ids('notes', [note_data[0]])
+                database.update_note(self.cursor, note_data[0], title, content, category, tags)
+                self.journal.record("编辑笔记", 'notes', before, self.journal.snapshot_ids('notes', [note_data[0]]))
                 self.conn.commit()
                 self.refresh_note_list()
 
+    def show_command_history(self):
+        """显示选中命令的历史版本"""
+        command_id = self.get_selected_command_id()
+        if not command_id:
+            messagebox.showwarning("警告", "请选择要查看历史的命令")
+            return
+        HistoryWindow(self.root, self.conn, 'commands', command_id, self.get_categories(),
+                      self.restore_history_version)
+
+    def show_note_history(self):
+        """显示选中笔记的历史版本"""
+        selection = self.note_tree.selection()
+        if not selection:
+            messagebox.showwarning("警告", "请选择要查看历史的笔记")
+            return
+        self.cursor.execute('SELECT id FROM notes WHERE title = ?', (self.note_tree.item(selection[0])['values'][0],))
+        row = self.cursor.fetchone()
+        if row:
+            HistoryWindow(self.root, self.conn, 'notes', row[0], (), self.restore_history_version)
+
+    def restore_history_version(self, table, row_id, version):
+        """把命令或笔记恢复为历史版本（可撤销）"""
+        before = self.journal.snapshot_ids(table, [row_id])
+        if not database.restore_version(self.cursor, table, row_id, version):
+            self.conn.rollback()
+            messagebox.showerror("错误", f"无法读取版本 {version}")
+            return False
+        self.journal.record(f"恢复到版本 {version}", table, before, self.journal.snapshot_ids(table, [row_id]))
+        self.conn.commit()
+
+        if table == 'commands':
+            self.apply_command_changes({row_id}, set())
+        elif self.widget_exists('note_tree'):
+            self.refresh_note_list()
+        self.status_var.set(f"已恢复到版本 {version}")
+        return True
+
     def delete_note(self):
         """删除笔记"""
         selection = self.note_tree.selection()
@@ -888,7 +1405,9 @@ class CommandManager:
             item = self.note_tree.item(selection[0])
             title = item['values'][0]
 
+            before = self.journal.snapshot('notes', 'title = ?', (title,))
             self.cursor.execute('DELETE FROM notes WHERE title = ?', (title,))
+            self.journal.record("删除笔记", 'notes', before, {})
             self.conn.commit()
             self.refresh_note_list()
 
@@ -899,7 +1418,7 @@ class CommandManager:
             item = self.note_tree.item(selection[0])
             title = item['values'][0]
 
-            self.cursor.execute('SELECT content FROM notes WHERE title = ?', (title,))
+            self.cursor.execute('SELECT content, id FROM notes WHERE title = ?', (title,))
             result = self.cursor.fetchone()
 
             if result:
@@ -909,6 +1428,93 @@ class CommandManager:
                 self.note_content.insert(1.0, result[0])
                 # 重新设置为只读模式
                 self.note_content.config(state=tk.DISABLED)
+                self.refresh_attachments(result[1])
+
+    def refresh_attachments(self, note_id):
+        """显示笔记的附件列表（只读取元数据）"""
+        self.current_note_id = note_id
+        self.attachment_tree.delete(*self.attachment_tree.get_children())
+        self.attachment_preview.config(image='', text='')
+        for attachment_id, filename, mime_type, size, width, height, _, _ in \
+                attachments.list_attachments(self.conn, note_id):
+            kind = f"{mime_type} {width}x{height}" if width else mime_type
+            self.attachment_tree.insert('', tk.END, iid=str(attachment_id),
+                                        values=(filename, kind, maintenance.format_size(size)))
+
+    def on_attachment_select(self, event):
+        """选中图片附件时显示缩略图（缩略图生成后缓存）"""
+        selection = self.attachment_tree.selection()
+        if not selection:
+            return
+        row = attachments.get_attachment(self.conn, int(selection[0]))
+        if not row or row[2] not in attachments.THUMBNAIL_TYPES or row[3] > attachments.THUMBNAIL_MAX_SIZE:
+            self.attachment_preview.config(image='', text='')
+            return
+
+        key = (row[0], row[6])
+        image = self.thumbnail_cache.get(key)
+        if image is None:
+            try:
+                data = attachments.read_attachment(self.conn, row[0])
+                image = tk.PhotoImage(data=base64.b64encode(data).decode('ascii'))
+            except (sqlite3.Error, tk.TclError) as e:
+                self.attachment_preview.config(image='', text=f"无法预览: {e}")
+                return
+            factor = -(-max(image.width(), image.height()) // attachments.THUMBNAIL_EDGE)
+            if factor > 1:
+                image = image.subsample(factor)
+            self.thumbnail_cache.put(key, image)
+        self.attachment_preview.config(image=image, text='')
+
+    def add_note_attachments(self):
+        """把文件添加为当前笔记的附件"""
+        if self.current_note_id is None or not self.note_tree.selection():
+            messagebox.showwarning("警告", "请选择要添加附件的笔记")
+            return
+        paths = filedialog.askopenfilenames(title="添加附件")
+        if not paths:
+            return
+        try:
+            for path in paths:
+                attachments.add_attachment(self.cursor, self.current_note_id, path)
+            self.conn.commit()
+        except (OSError, ValueError, sqlite3.Error) as e:
+            self.conn.rollback()
+            messagebox.showerror("错误", f"添加附件失败: {e}")
+            return
+        self.refresh_attachments(self.current_note_id)
+        self.status_var.set(f"已添加 {len(paths)} 个附件")
+
+    def save_note_attachment(self):
+        """把选中的附件保存为文件"""
+        selection = self.attachment_tree.selection()
+        if not selection:
+            messagebox.showwarning("警告", "请选择要保存的附件")
+            return
+        row = attachments.get_attachment(self.conn, int(selection[0]))
+        if not row:
+            return
+        path = filedialog.asksaveasfilename(title="保存附件", initialfile=row[1])
+        if not path:
+            return
+        try:
+            size = attachments.save_attachment(self.conn, row[0], path)
+        except (OSError, sqlite3.Error) as e:
+            messagebox.showerror("错误", f"保存附件失败: {e}")
+            return
+        self.status_var.set(f"已保存附件到 {path}（{maintenance.format_size(size)}）")
+
+    def delete_note_attachments(self):
+        """删除选中的附件"""
+        selection = self.attachment_tree.selection()
+        if not selection:
+            messagebox.showwarning("警告", "请选择要删除的附件")
+            return
+        if not messagebox.askyesno("确认", f"确定要删除选中的 {len(selection)} 个附件吗？删除后无法撤销。"):
+            return
+        attachments.delete_attachments(self.cursor, [int(iid) for iid in selection])
+        self.conn.commit()
+        self.refresh_attachments(self.current_note_id)
 
     def copy_note(self):
         """复制笔记到剪贴板"""
@@ -931,6 +1537,292 @@ class CommandManager:
         else:
             messagebox.showwarning("警告", "选中的笔记没有内容")
 
+    # 撤销/重做
+    def undo(self):
+        """撤销最近一次修改"""
+        self.replay_journal(self.journal.undo, "撤销", "没有可撤销的操作")
+
+    def redo(self):
+        """重做最近一次撤销的修改"""
+        self.replay_journal(self.journal.redo, "重做", "没有可重做的操作")
+
+    def replay_journal(self, action, action_name, empty_message):
+        """执行撤销/重做并刷新受影响的界面"""
+        try:
+            result = action()
+        except UndoError as e:
+            messagebox.showerror("错误", str(e))
+            return
+
+        if result is None:
+            self.status_var.set(empty_message)
+            return
+
+        label, affected = result
+        tables = {table for table, _ in affected}
+        if 'commands' in tables:
+            for table, row_id in affected:
+                if table == 'commands':
+                    self.update_fuzzy_index(row_id)
+        self.refresh_current_view(tables)
+        self.status_var.set(f"已{action_name}: {label}")
+
+    def refresh_current_view(self, tables):
+        """刷新当前显示的与指定表相关的列表"""
+        if 'categories' in tables:
+            self.load_categories()
+            self.update_category_filter()
+        if {'commands', 'categories'} & tables and self.widget_exists('command_tree'):
+            self.quick_search()
+        if 'categories' in tables and self.widget_exists('category_tree'):
+            self.refresh_category_list()
+        if 'notes' in tables and self.widget_exists('note_tree'):
+            self.refresh_note_list()
+
+    def widget_exists(self, name):
+        """判断界面组件是否仍然显示（切换界面后旧组件会被销毁）"""
+        widget = getattr(self, name, None)
+        return widget is not None and bool(widget.winfo_exists())
+
+    def show_diagnostics(self):
+        """显示性能诊断面板"""
+        if self.diagnostics_window and self.diagnostics_window.window.winfo_exists():
+            self.diagnostics_window.window.lift()
+            return
+        self.diagnostics_window = DiagnosticsWindow(self.root, instrumentation.monitor)
+
+    def show_duplicates(self):
+        """显示重复和近似重复的命令"""
+        if self.duplicates_window and self.duplicates_window.window.winfo_exists():
+            self.duplicates_window.window.lift()
+            self.duplicates_window.refresh()
+            return
+        self.duplicates_window = DuplicatesWindow(self.root, self.conn, self.merge_duplicate_commands)
+
+    def merge_duplicate_commands(self, groups):
+        """合并多组重复命令（可撤销），返回删除的命令数"""
+        command_ids = [command_id for group in groups for command_id in group]
+        removed = dedup.merge_duplicates(self.cursor, groups, self.journal)
+        self.conn.commit()
+
+        self.apply_command_changes(set(command_ids) - set(removed), set(removed))
+        self.status_var.set(f"已合并 {len(groups)} 组重复命令，删除 {len(removed)} 个命令")
+        return len(removed)
+
+    def start_profiling(self):
+        """开始记录 cProfile 和 tracemalloc 数据"""
+        if self.profiling:
+            return
+        session = ProfilingSession(db_path=self.db_path)
+        try:
+            session.start()
+        except ValueError as e:
+            messagebox.showerror("错误", f"无法开始性能分析: {e}")
+            return
+        self.profiling = session
+        self.update_profiling_menu()
+        self.sample_profiling()
+
+    def update_profiling_menu(self):
+        """按是否正在进行性能分析更新诊断菜单"""
+        running = self.profiling is not None
+        self.diagnostics_menu.entryconfig("开始性能分析", state=tk.DISABLED if running else tk.NORMAL)
+        self.diagnostics_menu.entryconfig("停止并保存分析结果", state=tk.NORMAL if running else tk.DISABLED)
+        if running:
+            self.status_var.set("正在进行性能分析，重现问题后在“诊断”菜单中停止")
+
+    def sample_profiling(self):
+        """性能分析期间每秒记录一次内存使用"""
+        if self.profiling:
+            self.profiling.sample()
+            self.root.after(1000, self.sample_profiling)
+
+    def stop_profiling(self, show_result=True):
+        """停止性能分析并保存分析包"""
+        if not self.profiling:
+            return None
+        session, self.profiling = self.profiling, None
+        try:
+            archive = session.stop({'latency': [
+                {'kind': kind, 'name': name, 'count': count, 'total': total,
+                 'p50': p50, 'p95': p95, 'p99': p99, 'max': maximum}
+                for kind, name, count, total, p50, p95, p99, maximum in instrumentation.monitor.snapshot()]})
+        except OSError as e:
+            print(f"保存性能分析结果失败: {e}")
+            if show_result:
+                messagebox.showerror("错误", f"保存性能分析结果失败: {e}")
+            return None
+
+        if show_result:
+            self.update_profiling_menu()
+            self.status_var.set(f"性能分析结果已保存: {archive}")
+            messagebox.showinfo("成功", f"性能分析结果已保存到:\n{archive}")
+        else:
+            print(f"性能分析结果已保存: {archive}")
+        return archive
+
+    def open_diagnostics_dir(self):
+        """用系统文件管理器打开诊断文件目录"""
+        os.makedirs(DIAGNOSTICS_DIR, exist_ok=True)
+        self.open_url(f"file://{DIAGNOSTICS_DIR}")
+
+    def on_user_activity(self, event=None):
+        self.last_activity = time.time()
+
+    def check_idle_maintenance(self):
+        """用户空闲且距上次维护超过一天时，在后台自动维护数据库"""
+        try:
+            if (time.time() - self.last_activity >= maintenance.IDLE_SECONDS
+                    and maintenance.is_due(self.conn)):
+                self.run_maintenance(automatic=True)
+        except sqlite3.Error as e:
+            print(f"检查数据库维护失败: {e}")
+        self.root.after(60000, self.check_idle_maintenance)
+
+    def run_maintenance(self, full=False, automatic=False):
+        """在后台线程中维护数据库（完整性检查、更新统计信息、回收空闲空间）"""
+        if self.maintenance_thread is not None:
+            if not automatic:
+                messagebox.showinfo("提示", "数据库维护正在进行中")
+            return
+        if full and not messagebox.askyesno(
+                "确认", "完整整理会重写整个数据库文件，期间无法保存修改。确定要继续吗？"):
+            return
+
+        try:
+            self.usage_tracker.flush()
+        except sqlite3.Error as e:
+            print(f"写入使用记录失败: {e}")
+
+        result = {}
+
+        def run():
+            try:
+                result['report'] = maintenance.run_maintenance(self.db_path, full=full)
+            except sqlite3.Error as e:
+                result['error'] = e
+
+        self.maintenance_thread = threading.Thread(target=run, daemon=True)
+        self.maintenance_thread.start()
+        self.status_var.set("正在维护数据库...")
+        self.root.after(200, self.poll_maintenance, result, automatic)
+
+    def poll_maintenance(self, result, automatic):
+        """检查后台维护是否完成"""
+        if self.maintenance_thread.is_alive():
+            self.root.after(200, self.poll_maintenance, result, automatic)
+            return
+
+        self.maintenance_thread = None
+        if 'error' in result:
+            self.status_var.set("数据库维护失败")
+            print(f"数据库维护失败: {result['error']}")
+            if not automatic:
+                messagebox.showerror("错误", f"数据库维护失败: {result['error']}")
+            return
+
+        report = result['report']
+        self.status_var.set(f"数据库维护完成，回收 {maintenance.format_size(report['reclaimed_bytes'])}，"
+                            f"耗时 {report['duration']:.1f} 秒")
+        if report['integrity'] != 'ok':
+            messagebox.showwarning("警告", f"数据库完整性检查发现问题:\n{report['integrity']}")
+        elif not automatic:
+            messagebox.showinfo("数据库维护", maintenance.format_report(report))
+
+    def ingest_shell_history(self):
+        """在后台线程中读取 bash/zsh/fish 历史文件的新增内容，完成后显示候选命令"""
+        if self.ingest_thread is not None:
+            messagebox.showinfo("提示", "正在导入Shell历史")
+            return
+        files = shell_history.default_history_files()
+        if not files:
+            messagebox.showinfo("提示", "没有找到 bash、zsh 或 fish 的历史文件")
+            return
+
+        result = {}
+
+        def run():
+            conn = database.connect(self.db_path)
+            try:
+                result['stats'] = shell_history.HistoryIngester(conn).ingest(files)
+            except (OSError, sqlite3.Error) as e:
+                result['error'] = e
+            finally:
+                conn.close()
+
+        self.ingest_thread = threading.Thread(target=run, daemon=True)
+        self.ingest_thread.start()
+        self.status_var.set("正在读取Shell历史...")
+        self.root.after(200, self.poll_shell_history, result)
+
+    def poll_shell_history(self, result):
+        """检查后台导入是否完成"""
+        if self.ingest_thread.is_alive():
+            self.root.after(200, self.poll_shell_history, result)
+            return
+
+        self.ingest_thread = None
+        if 'error' in result:
+            self.status_var.set("导入Shell历史失败")
+            messagebox.showerror("错误", f"导入Shell历史失败: {result['error']}")
+            return
+        stats = result['stats']
+        self.status_var.set(f"已读取 {stats['files']} 个历史文件中新增的 {stats['entries']} 条记录，"
+                            f"新增 {stats['new_candidates']} 个候选命令，耗时 {stats['seconds']:.1f} 秒")
+        self.show_history_candidates()
+
+    def set_command_alias(self):
+        """设置选中命令导出到shell的别名（可撤销），设置后重新导出别名文件"""
+        command_id = self.get_selected_command_id()
+        if not command_id:
+            messagebox.showwarning("警告", "请选择要设置别名的命令")
+            return
+        self.cursor.execute('SELECT name, alias_name FROM commands WHERE id = ?', (command_id,))
+        row = self.cursor.fetchone()
+        if not row:
+            return
+        alias_name = simpledialog.askstring("设置Shell别名", f"“{row[0]}”的别名（留空表示不导出）:",
+                                            initialvalue=row[1] or '', parent=self.root)
+        if alias_name is None:
+            return
+
+        before = self.journal.snapshot_ids('commands', [command_id])
+        try:
+            database.set_alias(self.cursor, command_id, alias_name)
+        except ValueError as e:
+            self.conn.rollback()
+            messagebox.showerror("错误", str(e))
+            return
+        self.journal.record("设置Shell别名", 'commands', before, self.journal.snapshot_ids('commands', [command_id]))
+        self.conn.commit()
+        self.export_shell_aliases()
+
+    def export_shell_aliases(self, force=False):
+        """把设置了别名的命令导出到 data/shell（只在导出的命令有变化时重写文件）"""
+        output_dir = shell_export.default_output_dir(database.DATA_DIR)
+        try:
+            stats = shell_export.export_aliases(self.db_path, output_dir, force)
+        except (OSError, sqlite3.Error) as e:
+            messagebox.showerror("错误", f"导出Shell别名失败: {e}")
+            return
+        if stats['written']:
+            self.status_var.set(f"已导出 {stats['count']} 个Shell别名到 {output_dir}")
+        elif force:
+            self.status_var.set(f"Shell别名没有变化（{output_dir}）")
+
+    def show_history_candidates(self):
+        HistoryCandidatesDialog(self.root, self.conn, self.add_history_candidates)
+
+    def add_history_candidates(self, content_hashes):
+        """把选中的候选命令添加到命令库（可撤销）"""
+        command_ids = shell_history.add_candidates(self.cursor, content_hashes)
+        self.journal.record("导入Shell历史", 'commands', {}, self.journal.snapshot_ids('commands', command_ids))
+        self.conn.commit()
+        self.load_categories()
+        self.update_category_filter()
+        self.apply_command_changes(set(command_ids), set())
+        self.status_var.set(f"已添加 {len(command_ids)} 个命令到“{shell_history.IMPORT_CATEGORY}”分类")
+
     # 辅助方法
     def clear_content_frame(self):
         """清空内容框架"""
@@ -955,6 +1847,17 @@ class CommandManager:
         self.cursor.execute('SELECT id, name FROM categories ORDER BY name')
         return self.cursor.fetchall()
 
+    def get_selected_command_id(self):
+        """获取命令列表中选中行的命令ID"""
+        selection = self.command_tree.selection()
+        if not selection or not selection[0].isdigit():
+            return None
+        return int(selection[0])
+
+    def get_selected_command_ids(self):
+        """获取命令列表中所有选中行的命令ID"""
+        return [int(iid) for iid in self.command_tree.selection() if iid.isdigit()]
+
     def get_command_id_by_name(self, name):
         """根据命令名获取ID"""
         self.cursor.execute('SELECT id FROM commands WHERE name = ?', (name,))
@@ -967,43 +1870,27 @@ class CommandManager:
         for item in self.command_tree.get_children():
             self.command_tree.delete(item)
 
-        # 构建查询
-        query = '''
-            SELECT c.name, c.command, cat.name, c.description, c.is_favorite
-            FROM commands c
-            LEFT JOIN categories cat ON c.category_id = cat.id
-        '''
-        params = []
-
-        conditions = []
-        if self.favorite_only.get():
-            conditions.append('c.is_favorite = 1')
-
-        if hasattr(self, 'category_filter') and self.category_filter.get():
-            category_name = self.category_filter.get()
-            if category_name != '全部':
-                conditions.append('cat.name = ?')
-                params.append(category_name)
+        category_name = self.category_filter.get() if self.widget_exists('category_filter') else ''
+        if category_name == '全部':
+            category_name = ''
 
-        if conditions:
-            query += ' WHERE ' + ' AND '.join(conditions)
+        self.refresh_command_cache()
+        rows = self.command_cache.rows(category_name, self.favorite_only.get(),
+                                       self.selected_tags, self.tag_match_all.get())
+        self.insert_command_rows(rows)
 
-        query += ' ORDER BY c.is_favorite DESC, c.name'
+    def insert_command_rows(self, rows):
+        """把 (id, 名称, 预览, 分类, 收藏) 行插入命令列表"""
+        insert = self.command_tree.insert
+        values = self.command_row_values
+        for row in self.sort_rows('command_tree', rows, COMMAND_SORT_FIELDS):
+            insert('', tk.END, iid=str(row[0]), values=values(row))
 
-        # 执行查询
-        self.cursor.execute(query, params)
-        for row in self.cursor.fetchall():
-            favorite = "是" if row[4] else "否"
-            # 格式化命令为单行显示（处理换行符和过长命令）
-            command_text = row[1]
-            # 将多行命令替换为单行显示
-            command_text = command_text.replace('\n', ' ').replace('\r', ' ')
-            # 移除多余空格
-            command_text = ' '.join(command_text.split())
-            # 截断过长的命令
-            if len(command_text) > 80:
-                command_text = command_text[:77] + "..."
-            self.command_tree.insert('', tk.END, values=(row[0], command_text, row[2] or "未分类", favorite))
+    @staticmethod
+    def command_row_values(row):
+        """命令列表行在界面中显示的列值"""
+        command_id, name, preview, category, is_favorite = row
+        return (name, preview, category or "未分类", "是" if is_favorite else "否")
 
     def refresh_category_list(self):
         """刷新分类列表"""
@@ -1011,7 +1898,8 @@ class CommandManager:
             self.category_tree.delete(item)
 
         self.cursor.execute('SELECT name, description, created_at FROM categories ORDER BY name')
-        for row in self.cursor.fetchall():
+        fields = {col: index for index, col in enumerate(self.category_tree['columns'])}
+        for row in self.sort_rows('category_tree', self.cursor.fetchall(), fields):
             self.category_tree.insert('', tk.END, values=row)
 
     def refresh_host_list(self):
@@ -1028,27 +1916,52 @@ class CommandManager:
         for item in self.note_tree.get_children():
             self.note_tree.delete(item)
 
-        query = 'SELECT title, category, created_at FROM notes'
+        query = 'SELECT title, category, tags, created_at FROM notes'
         params = []
+        conditions = []
 
-        if hasattr(self, 'note_category_filter'):
-            filter_text = self.note_category_filter.get().strip()
-            if filter_text:
-                query += ' WHERE category LIKE ?'
-                params.append(f'%{filter_text}%')
+        if self.widget_exists('note_category_filter'):
+            self.update_note_category_filter()
+            category_name = self.note_category_filter.get()
+            if category_name and category_name != '全部':
+                conditions.append('category_id = (SELECT id FROM note_categories WHERE name = ?)')
+                params.append(category_name)
+
+            tag = self.note_tag_filter.get()
+            if tag and tag != '全部':
+                condition, tag_params = tagging.tag_filter_sql('notes', [tag])
+                conditions.append(condition)
+                params.extend(tag_params)
+
+        if conditions:
+            query += ' WHERE ' + ' AND '.join(conditions)
 
         query += ' ORDER BY created_at DESC'
 
         self.cursor.execute(query, params)
-        for row in self.cursor.fetchall():
+        fields = {col: index for index, col in enumerate(self.note_tree['columns'])}
+        for row in self.sort_rows('note_tree', self.cursor.fetchall(), fields):
             self.note_tree.insert('', tk.END, values=row)
 
     def update_category_filter(self):
         """更新分类过滤器"""
-        if hasattr(self, 'category_filter'):
+        if self.widget_exists('category_filter'):
+            current = self.category_filter.get()
             categories = ['全部'] + [name for _, name in self.get_categories()]
             self.category_filter['values'] = categories
-            self.category_filter.set('全部')
+            self.category_filter.set(current if current in categories else '全部')
+
+    def update_note_category_filter(self):
+        """更新笔记分类过滤器（保留当前选择）"""
+        current = self.note_category_filter.get()
+        categories = ['全部'] + database.list_note_categories(self.conn)
+        self.note_category_filter['values'] = categories
+        self.note_category_filter.set(current if current in categories else '全部')
+
+        current = self.note_tag_filter.get()
+        note_tags = ['全部'] + [tag for tag, _ in tagging.list_tags(self.conn, 'notes')]
+        self.note_tag_filter['values'] = note_tags
+        self.note_tag_filter.set(current if current in note_tags else '全部')
 
     def update_host_combo(self):
         """更新主机下拉框"""
@@ -1064,6 +1977,43 @@ class CommandManager:
             if hosts:
                 self.host_combo.current(0)
 
+    def refresh_command_cache(self):
+        """同步命令列表缓存，有变化时更新标签计数"""
+        if self.command_cache.refresh(self.conn):
+            self.refresh_tag_facets()
+
+    def refresh_tag_facets(self):
+        """更新侧边栏的标签列表和命令数（全部匹配时只统计满足已选标签的命令）"""
+        match_all = self.tag_match_all.get()
+        facets = self.command_cache.tag_facets(self.selected_tags if match_all else None)
+        counts = dict(facets)
+        names = [tag for tag, _ in facets]
+        names += [tag for tag in self.selected_tags if tag not in counts]
+
+        self.tag_list_names = names
+        self.tag_listbox.delete(0, tk.END)
+        self.tag_listbox.insert(tk.END, *[f"{tag} ({counts.get(tag, 0)})" for tag in names])
+        for index, tag in enumerate(names):
+            if tag in self.selected_tags:
+                self.tag_listbox.selection_set(index)
+
+    def tag_filter_ids(self):
+        """满足侧边栏标签过滤的命令ID集合，没有选择标签时返回 None"""
+        if not self.selected_tags:
+            return None
+        return set(self.command_cache.tag_ids(self.selected_tags, self.tag_match_all.get()))
+
+    def on_tag_filter_changed(self, event=None):
+        """选择的标签或匹配方式变化"""
+        self.selected_tags = [self.tag_list_names[index] for index in self.tag_listbox.curselection()]
+        self.refresh_tag_facets()
+        if self.widget_exists('command_tree'):
+            self.quick_search()
+
+    def clear_tag_filter(self):
+        self.tag_listbox.selection_clear(0, tk.END)
+        self.on_tag_filter_changed()
+
     def filter_commands(self, event=None):
         """过滤命令"""
         self.refresh_command_list()
@@ -1085,33 +2035,115 @@ class CommandManager:
             self.refresh_command_list()
             return
 
-        # 搜索命令
-        self.cursor.execute('''
-            SELECT c.name, c.command, cat.name, c.is_favorite
-            FROM commands c
-            LEFT JOIN categories cat ON c.category_id = cat.id
-            WHERE c.name LIKE ? OR c.command LIKE ? OR c.description LIKE ?
-            ORDER BY c.is_favorite DESC, c.name
-        ''', (f'%{search_term}%', f'%{search_term}%', f'%{search_term}%'))
+        if self.fuzzy_var.get():
+            results = self.fuzzy_search(search_term)
+        else:
+            # 搜索命令
+            results = database.search_commands(self.conn, search_term)
+
+            # 没有精确匹配时退回到模糊匹配
+            if not results:
+                results = self.fuzzy_search(search_term)
+                if results:
+                    self.status_var.set("未找到精确匹配，显示近似结果")
+
+        tagged = self.tag_filter_ids()
+        if tagged is not None:
+            results = [row for row in results if row[0] in tagged]
 
-        results = self.cursor.fetchall()
         if results:
-            for row in results:
-                favorite = "是" if row[3] else "否"
-                # 格式化命令为单行显示（处理换行符和过长命令）
-                command_text = row[1]
-                # 将多行命令替换为单行显示
-                command_text = command_text.replace('\n', ' ').replace('\r', ' ')
-                # 移除多余空格
-                command_text = ' '.join(command_text.split())
-                # 截断过长的命令
-                if len(command_text) > 80:
-                    command_text = command_text[:77] + "..."
-                self.command_tree.insert('', tk.END, values=(row[0], command_text, row[2] or "未分类", favorite))
+            self.insert_command_rows(results)
         else:
             # 显示无结果提示
             self.command_tree.insert('', tk.END, values=("无搜索结果", "请尝试其他关键词", "", ""))
 
+    def fuzzy_search(self, search_term, limit=100):
+        """模糊搜索命令，返回按匹配度排序的命令行"""
+        if self.fuzzy_index is None:
+            self.start_fuzzy_index_build()
+            self.status_var.set("正在建立模糊搜索索引...")
+            return []
+
+        ranked = self.fuzzy_index.search(search_term, limit=limit)
+        if not ranked:
+            return []
+
+        self.refresh_command_cache()
+        return self.command_cache.rows_for_ids([command_id for command_id, _ in ranked])
+
+    def start_fuzzy_index_build(self):
+        """在后台线程中建立模糊搜索索引"""
+        if self.fuzzy_index is not None or self.fuzzy_index_building is not None:
+            return
+
+        result = {}
+
+        def build():
+            conn = sqlite3.connect(self.db_path)
+            try:
+                index = TrigramIndex()
+                index.build(conn.execute('SELECT id, name, command, description FROM commands'))
+                result['index'] = index
+            except sqlite3.Error as e:
+                result['error'] = e
+            finally:
+                conn.close()
+
+        self.fuzzy_index_building = threading.Thread(target=build, daemon=True)
+        self.fuzzy_index_building.start()
+        self.root.after(100, self.poll_fuzzy_index, result)
+
+    def poll_fuzzy_index(self, result):
+        """检查后台索引是否建立完成"""
+        if self.fuzzy_index_building.is_alive():
+            self.root.after(100, self.poll_fuzzy_index, result)
+            return
+
+        self.fuzzy_index_building = None
+        if self.fuzzy_index_outdated:
+            # 建立期间数据库被整体替换，重新建立
+            self.fuzzy_index_outdated = False
+            self.fuzzy_dirty_ids = set()
+            self.start_fuzzy_index_build()
+            return
+
+        if 'error' in result:
+            print(f"建立模糊搜索索引失败: {result['error']}")
+            return
+
+        self.fuzzy_index = result['index']
+        # 补上建立索引期间发生的修改
+        dirty_ids, self.fuzzy_dirty_ids = self.fuzzy_dirty_ids, set()
+        for command_id in dirty_ids:
+            self.update_fuzzy_index(command_id)
+
+        if self.search_var.get().strip():
+            self.quick_search()
+
+    def rebuild_fuzzy_index(self):
+        """丢弃模糊搜索索引并在后台重新建立"""
+        if self.fuzzy_index_building is not None:
+            self.fuzzy_index_outdated = True
+            return
+        self.fuzzy_index = None
+        self.fuzzy_dirty_ids = set()
+        self.start_fuzzy_index_build()
+
+    def update_fuzzy_index(self, command_id):
+        """命令增删改后增量更新模糊搜索索引"""
+        if self.fuzzy_index is None:
+            if self.fuzzy_index_building is not None:
+                self.fuzzy_dirty_ids.add(command_id)
+            return
+
+        self.cursor.execute('SELECT name, command, description FROM commands WHERE id = ?',
+                            (command_id,))
+        row = self.cursor.fetchone()
+        if row:
+            self.fuzzy_index.add(command_id, *row)
+        else:
+            self.fuzzy_index.remove(command_id)
+
     # show_search_results方法已删除，改为原地显示搜索结果
 
     def __del__(self):
@@ -1120,11 +2152,333 @@ class CommandManager:
             self.conn.close()
 
 
+class DiagnosticsWindow:
+    """性能诊断面板：SQL语句和界面事件的耗时分布，每秒刷新"""
+    REFRESH_INTERVAL = 1000
+    MAX_ROWS = 300
+
+    def __init__(self, parent, monitor):
+        self.monitor = monitor
+
+        self.window = tk.Toplevel(parent)
+        self.window.title("性能诊断")
+        self.window.geometry("1000x500")
+
+        toolbar = ttk.Frame(self.window, padding=(10, 10, 10, 0))
+        toolbar.pack(fill=tk.X)
+        self.summary_var = tk.StringVar()
+        ttk.Label(toolbar, textvariable=self.summary_var).pack(side=tk.LEFT)
+        ttk.Button(toolbar, text="清空统计", command=self.reset).pack(side=tk.RIGHT, padx=5)
+
+        list_frame = ttk.Frame(self.window, padding=10)
+        list_frame.pack(fill=tk.BOTH, expand=True)
+
+        columns = ('类型', '名称', '次数', 'p50(ms)', 'p95(ms)', 'p99(ms)', '最大(ms)', '总计(ms)')
+        self.tree = ttk.Treeview(list_frame, columns=columns, show='headings')
+        for col in columns:
+            self.tree.heading(col, text=col)
+            if col == '名称':
+                self.tree.column(col, width=420)
+            elif col == '类型':
+                self.tree.column(col, width=50)
+            else:
+                self.tree.column(col, width=75, anchor=tk.E)
+
+        scrollbar = ttk.Scrollbar(list_frame, orient=tk.VERTICAL, command=self.tree.yview)
+        self.tree.configure(yscrollcommand=scrollbar.set)
+        self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+
+        ttk.Label(self.window, text=f"慢操作日志: {monitor.slow_log_path}",
+                  padding=(10, 0, 10, 10)).pack(anchor=tk.W)
+
+        self.refresh()
+
+    def refresh(self):
+        """刷新统计（按总耗时排序）"""
+        if not self.window.winfo_exists():
+            return
+
+        rows = self.monitor.snapshot()
+        self.tree.delete(*self.tree.get_children())
+        for kind, name, count, total, p50, p95, p99, maximum in rows[:self.MAX_ROWS]:
+            self.tree.insert('', tk.END, values=(
+                kind, name, count, f"{p50 * 1000:.2f}", f"{p95 * 1000:.2f}", f"{p99 * 1000:.2f}",
+                f"{maximum * 1000:.2f}", f"{total * 1000:.1f}"))
+
+        elapsed = time.time() - self.monitor.started_at
+        self.summary_var.set(f"统计 {len(rows)} 项，已运行 {elapsed:.0f} 秒")
+        self.window.after(self.REFRESH_INTERVAL, self.refresh)
+
+    def reset(self):
+        self.monitor.reset()
+        self.tree.delete(*self.tree.get_children())
+
+
+class DuplicatesWindow:
+    """重复命令：完全重复（忽略空白差异）的命令可以一键合并，近似重复的命令按组列出"""
+
+    def __init__(self, parent, conn, merge):
+        self.conn = conn
+        self.merge = merge
+        self.groups = {}  # 组节点ID -> 命令ID列表
+        self.exact_groups = []
+
+        self.window = tk.Toplevel(parent)
+        self.window.title("重复命令")
+        self.window.geometry("900x500")
+
+        toolbar = ttk.Frame(self.window, padding=(10, 10, 10, 0))
+        toolbar.pack(fill=tk.X)
+        self.summary_var = tk.StringVar()
+        ttk.Label(toolbar, textvariable=self.summary_var).pack(side=tk.LEFT)
+        ttk.Button(toolbar, text="刷新", command=self.refresh).pack(side=tk.RIGHT, padx=5)
+        ttk.Button(toolbar, text="合并选中组", command=self.merge_selected).pack(side=tk.RIGHT, padx=5)
+        ttk.Button(toolbar, text="合并全部完全重复", command=self.merge_exact).pack(side=tk.RIGHT, padx=5)
+
+        list_frame = ttk.Frame(self.window, padding=10)
+        list_frame.pack(fill=tk.BOTH, expand=True)
+
+        self.tree = ttk.Treeview(list_frame, columns=('ID', '命令'), show='tree headings')
+        self.tree.heading('#0', text='名称')
+        self.tree.heading('ID', text='ID')
+        self.tree.heading('命令', text='命令')
+        self.tree.column('#0', width=300)
+        self.tree.column('ID', width=70, anchor=tk.E)
+        self.tree.column('命令', width=480)
+
+        scrollbar = ttk.Scrollbar(list_frame, orient=tk.VERTICAL, command=self.tree.yview)
+        self.tree.configure(yscrollcommand=scrollbar.set)
+        self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+
+        ttk.Label(self.window, text="合并时保留收藏的、使用次数最多的命令，收藏状态、使用统计和标签合并到保留的命令上",
+                  padding=(10, 0, 10, 10)).pack(anchor=tk.W)
+
+        self.refresh()
+
+    def refresh(self):
+        self.tree.delete(*self.tree.get_children())
+        self.groups = {}
+
+        exact = dedup.duplicate_groups(self.conn)
+        exact_root = self.tree.insert('', tk.END, text=f"完全重复（{len(exact)} 组）", open=True)
+        for command_ids in exact:
+            rows = database.get_commands_by_ids(self.conn, command_ids)
+            self.add_group(exact_root, [(row[0], row[1], row[2]) for row in rows])
+
+        near = dedup.near_duplicate_clusters(self.conn)
+        near_root = self.tree.insert('', tk.END, text=f"近似重复（{len(near)} 组）", open=True)
+        for rows in near:
+            self.add_group(near_root, [row[:3] for row in rows])
+
+        self.exact_groups = exact
+        self.summary_var.set(f"完全重复 {len(exact)} 组，近似重复 {len(near)} 组")
+
+    def add_group(self, root, rows):
+        group = self.tree.insert(root, tk.END, text=f"{rows[0][1]} 等 {len(rows)} 个", values=('', rows[0][2]))
+        self.groups[group] = [command_id for command_id, _, _ in rows]
+        for command_id, name, preview in rows:
+            self.tree.insert(group, tk.END, text=name, values=(command_id, preview))
+
+    def merge_exact(self):
+        if not self.exact_groups:
+            messagebox.showinfo("提示", "没有完全重复的命令", parent=self.window)
+            return
+        if not messagebox.askyesno("确认", f"确定要合并 {len(self.exact_groups)} 组完全重复的命令吗？",
+                                   parent=self.window):
+            return
+        self.merge(self.exact_groups)
+        self.refresh()
+
+    def merge_selected(self):
+        """合并选中的组（选中组内的命令也算选中该组）"""
+        groups = []
+        for item in self.tree.selection():
+            group = item if item in self.groups else self.tree.parent(item)
+            if group in self.groups and self.groups[group] not in groups:
+                groups.append(self.groups[group])
+        if not groups:
+            messagebox.showwarning("警告", "请选择要合并的组", parent=self.window)
+            return
+        if not messagebox.askyesno("确认", f"确定要把选中的 {len(groups)} 组命令各自合并为一条吗？",
+                                   parent=self.window):
+            return
+        self.merge(groups)
+        self.refresh()
+
+
+class HistoryWindow:
+    """命令或笔记的历史版本：查看任意版本的内容或与上一版本的差异，并恢复"""
+
+    LABELS = {'name': '名称', 'title': '标题', 'category_id': '分类', 'category': '分类',
+              'tags': '标签', 'description': '描述'}
+
+    def __init__(self, parent, conn, table, row_id, categories, restore):
+        self.conn = conn
+        self.table = table
+        self.row_id = row_id
+        self.category_names = dict(categories)
+        self.restore = restore
+
+        self.window = tk.Toplevel(parent)
+        self.window.title("历史版本")
+        self.window.geometry("900x550")
+
+        toolbar = ttk.Frame(self.window, padding=(10, 10, 10, 0))
+        toolbar.pack(fill=tk.X)
+        self.show_diff = tk.BooleanVar(value=False)
+        ttk.Checkbutton(toolbar, text="显示与上一版本的差异", variable=self.show_diff,
+                        command=self.show_selected).pack(side=tk.LEFT)
+        ttk.Button(toolbar, text="恢复此版本", command=self.restore_selected).pack(side=tk.RIGHT, padx=5)
+
+        paned = ttk.PanedWindow(self.window, orient=tk.HORIZONTAL)
+        paned.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+
+        columns = ('版本', '保存时间', '大小')
+        self.tree = ttk.Treeview(paned, columns=columns, show='headings', selectmode='browse')
+        for col in columns:
+            self.tree.heading(col, text=col)
+        self.tree.column('版本', width=50, anchor=tk.E)
+        self.tree.column('保存时间', width=150)
+        self.tree.column('大小', width=100, anchor=tk.E)
+        self.tree.bind('<<TreeviewSelect>>', lambda event: self.show_selected())
+        paned.add(self.tree, weight=1)
+
+        self.text = tk.Text(paned, wrap=tk.WORD)
+        self.text.tag_configure('added', foreground='#1a7f37')
+        self.text.tag_configure('removed', foreground='#cf222e')
+        paned.add(self.text, weight=3)
+
+        self.refresh()
+
+    def refresh(self):
+        self.tree.delete(*self.tree.get_children())
+        for version, created_at, size, stored in history.list_versions(self.conn, self.table, self.row_id):
+            self.tree.insert('', tk.END, iid=str(version),
+                             values=(version, created_at, f"{size} / {stored} 字节"))
+        children = self.tree.get_children()
+        if children:
+            self.tree.selection_set(children[0])
+        else:
+            self.text.delete(1.0, tk.END)
+            self.text.insert(1.0, "还没有历史版本（编辑保存后开始记录）")
+
+    def format_version(self, data):
+        """把版本内容格式化为文本：属性在前，命令或笔记内容在后"""
+        body_field = 'command' if self.table == 'commands' else 'content'
+        lines = []
+        for field in history.HISTORY_FIELDS[self.table]:
+            if field == body_field:
+                continue
+            value = data.get(field)
+            if field == 'category_id':
+                value = self.category_names.get(value, value)
+            lines.append(f"{self.LABELS[field]}: {value if value is not None else ''}\n")
+        return ''.join(lines) + '\n' + (data.get(body_field) or '')
+
+    def show_selected(self):
+        selection = self.tree.selection()
+        if not selection:
+            return
+        version = int(selection[0])
+        cursor = self.conn.cursor()
+        text = self.format_version(history.get_version(cursor, self.table, self.row_id, version))
+
+        self.text.delete(1.0, tk.END)
+        if not self.show_diff.get() or version == 1:
+            self.text.insert(1.0, text)
+            return
+        previous = self.format_version(history.get_version(cursor, self.table, self.row_id, version - 1))
+        for line in difflib.unified_diff(previous.splitlines(True), text.splitlines(True),
+                                         f"版本 {version - 1}", f"版本 {version}"):
+            if not line.endswith('\n'):
+                line += '\n'
+            tag = 'added' if line.startswith('+') else 'removed' if line.startswith('-') else ''
+            self.text.insert(tk.END, line, tag)
+
+    def restore_selected(self):
+        selection = self.tree.selection()
+        if not selection:
+            return
+        version = int(selection[0])
+        if not messagebox.askyesno("确认", f"确定要恢复到版本 {version} 吗？", parent=self.window):
+            return
+        if self.restore(self.table, self.row_id, version):
+            self.refresh()
+
+
+class HistoryCandidatesDialog:
+    """Shell历史中的候选命令（按使用次数和时间排序），选择后添加到命令库或忽略"""
+    MAX_ROWS = 500
+
+    def __init__(self, parent, conn, add):
+        self.conn = conn
+        self.add = add
+
+        self.window = tk.Toplevel(parent)
+        self.window.title("Shell历史候选命令")
+        self.window.geometry("900x500")
+
+        toolbar = ttk.Frame(self.window, padding=(10, 10, 10, 0))
+        toolbar.pack(fill=tk.X)
+        self.summary_var = tk.StringVar()
+        ttk.Label(toolbar, textvariable=self.summary_var).pack(side=tk.LEFT)
+        ttk.Button(toolbar, text="忽略选中", command=self.ignore_selected).pack(side=tk.RIGHT, padx=5)
+        ttk.Button(toolbar, text="添加选中", command=self.add_selected).pack(side=tk.RIGHT, padx=5)
+
+        list_frame = ttk.Frame(self.window, padding=10)
+        list_frame.pack(fill=tk.BOTH, expand=True)
+
+        columns = ('次数', '最后使用', '命令')
+        self.tree = ttk.Treeview(list_frame, columns=columns, show='headings')
+        for col in columns:
+            self.tree.heading(col, text=col)
+        self.tree.column('次数', width=60, anchor=tk.E)
+        self.tree.column('最后使用', width=140)
+        self.tree.column('命令', width=650)
+
+        scrollbar = ttk.Scrollbar(list_frame, orient=tk.VERTICAL, command=self.tree.yview)
+        self.tree.configure(yscrollcommand=scrollbar.set)
+        self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+
+        self.refresh()
+
+    def refresh(self):
+        self.tree.delete(*self.tree.get_children())
+        rows = shell_history.list_candidates(self.conn, self.MAX_ROWS)
+        for content_hash, command, count, last_seen in rows:
+            last_used = datetime.fromtimestamp(last_seen).strftime('%Y-%m-%d %H:%M') if last_seen else ''
+            self.tree.insert('', tk.END, iid=content_hash,
+                             values=(count, last_used, database.make_command_preview(command)))
+        self.summary_var.set(f"{len(rows)} 个候选命令（已保存的命令不会出现在这里）")
+
+    def add_selected(self):
+        selection = list(self.tree.selection())
+        if not selection:
+            messagebox.showwarning("警告", "请选择要添加的命令", parent=self.window)
+            return
+        self.add(selection)
+        self.refresh()
+
+    def ignore_selected(self):
+        selection = list(self.tree.selection())
+        if not selection:
+            return
+        shell_history.set_status(self.conn.cursor(), selection, shell_history.CANDIDATE_IGNORED)
+        self.conn.commit()
+        self.refresh()
+
+
 class CommandDialog:
     """命令编辑对话框"""
-    def __init__(self, parent, title, categories, default_data=None):
+    def __init__(self, parent, title, categories, default_data=None, tags=(), find_duplicates=None):
         self.result = None
         self.categories = categories  # 保存分类数据
+        # find_duplicates(命令内容) 返回内容相同的已有命令 [(id, 名称)]
+        self.find_duplicates = find_duplicates
+        self.original_command = default_data[2] if default_data else None
 
         self.dialog = tk.Toplevel(parent)
         self.dialog.title(title)
@@ -1166,10 +2520,16 @@ class CommandDialog:
         self.category_combo['values'] = [''] + [cat[1] for cat in categories]
         self.category_combo.grid(row=2, column=1, sticky=tk.EW, pady=8, padx=(10, 0))
 
+        # 标签（空格或逗号分隔）
+        ttk.Label(frame, text="标签:").grid(row=3, column=0, sticky=tk.W, pady=8)
+        self.tags_entry = ttk.Entry(frame, width=50)
+        self.tags_entry.insert(0, ' '.join(tags))
+        self.tags_entry.grid(row=3, column=1, sticky=tk.EW, pady=8, padx=(10, 0))
+
         # 描述
-        ttk.Label(frame, text="描述:").grid(row=3, column=0, sticky=tk.NW, pady=8)
+        ttk.Label(frame, text="描述:").grid(row=4, column=0, sticky=tk.NW, pady=8)
         desc_frame = ttk.Frame(frame)
-        desc_frame.grid(row=3, column=1, sticky=tk.EW, pady=8, padx=(10, 0))
+        desc_frame.grid(row=4, column=1, sticky=tk.EW, pady=8, padx=(10, 0))
 
         self.desc_text = tk.Text(desc_frame, width=50, height=6, wrap=tk.WORD)
         desc_scrollbar = ttk.Scrollbar(desc_frame, orient="vertical", command=self.desc_text.yview)
@@ -1180,7 +2540,7 @@ class CommandDialog:
 
         # 按钮
         button_frame = ttk.Frame(frame)
-        button_frame.grid(row=4, column=0, columnspan=2, pady=25)
+        button_frame.grid(row=5, column=0, columnspan=2, pady=25)
 
         ttk.Button(button_frame, text="确定", command=self.ok_clicked, width=15).pack(side=tk.LEFT, padx=10)
         ttk.Button(button_frame, text="取消", command=self.cancel_clicked, width=15).pack(side=tk.LEFT, padx=10)
@@ -1217,6 +2577,14 @@ class CommandDialog:
             messagebox.showerror("错误", "命令名称和命令内容不能为空")
             return
 
+        # 命令内容有变化时检查是否与已有命令重复
+        if self.find_duplicates and (self.original_command is None or database.normalize_command(command)
+                                     != database.normalize_command(self.original_command)):
+            duplicates = self.find_duplicates(command)
+            if duplicates and not messagebox.askyesno(
+                    "重复命令", f"已存在相同的命令“{duplicates[0][1]}”，仍然保存吗？", parent=self.dialog):
+                return
+
         # 获取分类ID
         category_id = None
         if category:
@@ -1226,7 +2594,7 @@ class CommandDialog:
                     category_id = cat_id
                     break
 
-        self.result = (name, command, category_id, description)
+        self.result = (name, command, category_id, description, tagging.parse_tags(self.tags_entry.get()))
         self.dialog.destroy()
 
     def cancel_clicked(self):
@@ -1324,9 +2692,107 @@ class HostDialog:
         self.dialog.destroy()
 
 
+class TemplateDialog:
+    """填写命令模板的参数，返回生成的命令；也可以按CSV参数表批量生成"""
+
+    def __init__(self, parent, name, template):
+        self.result = None
+        self.template = template
+        self.inputs = {}
+
+        self.dialog = tk.Toplevel(parent)
+        self.dialog.title(f"填写参数 - {name}")
+        self.dialog.geometry("600x400")
+        self.dialog.transient(parent)
+        self.dialog.grab_set()
+
+        frame = ttk.Frame(self.dialog, padding="20")
+        frame.pack(fill=tk.BOTH, expand=True)
+
+        for row, field in enumerate(template.fields):
+            label = field.name if field.type == 'str' else f"{field.name} ({field.type})"
+            ttk.Label(frame, text=f"{label}:").grid(row=row, column=0, sticky=tk.W, pady=5)
+            if field.choices:
+                widget = ttk.Combobox(frame, values=field.choices, state="readonly", width=47)
+                widget.set(field.default or field.choices[0])
+                widget.bind('<<ComboboxSelected>>', lambda event: self.update_preview())
+            else:
+                widget = ttk.Entry(frame, width=50)
+                widget.insert(0, field.default or '')
+                widget.bind('<KeyRelease>', lambda event: self.update_preview())
+            widget.grid(row=row, column=1, sticky=tk.EW, pady=5, padx=(10, 0))
+            self.inputs[field.name] = widget
+
+        preview_row = len(template.fields)
+        ttk.Label(frame, text="预览:").grid(row=preview_row, column=0, sticky=tk.NW, pady=8)
+        self.preview = tk.Text(frame, height=6, wrap=tk.WORD, state=tk.DISABLED)
+        self.preview.grid(row=preview_row, column=1, sticky=tk.NSEW, pady=8, padx=(10, 0))
+
+        button_frame = ttk.Frame(frame)
+        button_frame.grid(row=preview_row + 1, column=0, columnspan=2, pady=15)
+        ttk.Button(button_frame, text="复制", command=self.ok_clicked, width=12).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="从CSV批量生成...", command=self.render_csv).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="取消", command=self.dialog.destroy, width=12).pack(side=tk.LEFT, padx=5)
+
+        frame.columnconfigure(1, weight=1)
+        frame.rowconfigure(preview_row, weight=1)
+        self.update_preview()
+
+        first = self.inputs[template.fields[0].name]
+        first.focus_set()
+        self.dialog.bind('<Return>', lambda event: self.ok_clicked())
+        self.dialog.bind('<Escape>', lambda event: self.dialog.destroy())
+
+        self.dialog.wait_window()
+
+    def values(self):
+        return {name: widget.get() for name, widget in self.inputs.items()}
+
+    def update_preview(self):
+        self.preview.configure(state=tk.NORMAL)
+        self.preview.delete(1.0, tk.END)
+        self.preview.insert(1.0, self.template.render(self.values(), validate=False))
+        self.preview.configure(state=tk.DISABLED)
+
+    def ok_clicked(self):
+        try:
+            self.result = self.template.render(self.values())
+        except templates.TemplateError as e:
+            messagebox.showerror("错误", str(e), parent=self.dialog)
+            return
+        self.dialog.destroy()
+
+    def render_csv(self):
+        """按CSV参数表（第一行为参数名，缺少的列使用上面填写的值）批量生成命令并保存到文件"""
+        csv_path = filedialog.askopenfilename(parent=self.dialog, title="选择参数表",
+                                              filetypes=[("CSV文件", "*.csv"), ("所有文件", "*.*")])
+        if not csv_path:
+            return
+        try:
+            rows = templates.read_csv(csv_path)
+            defaults = self.values()
+            commands = list(self.template.render_rows({**defaults, **row} for row in rows))
+        except (OSError, UnicodeDecodeError, csv.Error, templates.TemplateError) as e:
+            messagebox.showerror("错误", f"批量生成失败: {e}", parent=self.dialog)
+            return
+
+        output = filedialog.asksaveasfilename(parent=self.dialog, title="保存生成的命令",
+                                              defaultextension=".sh",
+                                              filetypes=[("Shell脚本", "*.sh"), ("文本文件", "*.txt")])
+        if not output:
+            return
+        try:
+            with open(output, 'w', encoding='utf-8') as f:
+                f.write('\n'.join(commands) + '\n')
+        except OSError as e:
+            messagebox.showerror("错误", f"保存失败: {e}", parent=self.dialog)
+            return
+        messagebox.showinfo("成功", f"已生成 {len(commands)} 条命令:\n{output}", parent=self.dialog)
+
+
 class NoteDialog:
     """笔记编辑对话框"""
-    def __init__(self, parent, title, default_data=None):
+    def __init__(self, parent, title, default_data=None, categories=(), tags=()):
         self.result = None
 
         self.dialog = tk.Toplevel(parent)
@@ -1351,28 +2817,35 @@ class NoteDialog:
 
         # 分类
         ttk.Label(frame, text="分类:").grid(row=1, column=0, sticky=tk.W, pady=5)
-        self.category_entry = ttk.Entry(frame, width=50)
+        # 可以从已有分类中选择，也可以输入新分类
+        self.category_entry = ttk.Combobox(frame, width=48, values=list(categories))
         self.category_entry.grid(row=1, column=1, sticky=tk.EW, pady=5)
 
+        # 标签（空格或逗号分隔）
+        ttk.Label(frame, text="标签:").grid(row=2, column=0, sticky=tk.W, pady=5)
+        self.tags_entry = ttk.Entry(frame, width=50)
+        self.tags_entry.insert(0, ' '.join(tags))
+        self.tags_entry.grid(row=2, column=1, sticky=tk.EW, pady=5)
+
         # 内容
-        ttk.Label(frame, text="内容:").grid(row=2, column=0, sticky=tk.NW, pady=5)
+        ttk.Label(frame, text="内容:").grid(row=3, column=0, sticky=tk.NW, pady=5)
         self.content_text = tk.Text(frame, width=50, height=20)
-        self.content_text.grid(row=2, column=1, sticky=tk.NSEW, pady=5)
+        self.content_text.grid(row=3, column=1, sticky=tk.NSEW, pady=5)
 
         # 滚动条
         scrollbar = ttk.Scrollbar(frame, orient=tk.VERTICAL, command=self.content_text.yview)
         self.content_text.configure(yscrollcommand=scrollbar.set)
-        scrollbar.grid(row=2, column=2, sticky=tk.NS, pady=5)
+        scrollbar.grid(row=3, column=2, sticky=tk.NS, pady=5)
 
         # 按钮
         button_frame = ttk.Frame(frame)
-        button_frame.grid(row=3, column=0, columnspan=2, pady=20)
+        button_frame.grid(row=4, column=0, columnspan=2, pady=20)
 
         ttk.Button(button_frame, text="确定", command=self.ok_clicked).pack(side=tk.LEFT, padx=5)
         ttk.Button(button_frame, text="取消", command=self.cancel_clicked).pack(side=tk.LEFT, padx=5)
 
         frame.columnconfigure(1, weight=1)
-        frame.rowconfigure(2, weight=1)
+        frame.rowconfigure(3, weight=1)
 
         # 设置默认值
         if default_data:
@@ -1391,7 +2864,7 @@ class NoteDialog:
             messagebox.showerror("错误", "标题不能为空")
             return
 
-        self.result = (title, content, category)
+        self.result = (title, content, category, tagging.parse_tags(self.tags_entry.get()))
         self.dialog.destroy()
 
     def cancel_clicked(self):
@@ -0,0 +1,486 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+数据库访问
+数据库结构初始化与升级，以及图形界面和命令行共用的查询
+（本模块不依赖tkinter）
+"""
+
+import hashlib
+import os
+import sqlite3
+
+import history
+import maintenance
+import shell_history
+import tags as tagging
+from change_feed import ChangeFeed
+from journal import OperationJournal
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data')
+DB_PATH = os.path.join(DATA_DIR, 'command_manager.db')
+
+# 数据库结构版本（保存在 PRAGMA user_version 中），每次升级结构时加一
+SCHEMA_VERSION = 11
+
+# 命令列表中命令预览的最大长度
+PREVIEW_LENGTH = 80
+
+# 命令列表的默认排序：收藏优先，其次按使用频率和最近使用时间
+COMMAND_ORDER = 'c.is_favorite DESC, c.frecency DESC, c.name'
+
+# 命令列表行：(id, 名称, 预览, 分类名, 是否收藏)
+COMMAND_LIST_QUERY = '''
+    SELECT c.id, c.name, c.command_preview, cat.name, c.is_favorite
+    FROM commands c
+    LEFT JOIN categories cat ON c.category_id = cat.id
+'''
+
+DEFAULT_CATEGORIES = [
+    ('系统命令', '系统管理相关命令'),
+    ('网络命令', '网络诊断和配置命令'),
+    ('开发工具', '开发和编译相关命令'),
+    ('数据库', '数据库操作命令'),
+    ('其他', '其他类别命令')
+]
+
+
+def connect(db_path=DB_PATH, readonly=False, factory=sqlite3.Connection):
+    """打开数据库连接
+
+    只读模式下不会创建或升级数据库；如果数据库结构版本过旧，
+    先以读写方式升级一次再重新以只读方式打开。
+    factory 为连接类（例如统计耗时的 instrumentation.InstrumentedConnection）。
+    """
+    if readonly:
+        if not os.path.exists(db_path):
+            raise FileNotFoundError(f"数据库文件不存在: {db_path}")
+        conn = sqlite3.connect(f'file:{db_path}?mode=ro', uri=True, factory=factory)
+        if conn.execute('PRAGMA user_version').fetchone()[0] >= SCHEMA_VERSION:
+            return conn
+        conn.close()
+        init_database(connect(db_path)).close()
+        return sqlite3.connect(f'file:{db_path}?mode=ro', uri=True, factory=factory)
+
+    os.makedirs(os.path.dirname(db_path), exist_ok=True)
+    return sqlite3.connect(db_path, factory=factory)
+
+
+def init_database(conn):
+    """创建数据表、升级旧版本结构并插入默认分类，返回连接本身"""
+    # 只有建表时用到的模块在这里导入，只读的命令行查询不需要加载
+    import attachments
+    import sync
+
+    cursor = conn.cursor()
+
+    # 删除数据后可以增量回收空闲页（只对新数据库立即生效，已有数据库在完整整理时转换）
+    cursor.execute('PRAGMA auto_vacuum = INCREMENTAL')
+
+    # 创建分类表
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS categories (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT UNIQUE NOT NULL,
+            description TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # 创建命令表
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS commands (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            command TEXT NOT NULL,
+            category_id INTEGER,
+            description TEXT,
+            is_favorite INTEGER DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (category_id) REFERENCES categories (id)
+        )
+    ''')
+
+    # 创建笔记表
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS notes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT NOT NULL,
+            content TEXT,
+            category TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # 创建笔记分类表（与命令分类相互独立）
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS note_categories (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT UNIQUE NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # 创建命令使用日志表（只追加）
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS usage_log (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            command_id INTEGER NOT NULL,
+            action TEXT NOT NULL,
+            used_at REAL NOT NULL,
+            FOREIGN KEY (command_id) REFERENCES commands (id)
+        )
+    ''')
+
+    OperationJournal.create_table(cursor)
+
+    migrate_database(cursor)
+    tagging.create_tables(cursor)
+    ChangeFeed.create_tables(cursor)
+    sync.create_tables(cursor)
+    maintenance.create_tables(cursor)
+    history.create_tables(cursor)
+    shell_history.create_tables(cursor)
+    attachments.create_tables(cursor)
+
+    # 插入默认分类
+    for cat in DEFAULT_CATEGORIES:
+        cursor.execute('INSERT OR IGNORE INTO categories (name, description) VALUES (?, ?)', cat)
+
+    cursor.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+    conn.commit()
+    return conn
+
+
+def migrate_database(cursor):
+    """升级旧版本数据库结构"""
+    cursor.execute('PRAGMA table_info(commands)')
+    command_columns = {row[1] for row in cursor.fetchall()}
+
+    # 命令使用统计列
+    if 'use_count' not in command_columns:
+        cursor.execute('ALTER TABLE commands ADD COLUMN use_count INTEGER DEFAULT 0')
+    if 'last_used_at' not in command_columns:
+        cursor.execute('ALTER TABLE commands ADD COLUMN last_used_at REAL')
+    if 'frecency' not in command_columns:
+        cursor.execute('ALTER TABLE commands ADD COLUMN frecency REAL DEFAULT 0')
+
+    # 预先计算的单行命令预览
+    if 'command_preview' not in command_columns:
+        cursor.execute('ALTER TABLE commands ADD COLUMN command_preview TEXT')
+    cursor.execute('SELECT id, command FROM commands WHERE command_preview IS NULL')
+    cursor.executemany('UPDATE commands SET command_preview = ? WHERE id = ?',
+                       [(make_command_preview(command), command_id)
+                        for command_id, command in cursor.fetchall()])
+
+    # 去掉空白差异后的命令内容哈希，用于查找重复命令
+    if 'content_hash' not in command_columns:
+        cursor.execute('ALTER TABLE commands ADD COLUMN content_hash TEXT')
+    cursor.execute('SELECT id, command FROM commands WHERE content_hash IS NULL')
+    cursor.executemany('UPDATE commands SET content_hash = ? WHERE id = ?',
+                       [(make_content_hash(command), command_id)
+                        for command_id, command in cursor.fetchall()])
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_commands_content_hash ON commands (content_hash)')
+
+    # 导出到shell时使用的别名，设置了别名的命令才导出
+    if 'alias_name' not in command_columns:
+        cursor.execute('ALTER TABLE commands ADD COLUMN alias_name TEXT')
+    cursor.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_commands_alias
+        ON commands (alias_name) WHERE alias_name IS NOT NULL
+    ''')
+
+    # 默认排序使用的索引
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_commands_rank
+        ON commands (is_favorite DESC, frecency DESC, name)
+    ''')
+
+    migrate_note_categories(cursor)
+
+
+def migrate_note_categories(cursor):
+    """笔记分类规范化到 note_categories 表，notes.category_id 由触发器根据 category 列维护
+
+    category 文本列继续保留（同步、撤销日志和旧版本程序都使用它），
+    任何程序写入 category 后触发器都会自动更新 category_id。
+    """
+    cursor.execute('PRAGMA table_info(notes)')
+    if 'category_id' not in {row[1] for row in cursor.fetchall()}:
+        cursor.execute('ALTER TABLE notes ADD COLUMN category_id INTEGER REFERENCES note_categories (id)')
+        cursor.execute('''
+            INSERT OR IGNORE INTO note_categories (name)
+            SELECT DISTINCT trim(category) FROM notes WHERE trim(category) <> ''
+        ''')
+        cursor.execute('''
+            UPDATE notes SET category_id = (SELECT id FROM note_categories WHERE name = trim(notes.category))
+            WHERE trim(category) <> ''
+        ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_notes_category ON notes (category_id, created_at DESC)')
+
+    resolve = '''
+        INSERT OR IGNORE INTO note_categories (name)
+        SELECT trim(NEW.category) WHERE trim(NEW.category) <> '';
+        UPDATE notes SET category_id = (SELECT id FROM note_categories WHERE name = trim(NEW.category))
+        WHERE id = NEW.id;
+    '''
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_notes_category_insert
+        AFTER INSERT ON notes
+        WHEN trim(NEW.category) <> ''
+        BEGIN {resolve} END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_notes_category_update
+        AFTER UPDATE OF category ON notes
+        BEGIN {resolve} END
+    ''')
+
+
+def make_command_preview(command_text):
+    """把命令格式化为单行预览（合并换行和多余空格，截断过长命令）"""
+    preview = ' '.join((command_text or '').split())
+    if len(preview) > PREVIEW_LENGTH:
+        preview = preview[:PREVIEW_LENGTH - 3] + "..."
+    return preview
+
+
+def normalize_command(command_text):
+    """合并命令中的空白（换行、缩进、多余空格），用于判断两个命令是否重复"""
+    return ' '.join((command_text or '').split())
+
+
+def make_content_hash(command_text):
+    """命令内容哈希：只有空白不同的命令哈希相同"""
+    return hashlib.sha1(normalize_command(command_text).encode('utf-8')).hexdigest()
+
+
+def find_duplicate_commands(conn, command_text, exclude_id=None):
+    """查找与给定命令内容相同（忽略空白差异）的命令，返回 [(id, 名称)]"""
+    cursor = conn.execute('SELECT id, name FROM commands WHERE content_hash = ? AND id IS NOT ? ORDER BY id',
+                          (make_content_hash(command_text), exclude_id))
+    return cursor.fetchall()
+
+
+def get_category_id(cursor, name, create=False):
+    """根据分类名获取分类ID，create为True时自动创建不存在的分类"""
+    if not name:
+        return None
+    cursor.execute('SELECT id FROM categories WHERE name = ?', (name,))
+    row = cursor.fetchone()
+    if row:
+        return row[0]
+    if not create:
+        return None
+    cursor.execute('INSERT INTO categories (name, description) VALUES (?, ?)', (name, ''))
+    return cursor.lastrowid
+
+
+def insert_command(cursor, name, command, category_id=None, description='', is_favorite=0, tags=None):
+    """插入一条命令（不提交事务），返回新命令ID"""
+    tags = tagging.parse_tags(tags)
+    tagging.ensure_tags(cursor, tags)
+    cursor.execute('''
+        INSERT INTO commands (name, command, category_id, description, is_favorite, command_preview,
+                              content_hash, tags)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ''', (name, command, category_id, description, 1 if is_favorite else 0,
+          make_command_preview(command), make_content_hash(command), tagging.format_tags(tags)))
+    return cursor.lastrowid
+
+
+def update_command(cursor, command_id, name, command, category_id, description, tags=None):
+    """更新一条命令（不提交事务），tags 为 None 时不修改标签，修改前后的内容保存到版本历史"""
+    tag_assignment, tag_params = prepare_tags(cursor, tags)
+    history.record_version(cursor, 'commands', command_id)
+    cursor.execute(f'''
+        UPDATE commands SET name = ?, command = ?, category_id = ?,
+        description = ?, command_preview = ?, content_hash = ?, updated_at = CURRENT_TIMESTAMP{tag_assignment}
+        WHERE id = ?
+    ''', (name, command, category_id, description, make_command_preview(command),
+          make_content_hash(command)) + tag_params + (command_id,))
+    history.record_version(cursor, 'commands', command_id)
+
+
+def set_alias(cursor, command_id, alias_name):
+    """设置命令导出到shell的别名（不提交事务），空别名表示不导出；别名无效或已被使用时抛出 ValueError"""
+    import shell_export
+
+    alias_name = shell_export.validate_alias(alias_name)
+    if alias_name:
+        cursor.execute('SELECT id, name FROM commands WHERE alias_name = ? AND id <> ?', (alias_name, command_id))
+        row = cursor.fetchone()
+        if row:
+            raise ValueError(f"别名 {alias_name} 已被命令 {row[0]}（{row[1]}）使用")
+    cursor.execute('UPDATE commands SET alias_name = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?',
+                   (alias_name, command_id))
+
+
+def prepare_tags(cursor, tags):
+    """为更新语句准备标签赋值和参数（tags 为 None 时不修改标签），并确保标签名已存在"""
+    if tags is None:
+        return '', ()
+    tags = tagging.parse_tags(tags)
+    tagging.ensure_tags(cursor, tags)
+    return ', tags = ?', (tagging.format_tags(tags),)
+
+
+def set_tags(cursor, table, row_id, tags):
+    """设置命令或笔记的标签（不提交事务）"""
+    tags = tagging.parse_tags(tags)
+    tagging.ensure_tags(cursor, tags)
+    cursor.execute(f'UPDATE {table} SET tags = ? WHERE id = ?', (tagging.format_tags(tags), row_id))
+
+
+def get_tags(conn, table, row_id):
+    """命令或笔记的标签列表"""
+    row = conn.execute(f'SELECT tags FROM {table} WHERE id = ?', (row_id,)).fetchone()
+    return (row[0] or '').split() if row else []
+
+
+def list_commands(conn, category=None, favorites_only=False, tags=None, match_all=True):
+    """按默认排序列出命令，返回命令列表行
+
+    tags 为标签列表，match_all 为 True 时只列出包含全部标签的命令，否则包含任意一个即可。
+    """
+    query = COMMAND_LIST_QUERY
+    params = []
+
+    conditions = []
+    if favorites_only:
+        conditions.append('c.is_favorite = 1')
+    if tags:
+        condition, tag_params = tagging.tag_filter_sql('commands', tagging.parse_tags(tags), match_all, 'c.id')
+        conditions.append(condition)
+        params.extend(tag_params)
+    if category:
+        conditions.append('cat.name = ?')
+        params.append(category)
+
+    if conditions:
+        query += ' WHERE ' + ' AND '.join(conditions)
+    query += f' ORDER BY {COMMAND_ORDER}'
+
+    return conn.execute(query, params).fetchall()
+
+
+def search_commands(conn, term, limit=None):
+    """按名称、命令内容和描述做子串搜索，返回命令列表行"""
+    pattern = f'%{term}%'
+    query = COMMAND_LIST_QUERY + f'''
+        WHERE c.name LIKE ? OR c.command LIKE ? OR c.description LIKE ?
+        ORDER BY {COMMAND_ORDER}
+    '''
+    params = [pattern, pattern, pattern]
+    if limit:
+        query += ' LIMIT ?'
+        params.append(limit)
+    return conn.execute(query, params).fetchall()
+
+
+def get_commands_by_ids(conn, command_ids):
+    """按给定ID顺序返回命令列表行（不存在的ID被忽略）"""
+    command_ids = list(command_ids)
+    if not command_ids:
+        return []
+    placeholders = ','.join('?' * len(command_ids))
+    cursor = conn.execute(COMMAND_LIST_QUERY + f' WHERE c.id IN ({placeholders})', command_ids)
+    rows = {row[0]: row for row in cursor.fetchall()}
+    return [rows[command_id] for command_id in command_ids if command_id in rows]
+
+
+def get_command(conn, key):
+    """按ID或名称获取完整命令，返回 (id, 名称, 命令, 分类名, 描述, 是否收藏) 或 None"""
+    query = '''
+        SELECT c.id, c.name, c.command, cat.name, c.description, c.is_favorite
+        FROM commands c
+        LEFT JOIN categories cat ON c.category_id = cat.id
+    '''
+    if str(key).isdigit():
+        row = conn.execute(query + ' WHERE c.id = ?', (int(key),)).fetchone()
+        if row:
+            return row
+    return conn.execute(query + f' WHERE c.name = ? ORDER BY {COMMAND_ORDER} LIMIT 1',
+                        (str(key),)).fetchone()
+
+
+def list_categories(conn):
+    """列出分类，返回 (id, 名称, 描述, 创建时间)"""
+    return conn.execute('SELECT id, name, description, created_at FROM categories ORDER BY name').fetchall()
+
+
+def insert_note(cursor, title, content, category, tags=None):
+    """插入一条笔记（不提交事务），返回新笔记ID"""
+    tags = tagging.parse_tags(tags)
+    tagging.ensure_tags(cursor, tags)
+    cursor.execute('''
+        INSERT INTO notes (title, content, category, tags)
+        VALUES (?, ?, ?, ?)
+    ''', (title, content, category, tagging.format_tags(tags)))
+    return cursor.lastrowid
+
+
+def update_note(cursor, note_id, title, content, category, tags=None):
+    """更新一条笔记（不提交事务），tags 为 None 时不修改标签，修改前后的内容保存到版本历史"""
+    tag_assignment, tag_params = prepare_tags(cursor, tags)
+    history.record_version(cursor, 'notes', note_id)
+    cursor.execute(f'''
+        UPDATE notes SET title = ?, content = ?, category = ?,
+        updated_at = CURRENT_TIMESTAMP{tag_assignment} WHERE id = ?
+    ''', (title, content, category) + tag_params + (note_id,))
+    history.record_version(cursor, 'notes', note_id)
+
+
+def restore_version(cursor, table, row_id, version):
+    """把命令或笔记恢复为历史版本的内容（不提交事务，恢复本身也成为一个新版本），成功返回True"""
+    data = history.get_version(cursor, table, row_id, version)
+    if data is None:
+        return False
+    tags = data['tags'] or ''
+    if table == 'commands':
+        category_id = data['category_id']
+        if category_id is not None:
+            cursor.execute('SELECT 1 FROM categories WHERE id = ?', (category_id,))
+            if not cursor.fetchone():
+                category_id = None
+        update_command(cursor, row_id, data['name'], data['command'], category_id, data['description'], tags)
+    else:
+        update_note(cursor, row_id, data['title'], data['content'], data['category'], tags)
+    return True
+
+
+def list_note_categories(conn):
+    """列出至少有一条笔记使用的笔记分类名"""
+    cursor = conn.execute('''
+        SELECT name FROM note_categories nc
+        WHERE EXISTS (SELECT 1 FROM notes WHERE category_id = nc.id)
+        ORDER BY name
+    ''')
+    return [row[0] for row in cursor.fetchall()]
+
+
+def list_notes(conn, category=None, tags=None, match_all=True):
+    """按创建时间倒序列出笔记，返回 (id, 标题, 分类, 创建时间, 更新时间)"""
+    query = 'SELECT id, title, category, created_at, updated_at FROM notes'
+    params = []
+    conditions = []
+    if category:
+        # 按分类ID等值查询，使用 idx_notes_category 索引
+        conditions.append('category_id = (SELECT id FROM note_categories WHERE name = ?)')
+        params.append(category.strip())
+    if tags:
+        condition, tag_params = tagging.tag_filter_sql('notes', tagging.parse_tags(tags), match_all)
+        conditions.append(condition)
+        params.extend(tag_params)
+    if conditions:
+        query += ' WHERE ' + ' AND '.join(conditions)
+    query += ' ORDER BY created_at DESC'
+    return conn.execute(query, params).fetchall()
+
+
+def get_note(conn, note_id):
+    """获取完整笔记，返回 (id, 标题, 内容, 分类, 创建时间, 更新时间) 或 None"""
+    return conn.execute('SELECT id, title, content, category, created_at, updated_at FROM notes WHERE id = ?',
+                        (note_id,)).fetchone()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+重复命令
+commands.content_hash 是去掉空白差异后的命令内容哈希（带索引），
+添加和导入时用它判断命令是否已经存在；本模块负责列出和合并重复命令，
+以及按更宽松的规则（忽略大小写、引号和运算符两侧空格）聚类近似重复的命令
+（本模块不依赖tkinter）
+"""
+
+import hashlib
+import re
+
+import database
+
+# 运算符和重定向两侧的空格不影响命令含义
+OPERATOR_SPACING = re.compile(r'\s*(\|\||&&|[|;<>=,])\s*')
+
+
+def near_duplicate_key(command_text):
+    """近似重复的比较键：在合并空白的基础上忽略大小写、引号种类、运算符两侧空格和结尾分号"""
+    text = database.normalize_command(command_text).casefold().replace("'", '"')
+    text = OPERATOR_SPACING.sub(r'\1', text).rstrip(';')
+    return hashlib.sha1(text.encode('utf-8')).digest()
+
+
+def duplicate_groups(conn):
+    """内容相同（忽略空白差异）的命令分组，返回 [[命令ID, ...]]，组内按ID升序"""
+    cursor = conn.execute('''
+        SELECT content_hash FROM commands
+        WHERE content_hash IS NOT NULL
+        GROUP BY content_hash HAVING COUNT(*) > 1
+    ''')
+    hashes = [row[0] for row in cursor.fetchall()]
+    groups = {}
+    for start in range(0, len(hashes), 500):
+        chunk = hashes[start:start + 500]
+        placeholders = ','.join('?' * len(chunk))
+        cursor = conn.execute(f'SELECT content_hash, id FROM commands WHERE content_hash IN ({placeholders})'
+                              ' ORDER BY id', chunk)
+        for content_hash, command_id in cursor.fetchall():
+            groups.setdefault(content_hash, []).append(command_id)
+    return list(groups.values())
+
+
+def near_duplicate_clusters(conn):
+    """近似重复的命令聚类，返回 [[(id, 名称, 预览, 内容哈希), ...]]，按组大小倒序
+
+    只包含至少有两种不同内容的聚类（完全重复的命令由 duplicate_groups 处理）。
+    """
+    clusters = {}
+    keys = {}  # 内容哈希 -> 比较键，内容相同的命令只计算一次
+    for row in conn.execute('SELECT id, name, command_preview, content_hash, command FROM commands'):
+        key = keys.get(row[3])
+        if key is None:
+            key = keys[row[3]] = near_duplicate_key(row[4])
+        clusters.setdefault(key, []).append(row[:4])
+    result = [rows for rows in clusters.values() if len({row[3] for row in rows}) > 1]
+    result.sort(key=lambda rows: (-len(rows), rows[0][0]))
+    return result
+
+
+def merge_commands(cursor, command_ids):
+    """把一组重复命令合并为一条（不提交事务），返回保留的命令ID
+
+    保留收藏的、使用次数最多的（其次ID最小的）命令；收藏状态、使用统计、
+    使用日志和标签合并到保留的命令上，保留的命令没有描述或分类时沿用其他命令的。
+    """
+    command_ids = list(command_ids)
+    placeholders = ','.join('?' * len(command_ids))
+    cursor.execute(f'''
+        SELECT id, category_id, description, is_favorite, use_count, last_used_at, frecency, tags
+        FROM commands WHERE id IN ({placeholders})
+        ORDER BY is_favorite DESC, use_count DESC, id
+    ''', command_ids)
+    rows = cursor.fetchall()
+    if len(rows) < 2:
+        return rows[0][0] if rows else None
+
+    keep_id = rows[0][0]
+    removed = [row[0] for row in rows[1:]]
+    category_id = next((row[1] for row in rows if row[1]), None)
+    description = next((row[2] for row in rows if row[2]), '')
+    tags = ' '.join(row[7] or '' for row in rows)
+    tag_assignment, tag_params = database.prepare_tags(cursor, tags)
+
+    cursor.execute(f'''
+        UPDATE commands SET category_id = ?, description = ?, is_favorite = ?,
+        use_count = ?, last_used_at = ?, frecency = ?{tag_assignment}
+        WHERE id = ?
+    ''', (category_id, description, max(row[3] or 0 for row in rows),
+          sum(row[4] or 0 for row in rows),
+          max((row[5] for row in rows if row[5] is not None), default=None),
+          sum(row[6] or 0.0 for row in rows)) + tag_params + (keep_id,))
+
+    placeholders = ','.join('?' * len(removed))
+    cursor.execute(f'UPDATE usage_log SET command_id = ? WHERE command_id IN ({placeholders})',
+                   [keep_id] + removed)
+    cursor.execute(f'DELETE FROM commands WHERE id IN ({placeholders})', removed)
+    return keep_id
+
+
+def merge_duplicates(cursor, groups, journal=None):
+    """合并多组重复命令（不提交事务），返回删除的命令ID列表
+
+    指定 journal（OperationJournal）时把合并记录为一个可撤销的操作组：
+    先记录移到保留命令上的使用日志，再记录命令行，撤销时连同使用统计一起恢复。
+    """
+    command_ids = [command_id for group in groups for command_id in group]
+    if journal is not None and command_ids:
+        placeholders = ','.join('?' * len(command_ids))
+        log_before = journal.snapshot('usage_log', f'command_id IN ({placeholders})', command_ids)
+        commands_before = journal.snapshot_ids('commands', command_ids)
+
+    removed = []
+    for group in groups:
+        keep_id = merge_commands(cursor, group)
+        removed.extend(command_id for command_id in group if command_id != keep_id)
+
+    if journal is not None and command_ids:
+        journal.record_changes("合并重复命令", [
+            ('usage_log', log_before, journal.snapshot_ids('usage_log', log_before)),
+            ('commands', commands_before, journal.snapshot_ids('commands', command_ids)),
+        ], restore_usage=True)
+    return removed
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+模糊搜索引擎
+基于三元组（trigram）索引的近似匹配，支持中日韩文字分词，
+用于容忍拼写错误的命令搜索（例如 dokcer -> docker）
+"""
+
+import heapq
+import re
+from array import array
+from collections import Counter
+
+# 拉丁字母/数字词与中日韩文字串
+CJK_RANGES = '\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff'
+TOKEN_PATTERN = re.compile(f'[0-9a-z_]+|[{CJK_RANGES}]+')
+CJK_PATTERN = re.compile(f'[{CJK_RANGES}]')
+
+# 名称命中的权重高于命令内容和描述
+NAME_WEIGHT = 1.0
+BODY_WEIGHT = 0.8
+
+# 词相似度低于该值的候选词不参与匹配
+MIN_TOKEN_SIMILARITY = 0.55
+# 每个查询词最多扩展的相似词数量
+MAX_EXPANSIONS = 30
+
+
+def tokenize(text):
+    """分词：拉丁词按非字母数字切分，中日韩文字拆为单字和双字组"""
+    tokens = []
+    for match in TOKEN_PATTERN.finditer((text or '').lower()):
+        word = match.group()
+        if CJK_PATTERN.match(word):
+            tokens.extend(word)
+            tokens.extend(word[i:i + 2] for i in range(len(word) - 1))
+        else:
+            tokens.append(word)
+    return tokens
+
+
+def query_tokens(text):
+    """查询分词：中日韩文字只使用双字组（单字查询除外），避免单字噪声"""
+    tokens = []
+    for match in TOKEN_PATTERN.finditer((text or '').lower()):
+        word = match.group()
+        if CJK_PATTERN.match(word) and len(word) > 1:
+            tokens.extend(word[i:i + 2] for i in range(len(word) - 1))
+        else:
+            tokens.append(word)
+    return tokens
+
+
+def trigrams(word):
+    """生成词的三元组（首尾补空格）"""
+    padded = f'  {word} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def edit_distance(a, b):
+    """最优字符串对齐距离（允许相邻字符交换）"""
+    if a == b:
+        return 0
+    len_a, len_b = len(a), len(b)
+    previous2 = None
+    previous = list(range(len_b + 1))
+    for i in range(1, len_a + 1):
+        current = [i] + [0] * len_b
+        for j in range(1, len_b + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            value = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if (previous2 is not None and i > 1 and j > 1
+                    and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]):
+                value = min(value, previous2[j - 2] + 1)
+            current[j] = value
+        previous2, previous = previous, current
+    return previous[len_b]
+
+
+def token_similarity(query, token):
+    """计算查询词与索引词的相似度（0~1），前缀命中视为高相似"""
+    if query == token:
+        return 1.0
+    if token.startswith(query):
+        return 0.85 + 0.15 * len(query) / len(token)
+    longest = max(len(query), len(token))
+    similarity = 1.0 - edit_distance(query, token) / longest
+    # 正在输入的查询词与长词的前缀比较
+    if len(token) > len(query) + 1:
+        prefix = token[:len(query)]
+        similarity = max(similarity, 0.8 * (1.0 - edit_distance(query, prefix) / len(query)))
+    return similarity
+
+
+class TrigramIndex:
+    """命令模糊搜索索引
+
+    词表级三元组索引（三元组 -> 词）用于找出与查询词相近的词，
+    倒排表（词 -> 命令ID）用于定位命令。索引可增量更新。
+    """
+
+    def __init__(self):
+        self.vocab = {}          # 词 -> 词ID
+        self.tokens = []         # 词ID -> 词
+        self.gram_tokens = {}    # 三元组 -> 词ID数组（仅拉丁词）
+        self.name_postings = []  # 词ID -> 命令ID数组（名称）
+        self.body_postings = []  # 词ID -> 命令ID数组（命令内容和描述）
+        self.doc_tokens = {}     # 命令ID -> (名称词ID, 内容词ID)
+
+    def __len__(self):
+        return len(self.doc_tokens)
+
+    def _token_id(self, token):
+        token_id = self.vocab.get(token)
+        if token_id is None:
+            token_id = len(self.tokens)
+            self.vocab[token] = token_id
+            self.tokens.append(token)
+            self.name_postings.append(array('i'))
+            self.body_postings.append(array('i'))
+            if not CJK_PATTERN.match(token):
+                for gram in trigrams(token):
+                    self.gram_tokens.setdefault(gram, array('i')).append(token_id)
+        return token_id
+
+    def add(self, command_id, name, command, description):
+        """添加或更新一条命令"""
+        if command_id in self.doc_tokens:
+            self.remove(command_id)
+
+        token_id = self._token_id
+        name_ids = tuple(token_id(t) for t in set(tokenize(name)))
+        body_ids = tuple(token_id(t) for t in set(tokenize(f'{command}\n{description}')))
+        for token_id in name_ids:
+            self.name_postings[token_id].append(command_id)
+        for token_id in body_ids:
+            self.body_postings[token_id].append(command_id)
+        self.doc_tokens[command_id] = (name_ids, body_ids)
+
+    def remove(self, command_id):
+        """从索引中移除一条命令"""
+        entry = self.doc_tokens.pop(command_id, None)
+        if entry is None:
+            return
+        name_ids, body_ids = entry
+        for token_id in name_ids:
+            self.name_postings[token_id].remove(command_id)
+        for token_id in body_ids:
+            self.body_postings[token_id].remove(command_id)
+
+    def build(self, rows):
+        """从 (id, name, command, description) 行批量建立索引"""
+        for command_id, name, command, description in rows:
+            self.add(command_id, name, command, description)
+
+    def expand(self, query):
+        """找出与查询词相近的索引词，返回 [(词ID, 相似度)]"""
+        if CJK_PATTERN.match(query):
+            token_id = self.vocab.get(query)
+            return [(token_id, 1.0)] if token_id is not None else []
+
+        counts = Counter()
+        for gram in trigrams(query):
+            postings = self.gram_tokens.get(gram)
+            if postings:
+                counts.update(postings)
+
+        expansions = []
+        for token_id, _ in counts.most_common(MAX_EXPANSIONS * 4):
+            similarity = token_similarity(query, self.tokens[token_id])
+            if similarity >= MIN_TOKEN_SIMILARITY:
+                expansions.append((similarity, token_id))
+
+        expansions = heapq.nlargest(MAX_EXPANSIONS, expansions)
+        return [(token_id, similarity) for similarity, token_id in expansions]
+
+    def search(self, text, limit=100, min_score=0.4):
+        """模糊搜索，返回按得分排序的 [(命令ID, 得分)]"""
+        words = query_tokens(text)
+        if not words:
+            return []
+
+        scores = {}
+        for word in words:
+            best = {}
+            for token_id, similarity in self.expand(word):
+                name_score = similarity * NAME_WEIGHT
+                body_score = similarity * BODY_WEIGHT
+                for command_id in self.name_postings[token_id]:
+                    if best.get(command_id, 0.0) < name_score:
+                        best[command_id] = name_score
+                for command_id in self.body_postings[token_id]:
+                    if best.get(command_id, 0.0) < body_score:
+                        best[command_id] = body_score
+            for command_id, score in best.items():
+                scores[command_id] = scores.get(command_id, 0.0) + score
+
+        count = len(words)
+        threshold = min_score * count
+        ranked = heapq.nlargest(limit, ((score, command_id) for command_id, score in scores.items()
+                                        if score >= threshold))
+        return [(command_id, score / count) for score, command_id in ranked]
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+版本历史
+命令和笔记每次编辑后的内容保存在 row_history 表中。每个版本只保存与上一版本的
+差异（长文本按行比较，只记录新增的行和沿用的行范围），用zlib压缩；每隔
+KEYFRAME_INTERVAL 个版本保存一次完整内容，还原任意版本最多只需回放这么多个差异。
+（本模块不依赖tkinter）
+"""
+
+import difflib
+import hashlib
+import json
+import zlib
+
+# 每张表保存历史的列
+HISTORY_FIELDS = {
+    'commands': ('name', 'command', 'category_id', 'description', 'tags'),
+    'notes': ('title', 'content', 'category', 'tags'),
+}
+
+# 每隔多少个版本保存一次完整内容
+KEYFRAME_INTERVAL = 16
+# 短于该长度的文本修改后直接保存新值，不按行比较
+LINE_DIFF_MIN_LENGTH = 200
+
+
+def create_tables(cursor):
+    """版本历史表"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS row_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            table_name TEXT NOT NULL,
+            row_id INTEGER NOT NULL,
+            version INTEGER NOT NULL,
+            keyframe INTEGER NOT NULL,
+            data BLOB NOT NULL,
+            data_hash TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE (table_name, row_id, version)
+        )
+    ''')
+
+
+def read_row(cursor, table, row_id):
+    """读取一行中保存历史的列，返回 {列名: 值}，行不存在返回 None"""
+    fields = HISTORY_FIELDS[table]
+    cursor.execute(f'SELECT {", ".join(fields)} FROM {table} WHERE id = ?', (row_id,))
+    row = cursor.fetchone()
+    return dict(zip(fields, row)) if row else None
+
+
+def data_hash(data):
+    return hashlib.sha1(json.dumps(data, ensure_ascii=False, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def encode(value):
+    return zlib.compress(json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+
+
+def decode(blob):
+    return json.loads(zlib.decompress(blob).decode('utf-8'))
+
+
+def make_delta(old, new):
+    """字段差异 {列名: 新值 或 行操作列表}，未修改的列不出现
+
+    行操作列表中 [起, 止] 表示沿用旧文本的这些行，字符串表示新增的文本。
+    """
+    delta = {}
+    for field, value in new.items():
+        previous = old.get(field)
+        if value == previous:
+            continue
+        if (isinstance(value, str) and isinstance(previous, str)
+                and len(value) >= LINE_DIFF_MIN_LENGTH and len(previous) >= LINE_DIFF_MIN_LENGTH):
+            delta[field] = diff_lines(previous.splitlines(True), value.splitlines(True))
+        else:
+            delta[field] = value
+    return delta
+
+
+def diff_lines(old_lines, new_lines):
+    ops = []
+    matcher = difflib.SequenceMatcher(None, old_lines, new_lines, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            ops.append([i1, i2])
+        elif j2 > j1:
+            ops.append(''.join(new_lines[j1:j2]))
+    return ops
+
+
+def apply_delta(data, delta):
+    data = dict(data)
+    for field, value in delta.items():
+        if isinstance(value, list):
+            old_lines = (data.get(field) or '').splitlines(True)
+            data[field] = ''.join(op if isinstance(op, str) else ''.join(old_lines[op[0]:op[1]])
+                                  for op in value)
+        else:
+            data[field] = value
+    return data
+
+
+def record_version(cursor, table, row_id):
+    """如果行的当前内容与最新历史版本不同，保存为新版本（不提交事务），返回新版本号
+
+    编辑前后各调用一次：编辑前的调用保存第一个版本，
+    以及同步、撤销等其他途径造成的修改。
+    """
+    data = read_row(cursor, table, row_id)
+    if data is None:
+        return None
+    digest = data_hash(data)
+
+    cursor.execute('''
+        SELECT version, data_hash FROM row_history
+        WHERE table_name = ? AND row_id = ? ORDER BY version DESC LIMIT 1
+    ''', (table, row_id))
+    latest = cursor.fetchone()
+    if latest and latest[1] == digest:
+        return None
+
+    version = latest[0] + 1 if latest else 1
+    blob = keyframe = encode(data)
+    if latest and (version - 1) % KEYFRAME_INTERVAL:
+        delta = encode(make_delta(get_version(cursor, table, row_id, latest[0]), data))
+        if len(delta) < len(keyframe):
+            blob = delta
+    cursor.execute('''
+        INSERT INTO row_history (table_name, row_id, version, keyframe, data, data_hash, size)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', (table, row_id, version, 1 if blob is keyframe else 0, blob, digest,
+          len(json.dumps(data, ensure_ascii=False).encode('utf-8'))))
+    return version
+
+
+def get_version(cursor, table, row_id, version):
+    """还原指定版本的内容 {列名: 值}，版本不存在返回 None"""
+    cursor.execute('''
+        SELECT version, keyframe, data FROM row_history
+        WHERE table_name = ? AND row_id = ? AND version <= ? AND version >= (
+            SELECT MAX(version) FROM row_history
+            WHERE table_name = ? AND row_id = ? AND version <= ? AND keyframe = 1)
+        ORDER BY version
+    ''', (table, row_id, version, table, row_id, version))
+    rows = cursor.fetchall()
+    if not rows or rows[-1][0] != version:
+        return None
+    data = decode(rows[0][2])
+    for _, _, blob in rows[1:]:
+        data = apply_delta(data, decode(blob))
+    return data
+
+
+def list_versions(conn, table, row_id):
+    """列出一行的历史版本，返回 [(版本号, 保存时间, 内容大小, 存储大小)]，最新的在前"""
+    cursor = conn.execute('''
+        SELECT version, created_at, size, length(data) FROM row_history
+        WHERE table_name = ? AND row_id = ? ORDER BY version DESC
+    ''', (table, row_id))
+    return cursor.fetchall()
+
+
+def prune_deleted(conn):
+    """删除已不存在、也不能通过撤销恢复的命令和笔记的历史，返回删除的版本数"""
+    removed = 0
+    for table in HISTORY_FIELDS:
+        cursor = conn.execute(f'''
+            DELETE FROM row_history
+            WHERE table_name = ? AND row_id NOT IN (SELECT id FROM {table})
+            AND row_id NOT IN (SELECT row_id FROM undo_journal WHERE table_name = ?)
+        ''', (table, table))
+        removed += cursor.rowcount
+    return removed
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+性能监测
+统计每条SQL语句和每个Tk事件处理函数的耗时分布（对数分桶直方图），
+超过阈值的慢操作写入 data/slow_queries.log
+（本模块不依赖tkinter，界面钩子在 install_tk_hooks 中按需导入）
+"""
+
+import bisect
+import os
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+SLOW_LOG_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'slow_queries.log')
+SLOW_LOG_MAX_BYTES = 1024 * 1024
+
+# 慢操作阈值（秒）
+SLOW_QUERY_SECONDS = 0.05
+SLOW_HANDLER_SECONDS = 0.1
+
+# 直方图桶上界：10微秒起按 2^(1/4) 倍增长到约100秒，相对误差约19%
+BUCKET_BOUNDS = [1e-5 * 2 ** (i / 4) for i in range(94)]
+
+SQL_WHITESPACE = re.compile(r'\s+')
+SQL_PLACEHOLDER_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+
+
+class LatencyHistogram:
+    """耗时直方图"""
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKET_BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        self.counts[bisect.bisect_left(BUCKET_BOUNDS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, percent):
+        """估算百分位耗时（秒），取所在桶的上界（不超过最大值）"""
+        if not self.count:
+            return 0.0
+        rank = self.count * percent / 100.0
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= rank:
+                bound = BUCKET_BOUNDS[index] if index < len(BUCKET_BOUNDS) else self.max
+                return min(bound, self.max)
+        return self.max
+
+
+class Instrumentation:
+    """耗时统计注册表，按 (类型, 名称) 保存直方图"""
+
+    def __init__(self, slow_log_path=SLOW_LOG_PATH):
+        self.slow_log_path = slow_log_path
+        self.thresholds = {'sql': SLOW_QUERY_SECONDS, 'tk': SLOW_HANDLER_SECONDS}
+        self.histograms = {}
+        self.lock = threading.Lock()
+        self.started_at = time.time()
+
+    def record(self, kind, name, seconds, detail=None):
+        with self.lock:
+            histogram = self.histograms.get((kind, name))
+            if histogram is None:
+                histogram = self.histograms[(kind, name)] = LatencyHistogram()
+            histogram.record(seconds)
+        if seconds >= self.thresholds.get(kind, SLOW_HANDLER_SECONDS):
+            self.log_slow(kind, name, seconds, detail)
+
+    def log_slow(self, kind, name, seconds, detail=None):
+        """追加一条慢操作记录，日志超过大小上限时轮换为 .1"""
+        try:
+            os.makedirs(os.path.dirname(self.slow_log_path), exist_ok=True)
+            if os.path.exists(self.slow_log_path) and os.path.getsize(self.slow_log_path) > SLOW_LOG_MAX_BYTES:
+                os.replace(self.slow_log_path, self.slow_log_path + '.1')
+            line = f"{datetime.now().isoformat(timespec='milliseconds')}\t{seconds * 1000:.1f}ms\t{kind}\t{name}"
+            if detail:
+                line += f"\t{format_detail(detail)}"
+            with open(self.slow_log_path, 'a', encoding='utf-8') as f:
+                f.write(line + '\n')
+        except OSError as e:
+            print(f"写入慢查询日志失败: {e}")
+
+    def snapshot(self):
+        """返回统计快照 [(类型, 名称, 次数, 总耗时, p50, p95, p99, 最大)]，按总耗时倒序"""
+        with self.lock:
+            rows = [(kind, name, h.count, h.total, h.percentile(50), h.percentile(95), h.percentile(99), h.max)
+                    for (kind, name), h in self.histograms.items()]
+        rows.sort(key=lambda row: row[3], reverse=True)
+        return rows
+
+    def reset(self):
+        with self.lock:
+            self.histograms.clear()
+            self.started_at = time.time()
+
+
+# 程序内共用的统计注册表
+monitor = Instrumentation()
+
+
+def query_name(sql):
+    """把SQL归一化为统计名称（合并空白，IN (?, ?, ...) 视为同一条语句）"""
+    sql = SQL_WHITESPACE.sub(' ', sql).strip()
+    sql = SQL_PLACEHOLDER_LIST.sub('(?…)', sql)
+    return sql if len(sql) <= 300 else sql[:297] + '...'
+
+
+def format_detail(detail):
+    """慢操作日志中的附加信息，过长时截断"""
+    text = detail if isinstance(detail, str) else repr(detail)
+    return text if len(text) <= 200 else text[:197] + '...'
+
+
+def describe_parameters(parameters):
+    """SQL参数的类型和长度（参数值可能包含密码等敏感内容，不写入日志）"""
+    if not parameters:
+        return None
+    values = parameters.values() if isinstance(parameters, dict) else parameters
+    described = []
+    for value in values:
+        if isinstance(value, (str, bytes)):
+            described.append(f'{type(value).__name__}[{len(value)}]')
+        else:
+            described.append(type(value).__name__)
+    return '(' + ', '.join(described) + ')'
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """记录执行和取结果耗时的游标"""
+
+    query = None
+
+    def execute(self, sql, parameters=()):
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self.query = query_name(sql)
+            monitor.record('sql', self.query, time.perf_counter() - start, describe_parameters(parameters))
+
+    def executemany(self, sql, seq_of_parameters):
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self.query = query_name(sql)
+            monitor.record('sql', f'{self.query} [executemany]', time.perf_counter() - start)
+
+    def fetchall(self):
+        start = time.perf_counter()
+        try:
+            return super().fetchall()
+        finally:
+            monitor.record('sql', f'{self.query} [fetchall]', time.perf_counter() - start)
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """默认使用 InstrumentedCursor 的连接（sqlite3.connect 的 factory 参数）"""
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    # Connection.execute 不经过 cursor() 方法，需要单独转发
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+def callback_name(func):
+    """Tk回调的统计名称（after 回调取被延迟调用的函数）"""
+    if getattr(func, '__qualname__', '').endswith('after.<locals>.callit') and func.__closure__:
+        cells = dict(zip(func.__code__.co_freevars, func.__closure__))
+        if 'func' in cells:
+            func = cells['func'].cell_contents
+    name = getattr(func, '__qualname__', None) or repr(func)
+    if '<lambda>' in name and hasattr(func, '__code__'):
+        name += f':{func.__code__.co_firstlineno}'
+    return name
+
+
+def install_tk_hooks():
+    """统计所有Tk回调（按钮命令、事件绑定、after定时器、变量跟踪）的耗时
+
+    tkinter 通过 CallWrapper 调用所有注册到Tcl的Python函数，替换它即可覆盖全部回调，
+    必须在创建界面之前调用。
+    """
+    import tkinter
+    from tkinter import commondialog
+
+    if getattr(tkinter.CallWrapper, 'instrumented', False):
+        return
+
+    # 正在执行的回调；在回调中等待用户操作（wait_window 等嵌套事件循环、系统对话框）时
+    # 标记正在执行的所有回调，它们的耗时包含用户操作时间，不计入统计
+    running = []
+
+    def waits_for_user(method):
+        def wrapper(*args, **kwargs):
+            for frame in running:
+                frame[0] = True
+            return method(*args, **kwargs)
+        return wrapper
+
+    for name in ('wait_window', 'wait_variable', 'wait_visibility'):
+        setattr(tkinter.Misc, name, waits_for_user(getattr(tkinter.Misc, name)))
+    tkinter.Misc.waitvar = tkinter.Misc.wait_variable
+    commondialog.Dialog.show = waits_for_user(commondialog.Dialog.show)
+
+    class InstrumentedCallWrapper(tkinter.CallWrapper):
+        instrumented = True
+
+        def __init__(self, func, subst, widget):
+            super().__init__(func, subst, widget)
+            self.name = callback_name(func)
+
+        def __call__(self, *args):
+            frame = [False]
+            running.append(frame)
+            start = time.perf_counter()
+            try:
+                return super().__call__(*args)
+            finally:
+                elapsed = time.perf_counter() - start
+                running.pop()
+                if not frame[0]:
+                    monitor.record('tk', self.name, elapsed)
+
+    tkinter.CallWrapper = InstrumentedCallWrapper
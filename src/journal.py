@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+操作日志（撤销/重做）
+记录命令、分类、笔记每次修改前后的整行快照，
+撤销/重做时在单个事务中回放，无需从备份恢复整个数据库
+"""
+
+import json
+
+# 撤销修改时不回滚的列（使用统计在修改之外独立变化，修订号和修改时间由触发器维护）
+VOLATILE_COLUMNS = {'use_count', 'last_used_at', 'frecency', 'revision', 'updated_at'}
+# 修改本身改变了使用统计的操作（例如合并重复命令）撤销时要回滚的列
+USAGE_COLUMNS = {'use_count', 'last_used_at', 'frecency'}
+
+
+class UndoError(Exception):
+    """撤销/重做无法执行"""
+
+
+class OperationJournal:
+    """撤销/重做日志
+
+    每次用户操作对应一个操作组（group_id），组内每行记录一行数据的
+    修改前快照（before_data）和修改后快照（after_data），NULL 表示该行不存在；
+    restore_usage 为 1 的行撤销/重做时连同使用统计一起恢复。
+    日志只保留最近 max_groups 个操作组。
+    """
+
+    def __init__(self, conn, max_groups=200):
+        self.conn = conn
+        self.max_groups = max_groups
+
+    @staticmethod
+    def create_table(cursor):
+        """创建日志表"""
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS undo_journal (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                group_id INTEGER NOT NULL,
+                label TEXT NOT NULL,
+                table_name TEXT NOT NULL,
+                row_id INTEGER NOT NULL,
+                before_data TEXT,
+                after_data TEXT,
+                undone INTEGER DEFAULT 0,
+                restore_usage INTEGER DEFAULT 0,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_undo_journal_group ON undo_journal (group_id)')
+        cursor.execute('PRAGMA table_info(undo_journal)')
+        if 'restore_usage' not in {row[1] for row in cursor.fetchall()}:
+            cursor.execute('ALTER TABLE undo_journal ADD COLUMN restore_usage INTEGER DEFAULT 0')
+
+    def snapshot(self, table, where, params=()):
+        """读取满足条件的行，返回 {行ID: {列名: 值}}"""
+        cursor = self.conn.execute(f'SELECT * FROM {table} WHERE {where}', params)
+        columns = [desc[0] for desc in cursor.description]
+        return {row[0]: dict(zip(columns, row)) for row in cursor.fetchall()}
+
+    def snapshot_ids(self, table, row_ids):
+        """按ID读取行快照"""
+        row_ids = list(row_ids)
+        if not row_ids:
+            return {}
+        placeholders = ','.join('?' * len(row_ids))
+        return self.snapshot(table, f'id IN ({placeholders})', row_ids)
+
+    def record(self, label, table, before, after):
+        """记录一个操作组（在调用方提交事务之前调用）"""
+        return self.record_changes(label, [(table, before, after)])
+
+    def record_changes(self, label, tables, restore_usage=False):
+        """把多个表的修改 [(表名, 修改前快照, 修改后快照)] 记录为一个操作组
+
+        撤销时按相反的顺序恢复各表；restore_usage 为 True 时撤销/重做也恢复使用统计列。
+        """
+        changes = []
+        for table, before, after in tables:
+            for row_id in sorted(set(before) | set(after)):
+                old, new = before.get(row_id), after.get(row_id)
+                if old == new:
+                    continue
+                changes.append((table, row_id,
+                                json.dumps(old, ensure_ascii=False) if old is not None else None,
+                                json.dumps(new, ensure_ascii=False) if new is not None else None))
+        if not changes:
+            return None
+
+        cursor = self.conn.cursor()
+        # 新操作使重做历史失效
+        cursor.execute('DELETE FROM undo_journal WHERE undone = 1')
+        cursor.execute('SELECT COALESCE(MAX(group_id), 0) + 1 FROM undo_journal')
+        group_id = cursor.fetchone()[0]
+        cursor.executemany('''
+            INSERT INTO undo_journal (group_id, label, table_name, row_id, before_data, after_data, restore_usage)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', [(group_id, label, table, row_id, old, new, int(restore_usage)) for table, row_id, old, new in changes])
+        cursor.execute('DELETE FROM undo_journal WHERE group_id <= ?', (group_id - self.max_groups,))
+        return group_id
+
+    def can_undo(self):
+        return self._next_group(undone=0) is not None
+
+    def can_redo(self):
+        return self._next_group(undone=1) is not None
+
+    def undo(self):
+        """撤销最近一次操作，返回 (描述, [(表名, 行ID)])"""
+        group_id = self._next_group(undone=0)
+        if group_id is None:
+            return None
+        return self._replay(group_id, undo=True)
+
+    def redo(self):
+        """重做最近一次撤销的操作，返回 (描述, [(表名, 行ID)])"""
+        group_id = self._next_group(undone=1)
+        if group_id is None:
+            return None
+        return self._replay(group_id, undo=False)
+
+    def _next_group(self, undone):
+        aggregate = 'MAX' if not undone else 'MIN'
+        cursor = self.conn.execute(f'SELECT {aggregate}(group_id) FROM undo_journal WHERE undone = ?',
+                                   (undone,))
+        return cursor.fetchone()[0]
+
+    def _replay(self, group_id, undo):
+        cursor = self.conn.cursor()
+        cursor.execute('''
+            SELECT label, table_name, row_id, before_data, after_data, restore_usage
+            FROM undo_journal WHERE group_id = ? ORDER BY id
+        ''', (group_id,))
+        entries = cursor.fetchall()
+        if undo:
+            entries.reverse()
+
+        label = entries[0][0]
+        affected = []
+        try:
+            for _, table, row_id, before_data, after_data, restore_usage in entries:
+                data = before_data if undo else after_data
+                self._restore_row(cursor, table, row_id, json.loads(data) if data else None, restore_usage)
+                affected.append((table, row_id))
+            cursor.execute('UPDATE undo_journal SET undone = ? WHERE group_id = ?',
+                           (1 if undo else 0, group_id))
+            self.conn.commit()
+        except Exception as e:
+            self.conn.rollback()
+            raise UndoError(f"无法{'撤销' if undo else '重做'}“{label}”: {e}") from e
+        return label, affected
+
+    def _restore_row(self, cursor, table, row_id, data, restore_usage=False):
+        """把一行恢复为快照状态（None 表示删除该行）"""
+        if data is None:
+            cursor.execute(f'DELETE FROM {table} WHERE id = ?', (row_id,))
+            return
+
+        cursor.execute(f'SELECT 1 FROM {table} WHERE id = ?', (row_id,))
+        if cursor.fetchone():
+            skipped = VOLATILE_COLUMNS - USAGE_COLUMNS if restore_usage else VOLATILE_COLUMNS
+            columns = [column for column in data if column != 'id' and column not in skipped]
+            assignments = ', '.join(f'{column} = ?' for column in columns)
+            cursor.execute(f'UPDATE {table} SET {assignments} WHERE id = ?',
+                           [data[column] for column in columns] + [row_id])
+        else:
+            columns = list(data)
+            placeholders = ','.join('?' * len(columns))
+            cursor.execute(f'INSERT INTO {table} ({", ".join(columns)}) VALUES ({placeholders})',
+                           [data[column] for column in columns])
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+数据库维护
+完整性检查、更新查询计划统计（ANALYZE / PRAGMA optimize）、整理全文索引、
+回收空闲页（增量或完整VACUUM），并记录每次维护的耗时和回收的空间
+（本模块不依赖tkinter）
+"""
+
+import json
+import os
+import sqlite3
+import time
+from datetime import datetime
+
+import history
+
+# 空闲时自动维护的最小间隔（秒）
+MAINTENANCE_INTERVAL = 24 * 3600
+# 用户无操作多久后视为空闲（秒）
+IDLE_SECONDS = 300
+
+AUTO_VACUUM_MODES = {0: 'NONE', 1: 'FULL', 2: 'INCREMENTAL'}
+
+
+def create_tables(cursor):
+    """维护记录表"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS maintenance_log (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            started_at REAL NOT NULL,
+            duration REAL NOT NULL,
+            reclaimed_bytes INTEGER NOT NULL,
+            integrity TEXT,
+            report TEXT
+        )
+    ''')
+
+
+def last_run(conn):
+    """最近一次维护的开始时间（时间戳），从未维护返回 None"""
+    try:
+        return conn.execute('SELECT MAX(started_at) FROM maintenance_log').fetchone()[0]
+    except sqlite3.Error:
+        return None
+
+
+def is_due(conn, interval=MAINTENANCE_INTERVAL):
+    """距离上次维护是否已超过 interval 秒"""
+    previous = last_run(conn)
+    return previous is None or time.time() - previous >= interval
+
+
+def file_size(db_path):
+    """数据库文件（包括WAL文件）的总大小"""
+    return sum(os.path.getsize(db_path + suffix) for suffix in ('', '-wal') if os.path.exists(db_path + suffix))
+
+
+def fts_tables(conn):
+    """数据库中的 FTS4/FTS5 全文索引表"""
+    cursor = conn.execute('''
+        SELECT name FROM sqlite_master
+        WHERE type = 'table' AND sql LIKE 'CREATE VIRTUAL TABLE%' AND lower(sql) LIKE '%using fts%'
+    ''')
+    return [row[0] for row in cursor.fetchall()]
+
+
+def run_maintenance(db_path, full=False, quick_check=True, progress=None):
+    """执行一次数据库维护，返回报告
+
+    full 为 True 时执行完整 VACUUM（重写整个文件，期间其他连接无法写入），
+    否则只回收空闲页。数据库还没有启用增量回收时，完整 VACUUM 同时完成转换。
+    progress(步骤名) 在每一步开始前调用。
+    """
+    import attachments
+
+    conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+    started_at = time.time()
+    steps = []
+
+    def execute(sql):
+        return conn.execute(sql).fetchall()
+
+    def step(name, func):
+        if progress:
+            progress(name)
+        start = time.perf_counter()
+        detail = func()
+        steps.append({'step': name, 'seconds': round(time.perf_counter() - start, 4), 'detail': detail})
+        return detail
+
+    try:
+        size_before = file_size(db_path)
+        page_size = conn.execute('PRAGMA page_size').fetchone()[0]
+        freelist_before = conn.execute('PRAGMA freelist_count').fetchone()[0]
+        auto_vacuum = conn.execute('PRAGMA auto_vacuum').fetchone()[0]
+
+        # 完整性检查（quick_check 不校验索引内容，耗时远小于 integrity_check）
+        pragma = 'quick_check' if quick_check else 'integrity_check'
+        problems = step(pragma, lambda: [row[0] for row in execute(f'PRAGMA {pragma}')])
+        integrity = 'ok' if problems == ['ok'] else '; '.join(problems[:20])
+
+        # 已删除的命令和笔记的版本历史
+        step('prune_history', lambda: history.prune_deleted(conn))
+        # 已删除的笔记的附件
+        step('prune_attachments', lambda: attachments.prune_deleted(conn))
+
+        step('analyze', lambda: execute('ANALYZE'))
+        step('optimize', lambda: execute('PRAGMA optimize'))
+
+        def optimize_fts():
+            tables = fts_tables(conn)
+            for table in tables:
+                conn.execute(f'INSERT INTO "{table}"("{table}") VALUES (\'optimize\')')
+            return tables
+
+        step('fts_optimize', optimize_fts)
+
+        if full:
+            # 启用增量回收需要通过 VACUUM 重写文件
+            conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+            step('vacuum', lambda: execute('VACUUM'))
+            auto_vacuum = conn.execute('PRAGMA auto_vacuum').fetchone()[0]
+        elif auto_vacuum == 2:
+            # incremental_vacuum 每执行一步只释放一页，executescript 会一直执行到结束
+            step('incremental_vacuum', lambda: conn.executescript('PRAGMA incremental_vacuum;') and None)
+
+        if conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal':
+            step('wal_checkpoint', lambda: list(execute('PRAGMA wal_checkpoint(TRUNCATE)')[0]))
+
+        freelist_after = conn.execute('PRAGMA freelist_count').fetchone()[0]
+        size_after = file_size(db_path)
+        report = {
+            'started_at': datetime.fromtimestamp(started_at).isoformat(timespec='seconds'),
+            'duration': round(time.time() - started_at, 3),
+            'size_before': size_before,
+            'size_after': size_after,
+            'reclaimed_bytes': max(0, size_before - size_after),
+            'page_size': page_size,
+            'freelist_before': freelist_before,
+            'freelist_after': freelist_after,
+            'auto_vacuum': AUTO_VACUUM_MODES.get(auto_vacuum, auto_vacuum),
+            'integrity': integrity,
+            'steps': steps,
+        }
+
+        conn.execute('''
+            INSERT INTO maintenance_log (started_at, duration, reclaimed_bytes, integrity, report)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (started_at, report['duration'], report['reclaimed_bytes'], integrity,
+              json.dumps(report, ensure_ascii=False)))
+        return report
+    finally:
+        conn.close()
+
+
+def format_size(size):
+    if size >= 1024 * 1024:
+        return f"{size / 1024 / 1024:.1f} MB"
+    return f"{size / 1024:.1f} KB"
+
+
+def format_report(report):
+    """把维护报告格式化为文本"""
+    lines = [
+        f"完整性检查: {'正常' if report['integrity'] == 'ok' else report['integrity']}",
+        f"文件大小: {format_size(report['size_before'])} -> {format_size(report['size_after'])}"
+        f"（回收 {format_size(report['reclaimed_bytes'])}）",
+        f"空闲页: {report['freelist_before']} -> {report['freelist_after']}",
+        f"空间回收模式: {report['auto_vacuum']}",
+        "",
+        "各步骤耗时:",
+    ]
+    for item in report['steps']:
+        line = f"  {item['step']:<20} {item['seconds'] * 1000:>9.1f} ms"
+        if item['step'] == 'fts_optimize':
+            line += f"（{len(item['detail'])} 个全文索引）"
+        elif item['step'] == 'prune_history' and item['detail']:
+            line += f"（清理 {item['detail']} 个历史版本）"
+        lines.append(line)
+    lines.append(f"总耗时: {report['duration']:.2f} 秒")
+    if report['auto_vacuum'] != 'INCREMENTAL':
+        lines.append("提示: 数据库尚未启用增量空间回收，执行一次完整整理（VACUUM）即可启用")
+    return '\n'.join(lines)
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+性能分析
+在真实使用过程中按需开启 cProfile 和 tracemalloc，停止后把分析结果
+打包为 data/diagnostics/ 下的zip文件，便于用户发送给开发者离线分析
+（本模块不依赖tkinter）
+"""
+
+import cProfile
+import io
+import json
+import os
+import platform
+import pstats
+import shutil
+import sqlite3
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+DIAGNOSTICS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'diagnostics')
+
+# tracemalloc 保存的调用栈深度
+TRACEBACK_FRAMES = 25
+TOP_FUNCTIONS = 80
+TOP_ALLOCATIONS = 50
+
+
+class ProfilingSession:
+    """一次性能分析
+
+    start() 开启 cProfile（只分析调用线程，即界面主线程）和 tracemalloc，
+    sample() 记录内存使用曲线，stop() 停止并写入分析包，返回zip文件路径。
+    """
+
+    def __init__(self, output_dir=DIAGNOSTICS_DIR, db_path=None):
+        self.output_dir = output_dir
+        self.db_path = db_path
+        self.profile = None
+        self.started_at = None
+        self.memory_samples = []
+        self.owns_tracemalloc = False
+
+    @property
+    def active(self):
+        return self.profile is not None
+
+    def start(self):
+        """开始分析（已有其他分析器运行时抛出 ValueError）"""
+        profile = cProfile.Profile()
+        profile.enable()
+        self.profile = profile
+        self.started_at = time.time()
+        self.memory_samples = []
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(TRACEBACK_FRAMES)
+            self.owns_tracemalloc = True
+
+    def sample(self):
+        """记录一次当前/峰值内存"""
+        if self.active and tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            self.memory_samples.append((round(time.time() - self.started_at, 3), current, peak))
+
+    def stop(self, extra_info=None):
+        """停止分析并写入分析包，返回zip文件路径"""
+        self.profile.disable()
+        profile, self.profile = self.profile, None
+        duration = time.time() - self.started_at
+
+        snapshot = None
+        if tracemalloc.is_tracing():
+            self.sample()
+            snapshot = tracemalloc.take_snapshot().filter_traces([
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+            ])
+            if self.owns_tracemalloc:
+                tracemalloc.stop()
+                self.owns_tracemalloc = False
+
+        name = f"profile_{datetime.fromtimestamp(self.started_at).strftime('%Y%m%d_%H%M%S')}"
+        bundle_dir = os.path.join(self.output_dir, name)
+        os.makedirs(bundle_dir, exist_ok=True)
+
+        # cProfile 原始数据（可用 snakeviz、pstats 等工具打开）和文本摘要
+        profile.dump_stats(os.path.join(bundle_dir, 'session.prof'))
+        with open(os.path.join(bundle_dir, 'profile_top.txt'), 'w', encoding='utf-8') as f:
+            f.write(format_profile(profile))
+
+        if snapshot is not None:
+            snapshot.dump(os.path.join(bundle_dir, 'allocations.snapshot'))
+            with open(os.path.join(bundle_dir, 'allocations_top.txt'), 'w', encoding='utf-8') as f:
+                f.write(format_allocations(snapshot))
+
+        info = {
+            'started_at': datetime.fromtimestamp(self.started_at).isoformat(timespec='seconds'),
+            'duration_seconds': round(duration, 3),
+            'python': sys.version,
+            'platform': platform.platform(),
+            'sqlite': sqlite3.sqlite_version,
+            'database': database_info(self.db_path),
+            'memory_samples': self.memory_samples,
+        }
+        info.update(extra_info or {})
+        with open(os.path.join(bundle_dir, 'info.json'), 'w', encoding='utf-8') as f:
+            json.dump(info, f, ensure_ascii=False, indent=2)
+
+        archive = shutil.make_archive(bundle_dir, 'zip', self.output_dir, name)
+        shutil.rmtree(bundle_dir, ignore_errors=True)
+        return archive
+
+
+def format_profile(profile):
+    """按累计耗时和自身耗时列出最耗时的函数"""
+    stream = io.StringIO()
+    stats = pstats.Stats(profile, stream=stream)
+    stats.strip_dirs()
+    stream.write("=== 按累计耗时排序 ===\n")
+    stats.sort_stats('cumulative').print_stats(TOP_FUNCTIONS)
+    stream.write("\n=== 按自身耗时排序 ===\n")
+    stats.sort_stats('tottime').print_stats(TOP_FUNCTIONS)
+    return stream.getvalue()
+
+
+def format_allocations(snapshot):
+    """列出分配内存最多的代码行，以及最大几处分配的调用栈"""
+    lines = ["=== 按代码行统计的内存分配 ==="]
+    for index, stat in enumerate(snapshot.statistics('lineno')[:TOP_ALLOCATIONS], 1):
+        frame = stat.traceback[0]
+        lines.append(f"#{index}: {frame.filename}:{frame.lineno} "
+                     f"{stat.size / 1024:.1f} KiB，{stat.count} 个对象")
+
+    lines.append("\n=== 最大的10处分配的调用栈 ===")
+    for index, stat in enumerate(snapshot.statistics('traceback')[:10], 1):
+        lines.append(f"#{index}: {stat.size / 1024:.1f} KiB，{stat.count} 个对象")
+        lines.extend(f"    {line}" for line in stat.traceback.format())
+    return '\n'.join(lines) + '\n'
+
+
+def database_info(db_path):
+    """数据库文件大小和各表行数"""
+    if not db_path or not os.path.exists(db_path):
+        return None
+    info = {'path': db_path, 'size_bytes': os.path.getsize(db_path), 'tables': {}}
+    try:
+        conn = sqlite3.connect(f'file:{db_path}?mode=ro', uri=True)
+        try:
+            for table in ('commands', 'categories', 'notes', 'usage_log', 'undo_journal', 'change_log', 'row_history',
+                          'note_attachments'):
+                try:
+                    info['tables'][table] = conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+                except sqlite3.Error:
+                    pass
+            info['page_size'] = conn.execute('PRAGMA page_size').fetchone()[0]
+            info['freelist_count'] = conn.execute('PRAGMA freelist_count').fetchone()[0]
+            info['journal_mode'] = conn.execute('PRAGMA journal_mode').fetchone()[0]
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        info['error'] = str(e)
+    return info
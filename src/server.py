@@ -0,0 +1,609 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+本地HTTP/JSON服务
+基于asyncio，把命令库以JSON接口提供给多个客户端共享：
+- 只监听本机地址或unix socket
+- 只读查询使用连接池，写操作串行执行并写入撤销日志
+- 支持HTTP/1.1长连接，以及基于ETag/Last-Modified的条件请求，
+  数据未变化时轮询请求直接返回304而不访问数据库
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import re
+import sqlite3
+import sys
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+
+import database
+from journal import OperationJournal
+
+KEEPALIVE_TIMEOUT = 30
+MAX_BODY_SIZE = 1024 * 1024
+MAX_HEADER_COUNT = 100
+RESPONSE_CACHE_SIZE = 256
+
+# If-None-Match 中的实体标签（可能带弱标签前缀 W/）或 *
+ENTITY_TAG = re.compile(r'\s*(?:(?:W/)?("[^"]*")|(\*))\s*(?:,|$)')
+
+STATUS_TEXT = {
+    200: 'OK', 201: 'Created', 204: 'No Content', 304: 'Not Modified',
+    400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+    409: 'Conflict', 413: 'Payload Too Large', 431: 'Request Header Fields Too Large',
+    500: 'Internal Server Error',
+}
+
+
+class HTTPError(Exception):
+    """带HTTP状态码的请求错误"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class ChangeMonitor:
+    """数据变化检测
+
+    使用独立连接读取 PRAGMA data_version：其他连接（包括本服务的写连接、
+    图形界面和命令行）提交修改后该值会变化，此时修订号加一。
+    """
+
+    def __init__(self, db_path):
+        self.conn = sqlite3.connect(f'file:{db_path}?mode=ro', uri=True, check_same_thread=False)
+        self.data_version = None
+        self.revision = 0
+
+    def check(self):
+        data_version = self.conn.execute('PRAGMA data_version').fetchone()[0]
+        if data_version != self.data_version:
+            self.data_version = data_version
+            self.revision += 1
+        return self.revision
+
+
+class ReaderPool:
+    """只读连接池，查询在线程池中执行"""
+
+    def __init__(self, db_path, size=4):
+        self.size = size
+        self.executor = ThreadPoolExecutor(max_workers=size, thread_name_prefix='cm-reader')
+        self.connections = asyncio.Queue()
+        for _ in range(size):
+            self.connections.put_nowait(
+                sqlite3.connect(f'file:{db_path}?mode=ro', uri=True, check_same_thread=False))
+
+    async def run(self, func, *args):
+        conn = await self.connections.get()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, func, conn, *args)
+        finally:
+            self.connections.put_nowait(conn)
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        while not self.connections.empty():
+            self.connections.get_nowait().close()
+
+
+class Writer:
+    """写连接，所有写操作在同一线程中串行执行"""
+
+    def __init__(self, db_path):
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='cm-writer')
+        self.conn = database.init_database(database.connect(db_path))
+        # WAL模式下读连接不会被写操作阻塞
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.close()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.journal = OperationJournal(self.conn)
+
+    async def run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, self._call, func, args)
+
+    def _call(self, func, args):
+        try:
+            return func(self.conn, self.journal, *args)
+        except Exception:
+            self.conn.rollback()
+            raise
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        self.conn.close()
+
+
+# 数据转换
+def command_row_to_dict(row):
+    command_id, name, preview, category, is_favorite = row
+    return {"id": command_id, "name": name, "preview": preview, "category": category,
+            "is_favorite": bool(is_favorite)}
+
+
+def command_detail(conn, command_id):
+    row = conn.execute('''
+        SELECT c.id, c.name, c.command, c.category_id, cat.name, c.description,
+               c.is_favorite, c.use_count, c.created_at, c.updated_at, c.tags
+        FROM commands c
+        LEFT JOIN categories cat ON c.category_id = cat.id
+        WHERE c.id = ?
+    ''', (command_id,)).fetchone()
+    if not row:
+        raise HTTPError(404, f"命令不存在: {command_id}")
+    keys = ('id', 'name', 'command', 'category_id', 'category', 'description',
+            'is_favorite', 'use_count', 'created_at', 'updated_at', 'tags')
+    data = dict(zip(keys, row))
+    data['is_favorite'] = bool(data['is_favorite'])
+    data['tags'] = (data['tags'] or '').split()
+    return data
+
+
+def note_detail(conn, note_id):
+    row = database.get_note(conn, note_id)
+    if not row:
+        raise HTTPError(404, f"笔记不存在: {note_id}")
+    data = dict(zip(('id', 'title', 'content', 'category', 'created_at', 'updated_at'), row))
+    data['tags'] = database.get_tags(conn, 'notes', note_id)
+    return data
+
+
+def category_detail(conn, category_id):
+    row = conn.execute('SELECT id, name, description, created_at FROM categories WHERE id = ?',
+                       (category_id,)).fetchone()
+    if not row:
+        raise HTTPError(404, f"分类不存在: {category_id}")
+    return dict(zip(('id', 'name', 'description', 'created_at'), row))
+
+
+def require_text(data, key):
+    value = data.get(key)
+    if not isinstance(value, str) or not value.strip():
+        raise HTTPError(400, f"缺少字段: {key}")
+    return value.strip()
+
+
+def resolve_category(cursor, data):
+    """从请求数据中取分类ID（支持 category_id 或 category 名称）"""
+    if data.get('category_id') is not None:
+        category_id = data['category_id']
+        if not cursor.execute('SELECT 1 FROM categories WHERE id = ?', (category_id,)).fetchone():
+            raise HTTPError(400, f"分类不存在: {category_id}")
+        return category_id
+    return database.get_category_id(cursor, data.get('category'), create=True)
+
+
+# 只读查询（在读连接池中执行）
+def query_commands(conn, params):
+    term = params.get('q', '').strip()
+    limit = int(params['limit']) if params.get('limit', '').isdigit() else None
+    if term:
+        rows = database.search_commands(conn, term, limit)
+    else:
+        rows = database.list_commands(conn, params.get('category') or None,
+                                      params.get('favorites') in ('1', 'true'),
+                                      params.get('tag') or None, params.get('match') != 'any')
+        if limit:
+            rows = rows[:limit]
+    return {"commands": [command_row_to_dict(row) for row in rows]}
+
+
+def query_command(conn, command_id):
+    return command_detail(conn, command_id)
+
+
+def query_categories(conn):
+    return {"categories": [dict(zip(('id', 'name', 'description', 'created_at'), row))
+                           for row in database.list_categories(conn)]}
+
+
+def query_category(conn, category_id):
+    return category_detail(conn, category_id)
+
+
+def query_notes(conn, params):
+    rows = database.list_notes(conn, params.get('category') or None,
+                               params.get('tag') or None, params.get('match') != 'any')
+    return {"notes": [dict(zip(('id', 'title', 'category', 'created_at', 'updated_at'), row))
+                      for row in rows]}
+
+
+def query_note(conn, note_id):
+    return note_detail(conn, note_id)
+
+
+# 写操作（在写线程中执行）
+def create_command(conn, journal, data):
+    command = require_text(data, 'command')
+    duplicates = database.find_duplicate_commands(conn, command)
+    if duplicates and not data.get('allow_duplicate'):
+        raise HTTPError(409, f"已存在相同的命令: {duplicates[0][0]}")
+    cursor = conn.cursor()
+    category_id = resolve_category(cursor, data)
+    command_id = database.insert_command(cursor, require_text(data, 'name'), command,
+                                         category_id, data.get('description') or '',
+                                         data.get('is_favorite'), data.get('tags'))
+    journal.record("添加命令", 'commands', {}, journal.snapshot_ids('commands', [command_id]))
+    conn.commit()
+    return command_detail(conn, command_id)
+
+
+def modify_command(conn, journal, command_id, data):
+    current = command_detail(conn, command_id)
+    cursor = conn.cursor()
+    before = journal.snapshot_ids('commands', [command_id])
+    if 'category_id' in data or 'category' in data:
+        category_id = resolve_category(cursor, data)
+    else:
+        category_id = current['category_id']
+    database.update_command(cursor, command_id,
+                            require_text(data, 'name') if 'name' in data else current['name'],
+                            require_text(data, 'command') if 'command' in data else current['command'],
+                            category_id,
+                            data['description'] if 'description' in data else current['description'],
+                            data.get('tags'))
+    if 'is_favorite' in data:
+        cursor.execute('UPDATE commands SET is_favorite = ? WHERE id = ?',
+                       (1 if data['is_favorite'] else 0, command_id))
+    journal.record("编辑命令", 'commands', before, journal.snapshot_ids('commands', [command_id]))
+    conn.commit()
+    return command_detail(conn, command_id)
+
+
+def remove_command(conn, journal, command_id):
+    before = journal.snapshot_ids('commands', [command_id])
+    if not before:
+        raise HTTPError(404, f"命令不存在: {command_id}")
+    conn.execute('DELETE FROM commands WHERE id = ?', (command_id,))
+    journal.record("删除命令", 'commands', before, {})
+    conn.commit()
+
+
+def create_category(conn, journal, data):
+    cursor = conn.cursor()
+    try:
+        cursor.execute('INSERT INTO categories (name, description) VALUES (?, ?)',
+                       (require_text(data, 'name'), data.get('description') or ''))
+    except sqlite3.IntegrityError:
+        raise HTTPError(409, "分类名称已存在")
+    category_id = cursor.lastrowid
+    journal.record("添加分类", 'categories', {}, journal.snapshot_ids('categories', [category_id]))
+    conn.commit()
+    return category_detail(conn, category_id)
+
+
+def modify_category(conn, journal, category_id, data):
+    current = category_detail(conn, category_id)
+    before = journal.snapshot_ids('categories', [category_id])
+    try:
+        conn.execute('UPDATE categories SET name = ?, description = ? WHERE id = ?',
+                     (require_text(data, 'name') if 'name' in data else current['name'],
+                      data['description'] if 'description' in data else current['description'],
+                      category_id))
+    except sqlite3.IntegrityError:
+        raise HTTPError(409, "分类名称已存在")
+    journal.record("编辑分类", 'categories', before, journal.snapshot_ids('categories', [category_id]))
+    conn.commit()
+    return category_detail(conn, category_id)
+
+
+def remove_category(conn, journal, category_id):
+    before = journal.snapshot_ids('categories', [category_id])
+    if not before:
+        raise HTTPError(404, f"分类不存在: {category_id}")
+    count = conn.execute('SELECT COUNT(*) FROM commands WHERE category_id = ?', (category_id,)).fetchone()[0]
+    if count > 0:
+        raise HTTPError(409, f"此分类下还有 {count} 个命令，无法删除")
+    conn.execute('DELETE FROM categories WHERE id = ?', (category_id,))
+    journal.record("删除分类", 'categories', before, {})
+    conn.commit()
+
+
+def create_note(conn, journal, data):
+    note_id = database.insert_note(conn.cursor(), require_text(data, 'title'),
+                                   data.get('content') or '', data.get('category') or '', data.get('tags'))
+    journal.record("添加笔记", 'notes', {}, journal.snapshot_ids('notes', [note_id]))
+    conn.commit()
+    return note_detail(conn, note_id)
+
+
+def modify_note(conn, journal, note_id, data):
+    current = note_detail(conn, note_id)
+    before = journal.snapshot_ids('notes', [note_id])
+    database.update_note(conn.cursor(), note_id,
+                         require_text(data, 'title') if 'title' in data else current['title'],
+                         data['content'] if 'content' in data else current['content'],
+                         data['category'] if 'category' in data else current['category'],
+                         data.get('tags'))
+    journal.record("编辑笔记", 'notes', before, journal.snapshot_ids('notes', [note_id]))
+    conn.commit()
+    return note_detail(conn, note_id)
+
+
+def remove_note(conn, journal, note_id):
+    before = journal.snapshot_ids('notes', [note_id])
+    if not before:
+        raise HTTPError(404, f"笔记不存在: {note_id}")
+    conn.execute('DELETE FROM notes WHERE id = ?', (note_id,))
+    journal.record("删除笔记", 'notes', before, {})
+    conn.commit()
+
+
+# 路由表：(方法, 路径正则, 处理方式, 函数)
+# 处理方式 'read' 在读连接池中执行，'write' 在写线程中执行
+ROUTES = [
+    ('GET', r'/api/commands', 'read', lambda conn, params: query_commands(conn, params)),
+    ('POST', r'/api/commands', 'write', create_command),
+    ('GET', r'/api/commands/(\d+)', 'read', query_command),
+    ('PUT', r'/api/commands/(\d+)', 'write', modify_command),
+    ('DELETE', r'/api/commands/(\d+)', 'write', remove_command),
+    ('GET', r'/api/categories', 'read', lambda conn, params: query_categories(conn)),
+    ('POST', r'/api/categories', 'write', create_category),
+    ('GET', r'/api/categories/(\d+)', 'read', query_category),
+    ('PUT', r'/api/categories/(\d+)', 'write', modify_category),
+    ('DELETE', r'/api/categories/(\d+)', 'write', remove_category),
+    ('GET', r'/api/notes', 'read', lambda conn, params: query_notes(conn, params)),
+    ('POST', r'/api/notes', 'write', create_note),
+    ('GET', r'/api/notes/(\d+)', 'read', query_note),
+    ('PUT', r'/api/notes/(\d+)', 'write', modify_note),
+    ('DELETE', r'/api/notes/(\d+)', 'write', remove_note),
+]
+COMPILED_ROUTES = [(method, re.compile(pattern + '$'), kind, func) for method, pattern, kind, func in ROUTES]
+
+
+class CommandServer:
+    """命令库HTTP服务"""
+
+    def __init__(self, db_path=database.DB_PATH, pool_size=4):
+        self.db_path = db_path
+        self.writer = Writer(db_path)
+        self.pool = ReaderPool(db_path, pool_size)
+        self.monitor = ChangeMonitor(db_path)
+        # 服务启动标识，避免重启后修订号重复导致ETag误判
+        self.instance_tag = format(int(time.time()), 'x')
+        self.cache = OrderedDict()
+
+    def etag(self, revision):
+        return f'"{self.instance_tag}-{revision}"'
+
+    async def dispatch(self, method, target, headers, body):
+        """处理一个请求，返回 (状态码, 响应头, 响应体)"""
+        url = urlsplit(target)
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+
+        if url.path == '/api/status':
+            revision = self.monitor.check()
+            return 200, {'ETag': self.etag(revision)}, {"revision": revision, "db": self.db_path}
+
+        allowed = False
+        for route_method, pattern, kind, func in COMPILED_ROUTES:
+            match = pattern.match(url.path)
+            if not match:
+                continue
+            allowed = True
+            if route_method != method and not (method == 'HEAD' and route_method == 'GET'):
+                continue
+            args = [int(group) for group in match.groups()]
+            if kind == 'read':
+                return await self.handle_read(target, headers, func, args, params)
+            return await self.handle_write(method, func, args, body)
+
+        if allowed:
+            raise HTTPError(405, f"不支持的请求方法: {method}")
+        raise HTTPError(404, f"未知的路径: {url.path}")
+
+    async def handle_read(self, target, headers, func, args, params):
+        revision = self.monitor.check()
+        etag = self.etag(revision)
+        if etag_matches(headers.get('if-none-match'), etag):
+            return 304, {'ETag': etag}, None
+
+        cached = self.cache.get(target)
+        if cached and cached[0] == revision:
+            self.cache.move_to_end(target)
+            payload = cached[1]
+        else:
+            if args:
+                payload = await self.pool.run(func, *args)
+            else:
+                payload = await self.pool.run(func, params)
+            self.cache[target] = (revision, payload)
+            if len(self.cache) > RESPONSE_CACHE_SIZE:
+                self.cache.popitem(last=False)
+
+        response_headers = {'ETag': etag}
+        if isinstance(payload, dict) and payload.get('updated_at'):
+            response_headers['Last-Modified'] = to_http_date(payload['updated_at'])
+        return 200, response_headers, payload
+
+    async def handle_write(self, method, func, args, body):
+        data = None
+        if method in ('POST', 'PUT'):
+            try:
+                data = json.loads(body.decode('utf-8') or '{}')
+            except (UnicodeDecodeError, ValueError):
+                raise HTTPError(400, "请求体不是有效的JSON")
+            if not isinstance(data, dict):
+                raise HTTPError(400, "请求体必须是JSON对象")
+            args = args + [data]
+
+        try:
+            payload = await self.writer.run(func, *args)
+        except sqlite3.IntegrityError as e:
+            raise HTTPError(409, str(e))
+        self.cache.clear()
+
+        if method == 'DELETE':
+            return 204, {}, None
+        return (201 if method == 'POST' else 200), {'ETag': self.etag(self.monitor.check())}, payload
+
+    async def read_headers(self, reader):
+        """读取请求头直到空行，返回 {小写的名称: 值}；某行过长或超过 MAX_HEADER_COUNT 行时抛出 HTTPError"""
+        headers = {}
+        for _ in range(MAX_HEADER_COUNT + 1):
+            try:
+                line = await reader.readline()
+            except (ValueError, asyncio.LimitOverrunError):
+                raise HTTPError(431, "请求头过长")
+            if line in (b'\r\n', b'\n', b''):
+                return headers
+            key, _, value = line.decode('latin-1').partition(':')
+            headers[key.strip().lower()] = value.strip()
+        raise HTTPError(431, f"请求头超过 {MAX_HEADER_COUNT} 行")
+
+    async def handle_connection(self, reader, writer):
+        """处理一个客户端连接（支持长连接）"""
+        try:
+            while True:
+                try:
+                    request_line = await asyncio.wait_for(reader.readline(), KEEPALIVE_TIMEOUT)
+                except asyncio.TimeoutError:
+                    break
+                except (ValueError, asyncio.LimitOverrunError):
+                    await self.send(writer, 400, {}, {"error": "请求行过长"}, False)
+                    break
+                if not request_line.strip():
+                    break
+
+                try:
+                    method, target, version = request_line.decode('latin-1').split()
+                except ValueError:
+                    await self.send(writer, 400, {}, {"error": "无效的请求行"}, False)
+                    break
+
+                # 请求头和请求体也要在超时时间内收到，停在中途的客户端不会一直占用连接
+                try:
+                    headers = await asyncio.wait_for(self.read_headers(reader), KEEPALIVE_TIMEOUT)
+                except asyncio.TimeoutError:
+                    break
+                except HTTPError as e:
+                    await self.send(writer, e.status, {}, {"error": str(e)}, False)
+                    break
+
+                connection = headers.get('connection', '').lower()
+                keep_alive = connection != 'close' if version == 'HTTP/1.1' else connection == 'keep-alive'
+
+                length = parse_content_length(headers.get('content-length'))
+                if length is None:
+                    await self.send(writer, 400, {}, {"error": "无效的 Content-Length"}, False)
+                    break
+                if length > MAX_BODY_SIZE:
+                    await self.send(writer, 413, {}, {"error": "请求体过大"}, False)
+                    break
+                try:
+                    body = await asyncio.wait_for(reader.readexactly(length), KEEPALIVE_TIMEOUT) if length else b''
+                except asyncio.TimeoutError:
+                    break
+
+                try:
+                    status, response_headers, payload = await self.dispatch(method, target, headers, body)
+                except HTTPError as e:
+                    status, response_headers, payload = e.status, {}, {"error": str(e)}
+                except Exception as e:
+                    status, response_headers, payload = 500, {}, {"error": f"服务器内部错误: {e}"}
+
+                await self.send(writer, status, response_headers, payload, keep_alive,
+                                head_only=(method == 'HEAD'))
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def send(self, writer, status, headers, payload, keep_alive, head_only=False):
+        body = b''
+        if payload is not None:
+            body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+            headers['Content-Type'] = 'application/json; charset=utf-8'
+        headers['Content-Length'] = str(len(body))
+        headers['Connection'] = 'keep-alive' if keep_alive else 'close'
+        if keep_alive:
+            headers['Keep-Alive'] = f'timeout={KEEPALIVE_TIMEOUT}'
+
+        lines = [f'HTTP/1.1 {status} {STATUS_TEXT.get(status, "")}']
+        lines.extend(f'{key}: {value}' for key, value in headers.items())
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1', 'replace'))
+        if body and not head_only:
+            writer.write(body)
+        await writer.drain()
+
+    async def serve(self, host='127.0.0.1', port=8765, unix_socket=None):
+        if unix_socket:
+            if os.path.exists(unix_socket):
+                os.unlink(unix_socket)
+            server = await asyncio.start_unix_server(self.handle_connection, unix_socket)
+            print(f"命令库服务已启动: unix:{unix_socket}")
+        else:
+            server = await asyncio.start_server(self.handle_connection, host, port)
+            print(f"命令库服务已启动: http://{host}:{port}/api/commands")
+
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.close()
+
+    def close(self):
+        self.pool.close()
+        self.writer.close()
+        self.monitor.conn.close()
+
+
+def parse_content_length(value):
+    """解析 Content-Length（没有时为0），不是非负整数时返回 None"""
+    if value is None or value == '':
+        return 0
+    if not (value.isascii() and value.isdigit()):
+        return None
+    return int(value)
+
+
+def etag_matches(header, etag):
+    """If-None-Match 是否匹配当前的实体标签（弱比较：忽略 W/ 前缀），无效的头不匹配"""
+    if not header:
+        return False
+    position = 0
+    while position < len(header):
+        match = ENTITY_TAG.match(header, position)
+        if not match or match.end() == position:
+            return False
+        if match.group(2) or match.group(1) == etag:
+            return True
+        position = match.end()
+    return False
+
+
+def to_http_date(timestamp):
+    """把SQLite的 'YYYY-MM-DD HH:MM:SS'（UTC）转换为HTTP日期格式"""
+    try:
+        parsed = time.strptime(timestamp, '%Y-%m-%d %H:%M:%S')
+    except (TypeError, ValueError):
+        return timestamp
+    return time.strftime('%a, %d %b %Y %H:%M:%S GMT', parsed)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='命令管理工具 - 本地HTTP/JSON服务')
+    parser.add_argument('--db', default=database.DB_PATH, help='数据库文件路径')
+    parser.add_argument('--host', default='127.0.0.1', help='监听地址（默认仅本机）')
+    parser.add_argument('--port', type=int, default=8765, help='监听端口（默认8765）')
+    parser.add_argument('--unix', help='改为监听unix socket文件')
+    parser.add_argument('--pool-size', type=int, default=4, help='只读连接数（默认4）')
+    args = parser.parse_args(argv)
+
+    server = CommandServer(args.db, args.pool_size)
+    try:
+        asyncio.run(server.serve(args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        print("服务已停止")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+导出Shell别名
+把设置了别名（commands.alias_name）的命令导出为 aliases.sh（bash/sh）、
+functions.zsh 和 functions.fish，在shell启动文件中加载后即可直接使用。
+
+shell每次启动时都可以运行导出：先比较数据库文件和状态文件的修改时间，
+数据库没有写入过就不打开数据库；导出命令的 id、别名、updated_at、内容哈希和标签
+都没有变化时不重写文件。文件先写入同目录的临时文件再替换，
+shell不会读到写了一半的文件。
+（本模块不依赖tkinter）
+"""
+
+import hashlib
+import json
+import os
+import re
+import tempfile
+
+import templates
+
+# 别名只能包含字母、数字、下划线、点和减号，不能以数字或减号开头
+ALIAS_PATTERN = re.compile(r'^[A-Za-z_][\w.-]*$', re.ASCII)
+
+# shell关键字和常用内建命令，不能作为别名
+RESERVED_NAMES = {
+    'alias', 'and', 'begin', 'builtin', 'case', 'cd', 'command', 'do', 'done', 'elif', 'else',
+    'end', 'esac', 'eval', 'exec', 'exit', 'export', 'fi', 'for', 'function', 'if', 'in', 'not',
+    'or', 'return', 'select', 'set', 'source', 'switch', 'test', 'then', 'time', 'unalias',
+    'unset', 'until', 'while',
+}
+
+OUTPUT_FILES = {
+    'sh': 'aliases.sh',
+    'zsh': 'functions.zsh',
+    'fish': 'functions.fish',
+}
+
+# 保存上次导出指纹的状态文件，修改时间与导出时的数据库修改时间相同
+STATE_FILE = '.export_state'
+
+EXPORT_QUERY = '''
+    SELECT id, alias_name, name, command, updated_at, content_hash, tags
+    FROM commands WHERE alias_name IS NOT NULL ORDER BY alias_name
+'''
+
+# 使用位置参数的命令（不能像别名那样把参数追加到末尾）
+POSITIONAL_PARAMETER = re.compile(r'\$(?:[0-9@*#]|\{[0-9@*#])')
+# fish 不支持的 sh 语法，包含这些语法的命令在 fish 中通过 bash -c 执行
+SH_ONLY_SYNTAX = re.compile(r'`|\$[{(]|\[\[|<<|;;|\b(?:then|fi|do|done|esac)\b|^\s*\w+=')
+
+HEADER = '# 由命令管理工具生成，请勿手动修改（cm export-shell）\n'
+
+
+def validate_alias(alias_name):
+    """检查别名，返回去掉首尾空白的别名（空字符串返回 None）；无效时抛出 ValueError"""
+    alias_name = (alias_name or '').strip()
+    if not alias_name:
+        return None
+    if not ALIAS_PATTERN.match(alias_name):
+        raise ValueError(f"别名 {alias_name} 无效：只能包含字母、数字、下划线、点和减号，且不能以数字开头")
+    if alias_name in RESERVED_NAMES:
+        raise ValueError(f"别名 {alias_name} 是shell关键字或内建命令")
+    return alias_name
+
+
+def default_output_dir(data_dir):
+    return os.path.join(data_dir, 'shell')
+
+
+def sh_quote(text):
+    return "'" + text.replace("'", "'\\''") + "'"
+
+
+def fish_quote(text):
+    return "'" + text.replace('\\', '\\\\').replace("'", "\\'") + "'"
+
+
+def positional_body(command, tags):
+    """命令模板的占位符依次替换为位置参数 ${1}、${2:-默认值}……，不是模板时返回 None"""
+    if not templates.is_template_command(tags):
+        return None
+    try:
+        template = templates.compile_template(command)
+    except templates.TemplateError:
+        return None
+    if not template.is_template:
+        return None
+    values = {field.name: f'${{{number}:-{field.default}}}' if field.default is not None else f'${{{number}}}'
+              for number, field in enumerate(template.fields, 1)}
+    return template.render(values, validate=False)
+
+
+def command_body(command, tags):
+    """返回 (sh语法的命令内容, 是否可以写成别名)"""
+    command = command.strip()
+    body = positional_body(command, tags)
+    if body is not None:
+        return body, False
+    simple = '\n' not in command and not POSITIONAL_PARAMETER.search(command)
+    return command, simple
+
+
+def render_sh(rows, function_keyword=False):
+    """bash/sh（function_keyword 为 False）或 zsh 的别名文件内容"""
+    lines = [HEADER]
+    for _, alias_name, name, command, _, _, tags in rows:
+        body, simple = command_body(command, tags)
+        lines.append(f'\n# {" ".join(name.split())}\n')
+        if simple:
+            lines.append(f'alias {alias_name}={sh_quote(body)}\n')
+        else:
+            # 先删除同名别名，否则定义函数时函数名会被当作别名展开
+            lines.append(f'unalias {alias_name} 2>/dev/null\n')
+            opening = f'function {alias_name} {{' if function_keyword else f'{alias_name}() {{'
+            lines.append(f'{opening}\n{body}\n}}\n')
+    return ''.join(lines)
+
+
+def render_fish(rows):
+    """fish 的函数文件内容"""
+    lines = [HEADER]
+    for _, alias_name, name, command, _, _, tags in rows:
+        body, simple = command_body(command, tags)
+        description = fish_quote(' '.join(name.split()))
+        lines.append(f'\nfunction {alias_name} --description {description}\n')
+        if simple and not SH_ONLY_SYNTAX.search(body):
+            lines.append(f'    {body} $argv\n')
+        else:
+            lines.append(f'    bash -c {fish_quote(body)} {alias_name} $argv\n')
+        lines.append('end\n')
+    return ''.join(lines)
+
+
+def render_all(rows):
+    """{文件名: 内容}"""
+    return {
+        OUTPUT_FILES['sh']: render_sh(rows),
+        OUTPUT_FILES['zsh']: render_sh(rows, function_keyword=True),
+        OUTPUT_FILES['fish']: render_fish(rows),
+    }
+
+
+def fingerprint(db_path, rows):
+    """导出命令的 id、别名、名称、updated_at、内容哈希和标签的摘要"""
+    digest = hashlib.sha1(os.path.abspath(db_path).encode('utf-8'))
+    for command_id, alias_name, name, _, updated_at, content_hash, tags in rows:
+        digest.update(json.dumps([command_id, alias_name, name, updated_at, content_hash, tags],
+                                 ensure_ascii=False).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def database_mtime(db_path):
+    """数据库文件和WAL文件中较新的修改时间（纳秒）"""
+    mtime = os.stat(db_path).st_mtime_ns
+    try:
+        mtime = max(mtime, os.stat(db_path + '-wal').st_mtime_ns)
+    except FileNotFoundError:
+        pass
+    return mtime
+
+
+def write_atomic(path, text):
+    """先写入同目录的临时文件再替换目标文件"""
+    fd, temp_path = tempfile.mkstemp(prefix='.' + os.path.basename(path) + '.', dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8', newline='\n') as f:
+            f.write(text)
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
+        raise
+
+
+def read_state(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def export_aliases(db_path, output_dir, force=False, connect=None):
+    """导出别名文件，返回 {'opened': 是否打开了数据库, 'count': 导出命令数, 'written': [重写的文件名]}
+
+    connect(db_path) 返回只读数据库连接（默认使用 sqlite3 只读打开）。
+    """
+    stats = {'opened': False, 'count': None, 'written': []}
+    state_path = os.path.join(output_dir, STATE_FILE)
+    paths = [os.path.join(output_dir, filename) for filename in OUTPUT_FILES.values()]
+
+    # 修改时间要在读取数据库之前取得：读取期间的写入会让数据库比状态文件新，下次不会遗漏
+    mtime = database_mtime(db_path)
+    if not force and all(os.path.exists(path) for path in paths):
+        try:
+            if os.stat(state_path).st_mtime_ns >= mtime:
+                return stats
+        except FileNotFoundError:
+            pass
+
+    if connect is None:
+        import sqlite3
+
+        def connect(path):
+            return sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+
+    conn = connect(db_path)
+    try:
+        rows = conn.execute(EXPORT_QUERY).fetchall()
+    finally:
+        conn.close()
+    stats['opened'] = True
+    stats['count'] = len(rows)
+
+    os.makedirs(output_dir, exist_ok=True)
+    state = read_state(state_path)
+    digest = fingerprint(db_path, rows)
+    if force or state.get('fingerprint') != digest or not all(os.path.exists(path) for path in paths):
+        for filename, text in render_all(rows).items():
+            path = os.path.join(output_dir, filename)
+            try:
+                with open(path, 'r', encoding='utf-8', newline='') as f:
+                    if f.read() == text:
+                        continue
+            except OSError:
+                pass
+            write_atomic(path, text)
+            stats['written'].append(filename)
+        write_atomic(state_path, json.dumps({'fingerprint': digest, 'count': len(rows)}))
+    os.utime(state_path, ns=(mtime, mtime))
+    return stats
+
+
+def init_snippet(shell, db_path, output_dir, command):
+    """加入shell启动文件的代码：数据库比状态文件新时才运行导出（不启动Python），然后加载别名文件
+
+    command 为运行 cm 的命令行（已转义）。
+    """
+    db_path = os.path.abspath(db_path)
+    state = os.path.join(output_dir, STATE_FILE)
+    export = f'{command} --db {sh_quote(db_path)} export-shell -q -o {sh_quote(output_dir)}'
+    if shell == 'fish':
+        path = os.path.join(output_dir, OUTPUT_FILES['fish'])
+        return (f'if test {fish_quote(db_path)} -nt {fish_quote(state)}; '
+                f'or test {fish_quote(db_path + "-wal")} -nt {fish_quote(state)}\n'
+                f'    {export}\n'
+                f'end\n'
+                f'test -r {fish_quote(path)}; and source {fish_quote(path)}\n')
+    path = os.path.join(output_dir, OUTPUT_FILES['zsh' if shell == 'zsh' else 'sh'])
+    return (f'if [ {sh_quote(db_path)} -nt {sh_quote(state)} ] '
+            f'|| [ {sh_quote(db_path + "-wal")} -nt {sh_quote(state)} ]; then\n'
+            f'    {export}\n'
+            f'fi\n'
+            f'[ -r {sh_quote(path)} ] && . {sh_quote(path)}\n')
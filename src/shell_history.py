@@ -0,0 +1,415 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Shell历史导入
+从 bash、zsh（扩展格式）和 fish 的历史文件中收集常用命令。每个文件记录已读取到的
+字节位置和该位置之前一段内容的摘要，再次导入时摘要相同则只读取新增的内容；文件被
+替换、截断或原地重写（例如bash按 HISTFILESIZE 删除旧记录）时从头读取，并替换该文件
+之前的统计。历史记录合并多行命令、去掉空白差异后按内容哈希（与 commands.content_hash
+相同）去重，已经保存过的命令直接跳过，其余命令按文件统计使用次数和时间
+（history_file_counts），各文件合计后写入候选表 history_candidates，由用户挑选后
+添加到命令库。
+（本模块不依赖tkinter）
+"""
+
+import hashlib
+import os
+import re
+import time
+
+import database
+from usage import frecency_weight
+
+# 候选状态
+CANDIDATE_NEW = 0
+CANDIDATE_ADDED = 1
+CANDIDATE_IGNORED = 2
+
+# 每次读取的字节数，以及每累计多少条历史记录写入一次数据库
+READ_SIZE = 1024 * 1024
+BATCH_ENTRIES = 100000
+# 读取位置之前用于判断文件是否被重写的字节数
+FINGERPRINT_SIZE = 4096
+
+# 太短或过于常见的命令不作为候选
+MIN_COMMAND_LENGTH = 6
+IGNORED_PROGRAMS = {'ls', 'll', 'la', 'cd', 'pwd', 'clear', 'exit', 'history', 'fg', 'bg', 'jobs',
+                    'cls', 'logout', 'which', 'man', 'echo', 'vim', 'vi', 'nano', 'cat', 'less', 'top'}
+
+# 添加到命令库时使用的分类和标签
+IMPORT_CATEGORY = 'Shell历史'
+IMPORT_TAG = 'shell-history'
+
+ZSH_EXTENDED = re.compile(rb'^: *(\d+):\d+;')
+BASH_TIMESTAMP = re.compile(rb'^#(\d{9,11})$')
+FISH_CMD = b'- cmd: '
+FISH_WHEN = re.compile(rb'^ +when: *(\d+)')
+
+
+def create_tables(cursor):
+    """历史文件读取位置表、按文件统计的次数表和候选命令表"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS shell_history_files (
+            path TEXT PRIMARY KEY,
+            format TEXT NOT NULL,
+            inode INTEGER,
+            offset INTEGER NOT NULL DEFAULT 0,
+            fingerprint TEXT,
+            updated_at REAL
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS history_candidates (
+            content_hash TEXT PRIMARY KEY,
+            command TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            score REAL NOT NULL,
+            first_seen REAL,
+            last_seen REAL,
+            status INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_history_candidates_score ON history_candidates (status, score DESC)')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS history_file_counts (
+            content_hash TEXT NOT NULL,
+            path TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            score REAL NOT NULL,
+            first_seen REAL,
+            last_seen REAL,
+            PRIMARY KEY (content_hash, path)
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_history_file_counts_path ON history_file_counts (path)')
+    cursor.execute('PRAGMA table_info(shell_history_files)')
+    if 'fingerprint' not in {row[1] for row in cursor.fetchall()}:
+        # 旧版本没有按文件记录次数：从头重新读取所有历史文件，重新统计候选命令的次数
+        cursor.execute('ALTER TABLE shell_history_files ADD COLUMN fingerprint TEXT')
+        cursor.execute('UPDATE shell_history_files SET offset = 0')
+        cursor.execute('UPDATE history_candidates SET count = 0, score = 0')
+
+
+def default_history_files():
+    """当前用户存在的历史文件 [(路径, 格式)]"""
+    home = os.path.expanduser('~')
+    candidates = [
+        (os.path.join(home, '.bash_history'), 'bash'),
+        (os.environ.get('HISTFILE') or os.path.join(home, '.zsh_history'), None),
+        (os.path.join(os.environ.get('XDG_DATA_HOME') or os.path.join(home, '.local', 'share'),
+                      'fish', 'fish_history'), 'fish'),
+    ]
+    files = []
+    for path, file_format in candidates:
+        if os.path.isfile(path) and path not in [existing for existing, _ in files]:
+            files.append((path, file_format or detect_format(path)))
+    return files
+
+
+def detect_format(path):
+    """根据文件名和第一行判断历史文件格式（bash / zsh / fish）"""
+    name = os.path.basename(path)
+    if 'fish' in name:
+        return 'fish'
+    with open(path, 'rb') as f:
+        first_line = f.readline()
+    if first_line.startswith(FISH_CMD):
+        return 'fish'
+    if 'zsh' in name or ZSH_EXTENDED.match(first_line):
+        return 'zsh'
+    return 'bash'
+
+
+def read_lines(f, offset):
+    """从 offset 开始逐行读取，返回 (行内容, 行结束位置)；最后不完整的一行（还在写入）不返回"""
+    f.seek(offset)
+    position = offset
+    pending = b''
+    while True:
+        chunk = f.read(READ_SIZE)
+        if not chunk:
+            return
+        lines = (pending + chunk).split(b'\n')
+        pending = lines.pop()
+        for line in lines:
+            position += len(line) + 1
+            yield line, position
+
+
+def unmetafy(data):
+    """zsh 把部分字节写成 0x83 加上异或 32 后的字节"""
+    if b'\x83' not in data:
+        return data
+    result = bytearray()
+    meta = False
+    for byte in data:
+        if meta:
+            result.append(byte ^ 32)
+            meta = False
+        elif byte == 0x83:
+            meta = True
+        else:
+            result.append(byte)
+    return bytes(result)
+
+
+def decode(data):
+    return data.decode('utf-8', errors='replace')
+
+
+def parse_bash(lines):
+    """bash 历史：可选的 #时间戳 行后面是命令，以反斜杠结尾的行与下一行合并"""
+    timestamp = None
+    parts = []
+    for line, end in lines:
+        if not parts:
+            match = BASH_TIMESTAMP.match(line)
+            if match:
+                timestamp = int(match.group(1))
+                continue
+        if line.endswith(b'\\'):
+            parts.append(line[:-1])
+            continue
+        parts.append(line)
+        yield decode(b'\n'.join(parts)), timestamp, end
+        parts = []
+        timestamp = None
+
+
+def parse_zsh(lines):
+    """zsh 历史（扩展格式 ': 开始时间:耗时;命令' 或普通格式），多行命令的换行写为反斜杠加换行"""
+    timestamp = None
+    parts = []
+    for line, end in lines:
+        if not parts:
+            match = ZSH_EXTENDED.match(line)
+            timestamp = int(match.group(1)) if match else None
+            if match:
+                line = line[match.end():]
+        if line.endswith(b'\\'):
+            parts.append(line[:-1])
+            continue
+        parts.append(line)
+        yield decode(unmetafy(b'\n'.join(parts))), timestamp, end
+        parts = []
+
+
+def parse_fish(lines):
+    """fish 历史：'- cmd: 命令' 开始一条记录，后面缩进的 when/paths 行属于同一条记录"""
+    command = timestamp = None
+    start = None
+    for line, end in lines:
+        if line.startswith(FISH_CMD):
+            if command is not None:
+                yield command, timestamp, start
+            command = unescape_fish(decode(line[len(FISH_CMD):]))
+            timestamp = None
+        elif command is not None:
+            match = FISH_WHEN.match(line)
+            if match:
+                timestamp = int(match.group(1))
+        start = end
+    if command is not None:
+        yield command, timestamp, start
+
+
+def unescape_fish(text):
+    if '\\' not in text:
+        return text
+    return re.sub(r'\\(.)', lambda match: '\n' if match.group(1) == 'n' else match.group(1), text)
+
+
+PARSERS = {'bash': parse_bash, 'zsh': parse_zsh, 'fish': parse_fish}
+
+
+def is_candidate(command):
+    """过滤太短或过于常见的命令"""
+    words = command.split(None, 1)
+    return len(command) >= MIN_COMMAND_LENGTH and bool(words) and words[0] not in IGNORED_PROGRAMS
+
+
+def read_fingerprint(f, offset):
+    """offset 之前 FINGERPRINT_SIZE 字节的摘要"""
+    start = max(0, offset - FINGERPRINT_SIZE)
+    f.seek(start)
+    return hashlib.sha1(f.read(offset - start)).hexdigest()
+
+
+class HistoryIngester:
+    """增量导入历史文件到候选表
+
+    一次导入中各文件的记录先在内存中按 (文件, 命令) 汇总（每个不同的命令只计算一次哈希），
+    每累计 BATCH_ENTRIES 条记录在一个事务中写入按文件统计的次数、候选表和文件读取位置。
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.stored_hashes = None
+        self.pending = {}          # (路径, 规范化命令) -> [次数, 分数, 最早时间, 最晚时间, 原始命令]
+        self.pending_offsets = {}  # 路径 -> (格式, inode, 读取位置)
+        self.reset_paths = set()   # 从头读取、需要替换之前统计的文件
+        self.pending_entries = 0
+        self.stats = {'files': 0, 'bytes': 0, 'entries': 0, 'skipped': 0, 'new_candidates': 0}
+
+    def ingest(self, files=None):
+        """导入历史文件 [(路径, 格式或None)]（默认为当前用户的历史文件），返回统计信息"""
+        start = time.perf_counter()
+        self.stored_hashes = {row[0] for row in self.conn.execute('SELECT content_hash FROM commands')}
+        for path, file_format in (files if files is not None else default_history_files()):
+            self.ingest_file(path, file_format or detect_format(path))
+        self.flush()
+        self.stats['seconds'] = round(time.perf_counter() - start, 3)
+        return self.stats
+
+    def resume_offset(self, f, path, stat):
+        """上次读取到的位置；文件被替换（inode变化）、截断或原地重写时返回 0"""
+        row = self.conn.execute('SELECT inode, offset, fingerprint FROM shell_history_files WHERE path = ?',
+                                (path,)).fetchone()
+        if not row or row[0] != stat.st_ino or row[1] > stat.st_size:
+            return 0
+        if row[2] is None or read_fingerprint(f, row[1]) != row[2]:
+            return 0
+        return row[1]
+
+    def ingest_file(self, path, file_format):
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        self.stats['files'] += 1
+        now = time.time()
+        with open(path, 'rb') as f:
+            offset = self.resume_offset(f, path, stat)
+            if offset and offset == stat.st_size:
+                return
+            if not offset:
+                # 从头读取的文件替换之前的统计（在下一次写入数据库时删除）
+                self.reset_paths.add(path)
+                self.pending_offsets[path] = (file_format, stat.st_ino, 0)
+
+            end = offset
+            for command, timestamp, end in PARSERS[file_format](read_lines(f, offset)):
+                self.add(path, command, timestamp or now)
+                self.pending_offsets[path] = (file_format, stat.st_ino, end)
+                if self.pending_entries >= BATCH_ENTRIES:
+                    self.flush()
+        self.stats['bytes'] += end - offset
+
+    def add(self, path, command, timestamp):
+        self.stats['entries'] += 1
+        self.pending_entries += 1
+        command = command.strip()
+        key = (path, database.normalize_command(command))
+        item = self.pending.get(key)
+        if item is None:
+            self.pending[key] = [1, frecency_weight(timestamp), timestamp, timestamp, command]
+        else:
+            item[0] += 1
+            item[1] += frecency_weight(timestamp)
+            item[2] = min(item[2], timestamp)
+            item[3] = max(item[3], timestamp)
+            item[4] = command
+
+    def flush(self):
+        """在一个事务中写入按文件统计的次数、各文件合计后的候选命令和文件读取位置"""
+        cursor = self.conn.cursor()
+        changed = set()
+        for path in self.reset_paths:
+            cursor.execute('SELECT content_hash FROM history_file_counts WHERE path = ?', (path,))
+            changed.update(row[0] for row in cursor.fetchall())
+            cursor.execute('DELETE FROM history_file_counts WHERE path = ?', (path,))
+
+        hashes = {}
+        updates = []
+        commands = {}
+        for (path, key), (count, score, first_seen, last_seen, command) in self.pending.items():
+            if not is_candidate(key):
+                self.stats['skipped'] += count
+                continue
+            content_hash = hashes.get(key)
+            if content_hash is None:
+                content_hash = hashes[key] = database.make_content_hash(key)
+            if content_hash in self.stored_hashes:
+                self.stats['skipped'] += count
+                continue
+            updates.append((count, score, first_seen, last_seen, content_hash, path))
+            commands[content_hash] = command
+            changed.add(content_hash)
+
+        cursor.executemany('''
+            UPDATE history_file_counts SET count = count + ?, score = score + ?,
+            first_seen = MIN(first_seen, ?), last_seen = MAX(last_seen, ?)
+            WHERE content_hash = ? AND path = ?
+        ''', updates)
+        cursor.executemany('''
+            INSERT OR IGNORE INTO history_file_counts (count, score, first_seen, last_seen, content_hash, path)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', updates)
+
+        cursor.executemany('UPDATE history_candidates SET command = ? WHERE content_hash = ?',
+                           [(command, content_hash) for content_hash, command in commands.items()])
+        before = self.conn.total_changes
+        cursor.executemany('''
+            INSERT OR IGNORE INTO history_candidates (command, content_hash, count, score) VALUES (?, ?, 0, 0)
+        ''', [(command, content_hash) for content_hash, command in commands.items()])
+        self.stats['new_candidates'] += self.conn.total_changes - before
+        # 候选命令的次数、分数和时间是各文件统计的合计
+        cursor.executemany('''
+            UPDATE history_candidates SET (count, score, first_seen, last_seen) = (
+                SELECT COALESCE(SUM(count), 0), COALESCE(SUM(score), 0), MIN(first_seen), MAX(last_seen)
+                FROM history_file_counts WHERE content_hash = history_candidates.content_hash)
+            WHERE content_hash = ?
+        ''', [(content_hash,) for content_hash in changed])
+        # 已经不在任何历史文件中、也没有处理过的候选命令
+        cursor.execute('DELETE FROM history_candidates WHERE count = 0 AND status = ?', (CANDIDATE_NEW,))
+
+        offsets = []
+        for path, (file_format, inode, offset) in self.pending_offsets.items():
+            with open(path, 'rb') as f:
+                offsets.append((path, file_format, inode, offset, read_fingerprint(f, offset), time.time()))
+        cursor.executemany('''
+            INSERT OR REPLACE INTO shell_history_files (path, format, inode, offset, fingerprint, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', offsets)
+        self.conn.commit()
+
+        self.pending = {}
+        self.pending_offsets = {}
+        self.reset_paths = set()
+        self.pending_entries = 0
+
+
+def list_candidates(conn, limit=200, min_count=1):
+    """未处理的候选命令，返回 [(内容哈希, 命令, 次数, 最后使用时间)]，按分数倒序"""
+    cursor = conn.execute('''
+        SELECT content_hash, command, count, last_seen FROM history_candidates
+        WHERE status = ? AND count >= ? AND content_hash NOT IN (SELECT content_hash FROM commands)
+        ORDER BY score DESC LIMIT ?
+    ''', (CANDIDATE_NEW, min_count, limit))
+    return cursor.fetchall()
+
+
+def make_name(command):
+    """由命令生成命令名称：第一行，过长时截断"""
+    first_line = command.strip().splitlines()[0] if command.strip() else command
+    return first_line if len(first_line) <= 40 else first_line[:37] + '...'
+
+
+def add_candidates(cursor, content_hashes):
+    """把候选命令添加到命令库（分类为 IMPORT_CATEGORY，带 IMPORT_TAG 标签，不提交事务），返回新命令ID"""
+    if not content_hashes:
+        return []
+    category_id = database.get_category_id(cursor, IMPORT_CATEGORY, create=True)
+    command_ids = []
+    for content_hash in content_hashes:
+        cursor.execute('SELECT command FROM history_candidates WHERE content_hash = ? AND status = ?',
+                       (content_hash, CANDIDATE_NEW))
+        row = cursor.fetchone()
+        if row:
+            command_ids.append(database.insert_command(cursor, make_name(row[0]), row[0], category_id,
+                                                       tags=[IMPORT_TAG]))
+    set_status(cursor, content_hashes, CANDIDATE_ADDED)
+    return command_ids
+
+
+def set_status(cursor, content_hashes, status):
+    cursor.executemany('UPDATE history_candidates SET status = ? WHERE content_hash = ?',
+                       [(status, content_hash) for content_hash in content_hashes])
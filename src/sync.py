@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+多台电脑之间同步命令库
+触发器把每次增删改追加到 change_log（只追加），导出时只打包指定修订号之后
+有变化的行的最新状态，导入时按 updated_at 以后写入者为准合并。
+行在不同数据库之间通过 uuid 列对应（各数据库中的自增ID互不相同）。
+"""
+
+import gzip
+import hashlib
+import json
+import sqlite3
+import uuid
+
+import database
+import tags as tagging
+
+SYNC_FORMAT = 'command_manager_sync'
+SYNC_VERSION = 1
+
+# 同步的表及其内容列（按导入顺序排列：命令引用分类）
+SYNC_TABLES = {
+    'categories': ('name', 'description'),
+    'commands': ('name', 'command', 'category_id', 'description', 'is_favorite', 'tags'),
+    'notes': ('title', 'content', 'category', 'tags'),
+}
+
+# 触发器写入的时间戳（UTC，毫秒精度，可与 CURRENT_TIMESTAMP 按字符串比较）
+NOW = "strftime('%Y-%m-%d %H:%M:%f', 'now')"
+
+
+def create_tables(cursor):
+    """添加 uuid/updated_at 列，创建修改日志表和触发器"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS change_log (
+            revision INTEGER PRIMARY KEY AUTOINCREMENT,
+            table_name TEXT NOT NULL,
+            row_uuid TEXT NOT NULL,
+            op TEXT NOT NULL,
+            changed_at TEXT NOT NULL
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_change_log_row ON change_log (table_name, row_uuid)')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS sync_state (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        )
+    ''')
+    cursor.execute('INSERT OR IGNORE INTO sync_state (key, value) VALUES (?, ?)', ('node_id', uuid.uuid4().hex))
+
+    for table, columns in SYNC_TABLES.items():
+        cursor.execute(f'PRAGMA table_info({table})')
+        existing = {row[1] for row in cursor.fetchall()}
+        if 'updated_at' not in existing:
+            cursor.execute(f'ALTER TABLE {table} ADD COLUMN updated_at TIMESTAMP')
+            cursor.execute(f'UPDATE {table} SET updated_at = created_at')
+        if 'uuid' not in existing:
+            cursor.execute(f'ALTER TABLE {table} ADD COLUMN uuid TEXT')
+            backfill_uuids(cursor, table)
+        cursor.execute(f'CREATE UNIQUE INDEX IF NOT EXISTS idx_{table}_uuid ON {table} (uuid)')
+
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_sync_insert
+            AFTER INSERT ON {table}
+            BEGIN
+                UPDATE {table} SET uuid = COALESCE(uuid, lower(hex(randomblob(16)))),
+                                   updated_at = COALESCE(updated_at, {NOW})
+                WHERE id = NEW.id;
+                INSERT INTO change_log (table_name, row_uuid, op, changed_at)
+                VALUES ('{table}', (SELECT uuid FROM {table} WHERE id = NEW.id), 'I', {NOW});
+            END
+        ''')
+        # 没有显式修改 updated_at 的更新（收藏、移动分类、撤销等）自动刷新修改时间
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_sync_update
+            AFTER UPDATE OF {', '.join(columns)} ON {table}
+            BEGIN
+                UPDATE {table} SET updated_at = {NOW}
+                WHERE id = NEW.id AND NEW.updated_at IS OLD.updated_at;
+                INSERT INTO change_log (table_name, row_uuid, op, changed_at)
+                VALUES ('{table}', NEW.uuid, 'U', {NOW});
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_sync_delete
+            AFTER DELETE ON {table}
+            BEGIN
+                INSERT INTO change_log (table_name, row_uuid, op, changed_at)
+                VALUES ('{table}', OLD.uuid, 'D', {NOW});
+            END
+        ''')
+
+
+def backfill_uuids(cursor, table):
+    """为已有的行生成 uuid 并写入初始修改日志
+
+    uuid 由行ID和创建时间计算，手工复制到多台电脑的同一个数据库会得到相同的 uuid，
+    第一次同步时不会产生重复的行。
+    """
+    cursor.execute(f'SELECT id, created_at, updated_at FROM {table} WHERE uuid IS NULL')
+    rows = cursor.fetchall()
+    cursor.executemany(f'UPDATE {table} SET uuid = ? WHERE id = ?',
+                       [(hashlib.sha1(f'{table}:{row_id}:{created_at}'.encode('utf-8')).hexdigest()[:32], row_id)
+                        for row_id, created_at, _ in rows])
+    cursor.executemany(f'''
+        INSERT INTO change_log (table_name, row_uuid, op, changed_at)
+        SELECT ?, uuid, 'I', COALESCE(?, ?) FROM {table} WHERE id = ?
+    ''', [(table, updated_at, created_at, row_id) for row_id, created_at, updated_at in rows])
+
+
+def current_revision(conn):
+    """本数据库的最新同步修订号"""
+    return conn.execute('SELECT COALESCE(MAX(revision), 0) FROM change_log').fetchone()[0]
+
+
+def node_id(conn):
+    return conn.execute("SELECT value FROM sync_state WHERE key = 'node_id'").fetchone()[0]
+
+
+def read_row(conn, table, row_uuid):
+    """读取一行的同步数据（命令的分类用分类 uuid 和名称表示），行不存在返回 None"""
+    columns = SYNC_TABLES[table]
+    row = conn.execute(f'SELECT {", ".join(columns)}, created_at, updated_at FROM {table} WHERE uuid = ?',
+                       (row_uuid,)).fetchone()
+    if row is None:
+        return None
+    data = dict(zip(columns + ('created_at', 'updated_at'), row))
+    if table == 'commands':
+        category = conn.execute('SELECT uuid, name FROM categories WHERE id = ?',
+                                (data.pop('category_id'),)).fetchone()
+        data['category_uuid'], data['category_name'] = category or (None, None)
+    return data
+
+
+def export_since(conn, since=0):
+    """导出修订号 since 之后的修改，每行只保留最新状态"""
+    until = current_revision(conn)
+    cursor = conn.execute('''
+        SELECT table_name, row_uuid, op, changed_at FROM change_log
+        WHERE revision IN (
+            SELECT MAX(revision) FROM change_log WHERE revision > ? GROUP BY table_name, row_uuid
+        )
+        ORDER BY revision
+    ''', (since,))
+
+    changes = []
+    for table, row_uuid, op, changed_at in cursor.fetchall():
+        if table not in SYNC_TABLES or not row_uuid:
+            continue
+        data = read_row(conn, table, row_uuid) if op != 'D' else None
+        if data is None:
+            changes.append({"table": table, "uuid": row_uuid, "op": "delete", "changed_at": changed_at})
+        else:
+            changes.append({"table": table, "uuid": row_uuid, "op": "upsert", "data": data})
+
+    return {
+        "format": SYNC_FORMAT,
+        "version": SYNC_VERSION,
+        "node": node_id(conn),
+        "since": since,
+        "until": until,
+        "changes": changes,
+    }
+
+
+def is_newer(remote_time, remote_data, local_time, local_data):
+    """以后写入者为准；时间相同时比较内容，使两端得到相同的结果"""
+    remote_key = (remote_time or '', json.dumps(remote_data, ensure_ascii=False, sort_keys=True))
+    local_key = (local_time or '', json.dumps(local_data, ensure_ascii=False, sort_keys=True))
+    return remote_key > local_key
+
+
+def deleted_at(cursor, table, row_uuid):
+    """本地最近一次删除该行的时间"""
+    cursor.execute('''
+        SELECT MAX(changed_at) FROM change_log WHERE table_name = ? AND row_uuid = ? AND op = 'D'
+    ''', (table, row_uuid))
+    return cursor.fetchone()[0]
+
+
+def resolve_category(cursor, category_uuid, category_name):
+    """按 uuid 找到本地分类，找不到时按名称查找或创建"""
+    if category_uuid:
+        cursor.execute('SELECT id FROM categories WHERE uuid = ?', (category_uuid,))
+        row = cursor.fetchone()
+        if row:
+            return row[0]
+    return database.get_category_id(cursor, category_name, create=True)
+
+
+def apply_changes(conn, delta):
+    """在一个事务中导入 export_since 导出的修改，返回统计 {applied, skipped, conflicts}"""
+    if delta.get('format') != SYNC_FORMAT or delta.get('version') != SYNC_VERSION:
+        raise ValueError("不是有效的同步文件")
+
+    stats = {'applied': 0, 'skipped': 0, 'conflicts': 0}
+    order = {table: index for index, table in enumerate(SYNC_TABLES)}
+    changes = sorted((change for change in delta.get('changes', []) if change.get('table') in order),
+                     key=lambda change: order[change['table']])
+
+    cursor = conn.cursor()
+    try:
+        for change in changes:
+            if change['op'] == 'delete':
+                result = apply_delete(cursor, change['table'], change['uuid'], change['changed_at'])
+            else:
+                result = apply_upsert(conn, cursor, change['table'], change['uuid'], change['data'])
+            stats[result] += 1
+
+        if delta.get('node'):
+            cursor.execute('INSERT OR REPLACE INTO sync_state (key, value) VALUES (?, ?)',
+                           (f"peer:{delta['node']}", str(delta.get('until', 0))))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return stats
+
+
+def apply_delete(cursor, table, row_uuid, changed_at):
+    cursor.execute(f'SELECT id, updated_at FROM {table} WHERE uuid = ?', (row_uuid,))
+    row = cursor.fetchone()
+    if row is None:
+        return 'skipped'
+    row_id, updated_at = row
+    if (updated_at or '') > changed_at:
+        # 本地在对方删除之后又修改过，保留本地
+        return 'conflicts'
+    if table == 'categories':
+        cursor.execute('UPDATE commands SET category_id = NULL WHERE category_id = ?', (row_id,))
+    cursor.execute(f'DELETE FROM {table} WHERE id = ?', (row_id,))
+    return 'applied'
+
+
+def apply_upsert(conn, cursor, table, row_uuid, data):
+    local = read_row(conn, table, row_uuid)
+    if local == data:
+        return 'skipped'
+
+    if local is not None:
+        if not is_newer(data.get('updated_at'), data, local['updated_at'], local):
+            return 'conflicts'
+    else:
+        removed_at = deleted_at(cursor, table, row_uuid)
+        if removed_at and removed_at > (data.get('updated_at') or ''):
+            # 本地在对方修改之后删除了该行
+            return 'conflicts'
+
+    # 旧版本导出的数据中没有的列（例如标签）保留本地的值
+    values = {column: data.get(column) for column in SYNC_TABLES[table]
+              if column != 'category_id' and (column in data or local is None)}
+    if values.get('tags'):
+        tagging.ensure_tags(cursor, values['tags'])
+    values['created_at'] = data.get('created_at')
+    values['updated_at'] = data.get('updated_at')
+    if table == 'commands':
+        values['category_id'] = resolve_category(cursor, data.get('category_uuid'), data.get('category_name'))
+        values['command_preview'] = database.make_command_preview(values['command'])
+        values['content_hash'] = database.make_content_hash(values['command'])
+
+    if table == 'categories' and local is None:
+        # 两台电脑分别创建的同名分类合并为一个
+        cursor.execute('SELECT id FROM categories WHERE name = ?', (values['name'],))
+        if cursor.fetchone():
+            return 'skipped'
+
+    columns = list(values)
+    try:
+        if local is not None:
+            assignments = ', '.join(f'{column} = ?' for column in columns)
+            cursor.execute(f'UPDATE {table} SET {assignments} WHERE uuid = ?',
+                           [values[column] for column in columns] + [row_uuid])
+        else:
+            placeholders = ','.join('?' * (len(columns) + 1))
+            cursor.execute(f'INSERT INTO {table} ({", ".join(columns)}, uuid) VALUES ({placeholders})',
+                           [values[column] for column in columns] + [row_uuid])
+    except sqlite3.IntegrityError:
+        # 分类改名与本地其他分类重名
+        return 'conflicts'
+    return 'applied'
+
+
+def write_delta(delta, path):
+    """写入同步文件，扩展名为 .gz 时压缩"""
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'wt', encoding='utf-8') as f:
+        json.dump(delta, f, ensure_ascii=False, separators=(',', ':'))
+
+
+def read_delta(path):
+    """读取同步文件（自动识别gzip压缩）"""
+    with open(path, 'rb') as f:
+        compressed = f.read(2) == b'\x1f\x8b'
+    opener = gzip.open if compressed else open
+    with opener(path, 'rt', encoding='utf-8') as f:
+        return json.load(f)
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+标签
+命令和笔记可以有多个标签（例如 k8s、prod、debug）。标签以空格分隔的文本
+保存在 commands.tags / notes.tags 列中（撤销日志和同步直接使用该列），
+触发器据此维护带索引的关联表；界面在内存中为每个标签保存命令ID位图，
+多标签与/或过滤和标签计数只需要位运算。
+（本模块不依赖tkinter）
+"""
+
+import re
+
+# 有标签的表 -> (关联表, 关联表中的行ID列)
+TAGGED_TABLES = {
+    'commands': ('command_tags', 'command_id'),
+    'notes': ('note_tags', 'note_id'),
+}
+
+# 标签之间可以用空格、逗号或分号分隔
+TAG_SEPARATORS = re.compile(r'[\s,，;；]+')
+
+# 每个字节值中为1的位
+BYTE_BITS = [tuple(bit for bit in range(8) if value >> bit & 1) for value in range(256)]
+
+
+def parse_tags(text):
+    """把用户输入的标签文本解析为排序去重后的标签列表（统一小写，去掉开头的 #）"""
+    if isinstance(text, (list, tuple, set)):
+        text = ' '.join(str(tag) for tag in text)
+    tags = {tag.lstrip('#').casefold() for tag in TAG_SEPARATORS.split(text or '')}
+    tags.discard('')
+    return sorted(tags)
+
+
+def format_tags(tags):
+    """标签列表 -> 保存在 tags 列中的文本（没有标签时为 None）"""
+    return ' '.join(tags) or None
+
+
+def create_tables(cursor):
+    """创建标签表、关联表和维护关联表的触发器
+
+    需要在 ChangeFeed.create_tables 和 sync.create_tables 之前调用：
+    第一次添加 tags 列时删除它们的更新触发器，由它们按包含 tags 列的新列表重新创建。
+    """
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS tags (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT UNIQUE NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    for table, (junction, key) in TAGGED_TABLES.items():
+        cursor.execute(f'PRAGMA table_info({table})')
+        if 'tags' not in {row[1] for row in cursor.fetchall()}:
+            cursor.execute(f'ALTER TABLE {table} ADD COLUMN tags TEXT')
+            cursor.execute(f'DROP TRIGGER IF EXISTS trg_{table}_revision_update')
+            cursor.execute(f'DROP TRIGGER IF EXISTS trg_{table}_sync_update')
+
+        cursor.execute(f'''
+            CREATE TABLE IF NOT EXISTS {junction} (
+                tag_id INTEGER NOT NULL REFERENCES tags (id),
+                {key} INTEGER NOT NULL REFERENCES {table} (id),
+                PRIMARY KEY (tag_id, {key})
+            ) WITHOUT ROWID
+        ''')
+        cursor.execute(f'CREATE INDEX IF NOT EXISTS idx_{junction}_{key} ON {junction} ({key})')
+
+        # 标签名必须已经存在于 tags 表中（写入方先调用 ensure_tags）
+        link = f'''
+            INSERT OR IGNORE INTO {junction} (tag_id, {key})
+            SELECT id, NEW.id FROM tags WHERE instr(' ' || NEW.tags || ' ', ' ' || name || ' ') > 0;
+        '''
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_tags_insert
+            AFTER INSERT ON {table}
+            WHEN NEW.tags <> ''
+            BEGIN {link} END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_tags_update
+            AFTER UPDATE OF tags ON {table}
+            BEGIN
+                DELETE FROM {junction} WHERE {key} = NEW.id;
+                {link}
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_tags_delete
+            AFTER DELETE ON {table}
+            BEGIN
+                DELETE FROM {junction} WHERE {key} = OLD.id;
+            END
+        ''')
+
+
+def ensure_tags(cursor, tags):
+    """确保标签名存在于 tags 表中（在写入 tags 列之前调用）"""
+    if isinstance(tags, str):
+        tags = tags.split()
+    cursor.executemany('INSERT OR IGNORE INTO tags (name) VALUES (?)', [(tag,) for tag in tags or ()])
+
+
+def list_tags(conn, table='commands'):
+    """列出有命令（或笔记）使用的标签，返回 [(标签, 使用数)]，按使用数倒序"""
+    junction, key = TAGGED_TABLES[table]
+    cursor = conn.execute(f'''
+        SELECT t.name, COUNT(*) FROM {junction} j
+        JOIN tags t ON t.id = j.tag_id
+        GROUP BY j.tag_id
+        ORDER BY COUNT(*) DESC, t.name
+    ''')
+    return cursor.fetchall()
+
+
+def tag_filter_sql(table, tags, match_all=True, column='id'):
+    """生成按标签过滤的 SQL 条件，返回 (条件, 参数)
+
+    match_all 为 True 时要求包含全部标签，否则包含任意一个即可。
+    """
+    junction, key = TAGGED_TABLES[table]
+    placeholders = ','.join('?' * len(tags))
+    condition = f'''{column} IN (
+        SELECT {key} FROM {junction}
+        WHERE tag_id IN (SELECT id FROM tags WHERE name IN ({placeholders}))
+    '''
+    params = list(tags)
+    if match_all:
+        condition += f' GROUP BY {key} HAVING COUNT(*) = ?'
+        params.append(len(tags))
+    return condition + ')', params
+
+
+def bitset_from_ids(ids):
+    """ID集合 -> 位图（Python整数，第 n 位表示ID n）"""
+    ids = list(ids)
+    if not ids:
+        return 0
+    data = bytearray(max(ids) // 8 + 1)
+    for row_id in ids:
+        data[row_id >> 3] |= 1 << (row_id & 7)
+    return int.from_bytes(bytes(data), 'little')
+
+
+def bitset_ids(bits):
+    """位图 -> ID列表（升序）"""
+    ids = []
+    data = bits.to_bytes((bits.bit_length() + 7) // 8, 'little')
+    for offset, byte in enumerate(data):
+        if byte:
+            base = offset << 3
+            ids.extend(base + bit for bit in BYTE_BITS[byte])
+    return ids
+
+
+def bitset_count(bits):
+    return bin(bits).count('1')
+
+
+class TagIndex:
+    """标签倒排索引：标签 -> 命令ID位图
+
+    10万条命令的位图约12KB，多个标签的与/或过滤就是整数的 & / | 运算。
+    """
+
+    def __init__(self):
+        self.bits = {}
+
+    def __len__(self):
+        return len(self.bits)
+
+    def build(self, rows):
+        """从 (ID, 标签文本) 行批量建立索引"""
+        postings = {}
+        for row_id, text in rows:
+            for tag in (text or '').split():
+                postings.setdefault(tag, []).append(row_id)
+        self.bits = {tag: bitset_from_ids(ids) for tag, ids in postings.items()}
+
+    def set(self, row_id, text):
+        """更新一行的标签"""
+        self.remove(row_id)
+        for tag in (text or '').split():
+            self.bits[tag] = self.bits.get(tag, 0) | (1 << row_id)
+
+    def remove(self, row_id):
+        mask = 1 << row_id
+        for tag in [tag for tag, bits in self.bits.items() if bits & mask]:
+            bits = self.bits[tag] & ~mask
+            if bits:
+                self.bits[tag] = bits
+            else:
+                del self.bits[tag]
+
+    def match(self, tags, match_all=True):
+        """返回包含全部（match_all）或任意标签的行ID位图"""
+        sets = [self.bits.get(tag, 0) for tag in tags]
+        if not sets:
+            return 0
+        result = sets[0]
+        for bits in sets[1:]:
+            result = result & bits if match_all else result | bits
+        return result
+
+    def facets(self, scope=None):
+        """各标签在 scope 位图（默认全部）中的行数，返回 [(标签, 数量)]，按数量倒序"""
+        counts = []
+        for tag, bits in self.bits.items():
+            count = bitset_count(bits if scope is None else bits & scope)
+            if count:
+                counts.append((tag, count))
+        counts.sort(key=lambda item: (-item[1], item[0]))
+        return counts
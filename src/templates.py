@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+命令模板
+带有 template 标签的命令可以使用占位符，复制命令时填写参数值：
+
+    ssh {user=root}@{host:host} -p {port:port=22}
+    kubectl get pods -n {env:prod|staging|dev}
+
+占位符格式为 {名称[:类型][=默认值]}，类型可以是 str、int、port、host、path，
+或用 | 分隔的可选值。$ { } 后面的花括号（shell变量 ${VAR}、Go模板 {{.Name}}）、
+空的 {} 和含空格的 {print $1} 都不是占位符，原样保留。
+没有 template 标签的命令不解析占位符（awk、jq 等命令中的花括号与占位符语法相同）。
+（本模块不依赖tkinter）
+"""
+
+import csv
+import re
+from collections import OrderedDict
+
+PLACEHOLDER = re.compile(r'(?<![$\\{])\{([^\W\d][\w-]*)(?::([A-Za-z]+|[^{}=|]*(?:\|[^{}=|]*)+))?(?:=([^{}]*))?\}(?!\})')
+
+HOST_PATTERN = re.compile(r'^[\w.-]+$|^\[?[0-9a-fA-F:]+\]?$')
+
+TYPES = ('str', 'int', 'port', 'host', 'path')
+
+# 编译缓存保存的模板数
+CACHE_SIZE = 512
+
+# 带有该标签的命令才作为模板
+TEMPLATE_TAG = 'template'
+
+
+class TemplateError(ValueError):
+    """模板语法错误或参数值无效"""
+
+
+def is_template_command(tags):
+    """命令是否为模板（tags 为 commands.tags 列的文本）"""
+    return TEMPLATE_TAG in (tags or '').split()
+
+
+class Field:
+    """一个占位符参数（同名占位符共用一个参数，类型和默认值以第一次出现的为准）"""
+
+    __slots__ = ('name', 'type', 'default', 'choices')
+
+    def __init__(self, name, field_type=None, default=None, choices=None):
+        self.name = name
+        self.type = field_type or 'str'
+        self.default = default
+        self.choices = choices
+
+    def validate(self, value):
+        """检查参数值（为空时检查默认值），返回去掉首尾空白的值；无效时抛出 TemplateError"""
+        value = (value if value is not None else '').strip()
+        if not value:
+            if self.default is None:
+                raise TemplateError(f"参数 {self.name} 不能为空")
+            value = self.default
+        if self.choices and value not in self.choices:
+            raise TemplateError(f"参数 {self.name} 只能是: {' / '.join(self.choices)}")
+        if self.type == 'int' and not re.match(r'^-?\d+$', value):
+            raise TemplateError(f"参数 {self.name} 必须是整数")
+        if self.type == 'port' and not (value.isdigit() and 1 <= int(value) <= 65535):
+            raise TemplateError(f"参数 {self.name} 必须是 1~65535 之间的端口号")
+        if self.type == 'host' and not HOST_PATTERN.match(value):
+            raise TemplateError(f"参数 {self.name} 不是有效的主机名或IP地址")
+        return value
+
+
+class CompiledTemplate:
+    """编译后的模板：parts 中字符串为原样保留的文本，整数为参数在 fields 中的序号"""
+
+    def __init__(self, parts, fields):
+        self.parts = parts
+        self.fields = fields
+        self.slots = [index for index, part in enumerate(parts) if isinstance(part, int)]
+
+    @property
+    def is_template(self):
+        return bool(self.fields)
+
+    def render(self, values, validate=True):
+        """用 {参数名: 值} 生成命令，缺少的参数使用默认值"""
+        resolved = [field.validate(values.get(field.name)) if validate
+                    else values.get(field.name) or field.default or ''
+                    for field in self.fields]
+        parts = list(self.parts)
+        for index in self.slots:
+            parts[index] = resolved[parts[index]]
+        return ''.join(parts)
+
+    def render_rows(self, rows, validate=True):
+        """批量生成命令，rows 为 {参数名: 值} 的可迭代对象；出错时指出是第几行"""
+        for number, values in enumerate(rows, 1):
+            try:
+                yield self.render(values, validate)
+            except TemplateError as e:
+                raise TemplateError(f"第 {number} 行: {e}") from e
+
+
+def compile_template(text):
+    """把命令编译为 CompiledTemplate；同名参数的类型或可选值冲突时抛出 TemplateError"""
+    parts = []
+    fields = []
+    indexes = {}
+    position = 0
+    for match in PLACEHOLDER.finditer(text or ''):
+        name, spec, default = match.groups()
+        choices = None
+        field_type = None
+        if spec:
+            if '|' in spec:
+                choices = tuple(choice.strip() for choice in spec.split('|'))
+            elif spec.lower() in TYPES:
+                field_type = spec.lower()
+            else:
+                # 未知类型：不是占位符（例如 {a:b} 形式的JSON），原样保留
+                continue
+
+        if match.start() > position:
+            parts.append(text[position:match.start()])
+        position = match.end()
+
+        index = indexes.get(name)
+        if index is None:
+            index = indexes[name] = len(fields)
+            field = Field(name, field_type, default, choices)
+            if default is not None:
+                try:
+                    field.validate(default)
+                except TemplateError as e:
+                    raise TemplateError(f"默认值无效: {e}") from e
+            fields.append(field)
+        elif (field_type or choices) and (fields[index].type, fields[index].choices) != (field_type or 'str', choices):
+            raise TemplateError(f"参数 {name} 的类型前后不一致")
+        parts.append(index)
+    if position < len(text or ''):
+        parts.append(text[position:])
+    return CompiledTemplate(parts, fields)
+
+
+class TemplateCache:
+    """按命令ID缓存编译结果，命令的 updated_at 变化后重新编译"""
+
+    def __init__(self, size=CACHE_SIZE):
+        self.size = size
+        self.entries = OrderedDict()  # 命令ID -> (updated_at, CompiledTemplate)
+
+    def get(self, command_id, updated_at, text):
+        entry = self.entries.get(command_id)
+        if entry is not None and entry[0] == updated_at:
+            self.entries.move_to_end(command_id)
+            return entry[1]
+        template = compile_template(text)
+        self.entries[command_id] = (updated_at, template)
+        self.entries.move_to_end(command_id)
+        if len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+        return template
+
+
+def read_csv(path):
+    """读取CSV参数表（第一行为参数名），返回 {参数名: 值} 列表"""
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        return [{key.strip(): value for key, value in row.items() if key} for row in csv.DictReader(f)]
+
+
+def missing_columns(template, rows):
+    """CSV中缺少、且没有默认值的参数名"""
+    columns = set(rows[0]) if rows else set()
+    return [field.name for field in template.fields if field.name not in columns and field.default is None]
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+命令使用记录
+批量写入使用日志，并增量维护frecency（频率 × 时间衰减）排序分数
+"""
+
+import sqlite3
+import time
+
+# 分数半衰期：30天前的一次使用只相当于现在的半次
+HALF_LIFE_SECONDS = 30 * 24 * 3600
+# 分数基准时间（2024-01-01 UTC），分数按 2 ** ((t - 基准) / 半衰期) 累加
+# 这样所有命令的衰减比例相同，排序时无需重新计算旧分数
+SCORE_EPOCH = 1704067200
+
+
+def frecency_weight(used_at):
+    """计算一次使用对frecency分数的贡献"""
+    return 2.0 ** ((used_at - SCORE_EPOCH) / HALF_LIFE_SECONDS)
+
+
+def frecency_now(score, now=None):
+    """把累计分数换算为当前时刻的有效使用次数（用于显示）"""
+    if now is None:
+        now = time.time()
+    return score / frecency_weight(now)
+
+
+class UsageTracker:
+    """命令使用记录器
+
+    使用记录先缓存在内存中，达到批量大小或定时器触发时
+    一次性写入 usage_log 并增量更新 commands 表的统计列。
+    """
+
+    def __init__(self, conn, batch_size=20, on_flush=None):
+        self.conn = conn
+        self.batch_size = batch_size
+        self.pending = []
+        # 写入后以更新过统计列的命令ID集合调用（用于同步内存中的排序分数）
+        self.on_flush = on_flush
+
+    def record(self, command_id, action):
+        """记录一次命令使用（写入失败时保留在缓存中，由下一次定时写入重试）"""
+        if command_id is None:
+            return
+        self.pending.append((command_id, action, time.time()))
+        if len(self.pending) >= self.batch_size:
+            try:
+                self.flush()
+            except sqlite3.Error:
+                pass
+
+    def flush(self):
+        """把缓存的使用记录写入数据库，返回写入条数
+
+        写入失败（例如其他连接正在写入，数据库被锁定）时回滚，记录放回缓存后抛出 sqlite3.Error。
+        """
+        if not self.pending:
+            return 0
+
+        rows, self.pending = self.pending, []
+
+        # 同一命令的多次使用合并为一次更新
+        deltas = {}
+        for command_id, _, used_at in rows:
+            count, score, last_used = deltas.get(command_id, (0, 0.0, 0.0))
+            deltas[command_id] = (count + 1, score + frecency_weight(used_at),
+                                  max(last_used, used_at))
+
+        cursor = self.conn.cursor()
+        try:
+            cursor.executemany('INSERT INTO usage_log (command_id, action, used_at) VALUES (?, ?, ?)',
+                               rows)
+            cursor.executemany('''
+                UPDATE commands SET use_count = use_count + ?, frecency = frecency + ?,
+                last_used_at = MAX(COALESCE(last_used_at, 0), ?)
+                WHERE id = ?
+            ''', [(count, score, last_used, command_id)
+                  for command_id, (count, score, last_used) in deltas.items()])
+            self.conn.commit()
+        except sqlite3.Error:
+            self.conn.rollback()
+            self.pending = rows + self.pending
+            raise
+        if self.on_flush:
+            self.on_flush(set(deltas))
+        return len(rows)
+
+    def rebuild_scores(self):
+        """根据完整的使用日志重新计算所有命令的统计列"""
+        self.flush()
+        cursor = self.conn.cursor()
+        cursor.execute('SELECT command_id, used_at FROM usage_log')
+        totals = {}
+        for command_id, used_at in cursor.fetchall():
+            count, score, last_used = totals.get(command_id, (0, 0.0, 0.0))
+            totals[command_id] = (count + 1, score + frecency_weight(used_at),
+                                  max(last_used, used_at))
+
+        cursor.execute('UPDATE commands SET use_count = 0, frecency = 0, last_used_at = NULL')
+        cursor.executemany('UPDATE commands SET use_count = ?, frecency = ?, last_used_at = ? WHERE id = ?',
+                           [(count, score, last_used, command_id)
+                            for command_id, (count, score, last_used) in totals.items()])
+        self.conn.commit()